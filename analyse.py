@@ -1,8 +1,15 @@
 from data_json_manager import JSONDataManager
 from loguru import logger
 from datetime import datetime
-import math
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
+from summary_engine import compute_summary
+from rolling_aggregates import DEFAULT_CALM_THRESHOLD, window_for_hours
+from columnar import WeatherColumns, epoch_seconds
+from series import bucket_aggregate, format_times, lttb
+from rollups import series_from_rows, summarise_rows
+from batch_metrics import evaluate_batch, snapshot_bounds
+from instrumentation import instrument
+import columnar
 
 logger.add('logs/analyse.txt', rotation="1 week")
 
@@ -10,135 +17,265 @@ class Analyse:
     def __init__(self, json_manager: JSONDataManager):
         self.json_manager = json_manager
 
-    async def get_avg(self, period: int) -> Optional[float]:
+    def _bounds(self, start: Optional[datetime], end: Optional[datetime]) -> Tuple[Optional[int], Optional[int]]:
+        return (
+            epoch_seconds(start) if start is not None else None,
+            epoch_seconds(end) if end is not None else None
+        )
+
+    def _check_retained(self, lower: Optional[int]):
+        compaction_state = getattr(self.json_manager, "compaction_state", None)
+        until = compaction_state().get("until") if compaction_state is not None else None
+        if until is not None and (lower is None or lower < until):
+            raise ValueError(f"Raw observations before {until} are compacted and rollups cannot answer this window")
+
+    async def _read(self, period: int, start: Optional[datetime], end: Optional[datetime]) -> WeatherColumns:
+        bounds = self._bounds(start, end)
+        lower = bounds[0]
+        if start is None and end is None:
+            latest = self.json_manager.latest_time()
+            lower = latest - period * 3600 + 1 if latest is not None else None
+        self._check_retained(lower)
+        return await self.json_manager.read_columns(period, *bounds)
+
+    def _window(self, data: WeatherColumns, period: int,
+                start: Optional[datetime], end: Optional[datetime]) -> Tuple[int, int]:
+        return data.time_window(period, *self._bounds(start, end))
+
+    async def _rolling(self, period: int, start: Optional[datetime], end: Optional[datetime]) -> Optional[Dict]:
+        if start is not None or end is not None:
+            return None
+
+        window = window_for_hours(period)
+        if window is None:
+            return None
+        return await self.json_manager.read_rolling(window)
+
+    async def _aggregate(self, period: int, start: Optional[datetime], end: Optional[datetime],
+                         threshold: float = DEFAULT_CALM_THRESHOLD) -> Optional[Dict]:
+        aggregate = getattr(self.json_manager, "aggregate", None)
+        if aggregate is None:
+            return None
+        return await aggregate(period, *self._bounds(start, end), threshold)
+
+    async def _rollup(self, period: int, start: Optional[datetime], end: Optional[datetime],
+                      hourly: bool = False) -> Optional[Dict]:
+        read_rollup = getattr(self.json_manager, "read_rollup", None)
+        if read_rollup is None:
+            return None
+        return await read_rollup(period, *self._bounds(start, end), hourly)
+
+    async def _rollup_summary(self, period: int, start: Optional[datetime], end: Optional[datetime],
+                              metrics: List[str], threshold: float = DEFAULT_CALM_THRESHOLD) -> Optional[Dict]:
+        rows = await self._rollup(period, start, end)
+        if rows is None:
+            return None
+        return summarise_rows(rows, metrics, threshold)
+
+    @instrument("weather_analyse_duration_seconds", metric="get_avg")
+    async def get_avg(self, period: int, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None) -> Optional[float]:
         try:
-            data = await self.json_manager.read_data()     
+            if period <= 0:
+                logger.warning("Invalid period: must be greater than zero.")
+                return None
+
+            rolling = await self._rolling(period, start, end)
+            if rolling is not None:
+                return rolling["avg_temperature"]
+
+            stats = await self._aggregate(period, start, end)
+            if stats is not None:
+                if not stats["count"]:
+                    logger.warning("No data in requested window.")
+                    return None
+                return round(stats["avg_temperature"], 2)
+
+            summary = await self._rollup_summary(period, start, end, ["avg_temperature"])
+            if summary is not None:
+                return summary["avg_temperature"]
+
+            data = await self._read(period, start, end)
             if not data:
                 logger.warning("No data available for analysis.")
                 return None
 
-            if period <= 0:
-                logger.warning("Invalid period: must be greater than zero.")
+            lo, hi = self._window(data, period, start, end)
+            if lo == hi:
+                logger.warning("No data in requested window.")
                 return None
 
-            period = min(period, len(data))
-            sum_temp = sum(ent["temperature"] for ent in data[:period])
-            return round(sum_temp / period, 2)
+            return round(columnar.mean(data.temperature[lo:hi]), 2)
         except Exception as e:
             logger.error(f"Error in get_avg: {e}")
             return None
 
-    async def estimate_avg_of_rate_of_change(self, hours: int) -> Optional[float]:
+    @instrument("weather_analyse_duration_seconds", metric="estimate_avg_of_rate_of_change")
+    async def estimate_avg_of_rate_of_change(self, hours: int, start: Optional[datetime] = None,
+                                             end: Optional[datetime] = None) -> Optional[float]:
         try:
-            data = await self.json_manager.read_data()
+            data = await self._read(hours, start, end)
             if not data or len(data) < 2:
                 logger.warning("Insufficient data for rate calculation.")
                 return None
-            
+
             if hours <= 0:
                 logger.warning("Invalid hours data as an Input")
-                return None 
-            
-            period = min(hours, len(data))
-            data = data[:period]
-
-            rates = []
-            for i in range(1, len(data)):
-                delta_temp = data[i]["temperature"] - data[i-1]["temperature"]
-                delta_time_hours = data[i]["interval"] / 3600  
-                rate = delta_temp / delta_time_hours
-                rates.append(rate)
-
-            return round(sum(rates) / len(rates), 2)
+                return None
+
+            lo, hi = self._window(data, hours, start, end)
+            rate = columnar.rate_of_change(data.temperature[lo:hi], data.time[lo:hi])
+            if rate is None:
+                logger.warning("Insufficient data for rate calculation.")
+                return None
+
+            return round(rate, 2)
         except Exception as e:
             logger.error(f"Error in estimate_avg_of_rate_of_change: {e}")
             return None
 
-    async def estimate_delta(self, hours: int) -> Optional[float]:
+    @instrument("weather_analyse_duration_seconds", metric="estimate_delta")
+    async def estimate_delta(self, hours: int, start: Optional[datetime] = None,
+                             end: Optional[datetime] = None) -> Optional[float]:
         try:
-            data = await self.json_manager.read_data()
+            data = await self._read(hours, start, end)
             if not data:
                 logger.warning("No data available for analysis.")
                 return None
-            
+
             if hours <= 0:
                 logger.warning("Invalid hours data as an Input")
-                return None 
-            
-            if hours > len(data):
-                hours = len(data)
-            
-            delta1 = data[0]["temperature"]
-            delta2 = data[hours - 1]["temperature"]
-            return round((delta2 - delta1) / hours, 2)
+                return None
+
+            lo, hi = self._window(data, hours, start, end)
+            if lo == hi:
+                logger.warning("No data in requested window.")
+                return None
+
+            delta = columnar.delta_per_hour(data.temperature[lo:hi], data.time[lo:hi])
+            return round(delta, 2)
         except Exception as e:
             logger.error(f"Error in estimate_delta: {e}")
             return None
-        
-    async def get_avg_windspeed(self, period: int) -> Optional[float]:
+
+    @instrument("weather_analyse_duration_seconds", metric="get_avg_windspeed")
+    async def get_avg_windspeed(self, period: int, start: Optional[datetime] = None,
+                                end: Optional[datetime] = None) -> Optional[float]:
         try:
-            data = await self.json_manager.read_data()
+            if period <= 0:
+                logger.warning("Invalid period: must be greater than zero.")
+                return None
+
+            rolling = await self._rolling(period, start, end)
+            if rolling is not None:
+                return rolling["avg_windspeed"]
+
+            stats = await self._aggregate(period, start, end)
+            if stats is not None:
+                if not stats["count"]:
+                    logger.warning("No data in requested window.")
+                    return None
+                return round(stats["avg_windspeed"], 2)
+
+            summary = await self._rollup_summary(period, start, end, ["avg_windspeed"])
+            if summary is not None:
+                return summary["avg_windspeed"]
+
+            data = await self._read(period, start, end)
             if not data:
                 logger.warning("No data available for wind analysis.")
                 return None
 
-            if period <= 0:
-                logger.warning("Invalid period: must be greater than zero.")
+            lo, hi = self._window(data, period, start, end)
+            if lo == hi:
+                logger.warning("No data in requested window.")
                 return None
-            
-            period = min(period, len(data))
-            total_speed = sum(ent["windspeed"] for ent in data[:period])
-            return round(total_speed / period, 2)
+
+            return round(columnar.mean(data.windspeed[lo:hi]), 2)
         except Exception as e:
             logger.error(f"Error in get_avg_windspeed: {e}")
             return None
 
-    async def get_peak_windspeed(self, period: int) -> Optional[float]:
+    @instrument("weather_analyse_duration_seconds", metric="get_peak_windspeed")
+    async def get_peak_windspeed(self, period: int, start: Optional[datetime] = None,
+                                 end: Optional[datetime] = None) -> Optional[float]:
         try:
-            data = await self.json_manager.read_data()
+            if period <= 0:
+                logger.warning("Invalid period: must be greater than zero.")
+                return None
+
+            rolling = await self._rolling(period, start, end)
+            if rolling is not None:
+                return rolling["peak_windspeed"]
+
+            stats = await self._aggregate(period, start, end)
+            if stats is not None:
+                if not stats["count"]:
+                    logger.warning("No data in requested window.")
+                    return None
+                return round(stats["peak_windspeed"], 2)
+
+            summary = await self._rollup_summary(period, start, end, ["peak_windspeed"])
+            if summary is not None:
+                return summary["peak_windspeed"]
+
+            data = await self._read(period, start, end)
             if not data:
                 logger.warning("No data available for wind analysis.")
                 return None
 
-            if period <= 0:
-                logger.warning("Invalid period: must be greater than zero.")
+            lo, hi = self._window(data, period, start, end)
+            if lo == hi:
+                logger.warning("No data in requested window.")
                 return None
 
-            period = min(period, len(data))
-            max_speed = max(ent["windspeed"] for ent in data[:period])
+            max_speed = float(data.windspeed[lo:hi].max())
             return round(max_speed, 2)
         except Exception as e:
             logger.error(f"Error in get_peak_windspeed: {e}")
             return None
-        
-    async def get_dominant_wind_direction(self, period: int) -> Optional[float]:
+
+    @instrument("weather_analyse_duration_seconds", metric="get_dominant_wind_direction")
+    async def get_dominant_wind_direction(self, period: int, start: Optional[datetime] = None,
+                                          end: Optional[datetime] = None) -> Optional[float]:
         try:
-            data = await self.json_manager.read_data()
+            if period <= 0:
+                logger.warning("Invalid period: must be greater than zero.")
+                return None
+
+            rolling = await self._rolling(period, start, end)
+            if rolling is not None:
+                return rolling["dominant_wind_direction"]
+
+            summary = await self._rollup_summary(period, start, end, ["dominant_wind_direction"])
+            if summary is not None:
+                return summary["dominant_wind_direction"]
+
+            data = await self._read(period, start, end)
             if not data:
                 logger.warning("No data available for wind analysis.")
                 return None
 
-            if period <= 0:
-                logger.warning("Invalid period: must be greater than zero.")
+            lo, hi = self._window(data, period, start, end)
+            if lo == hi:
+                logger.warning("No data in requested window.")
                 return None
 
-            period = min(period, len(data))
-            
-            sin_sum = sum(math.sin(math.radians(ent["winddirection"])) for ent in data[:period])
-            cos_sum = sum(math.cos(math.radians(ent["winddirection"])) for ent in data[:period])
-            
-            mean_direction = math.degrees(math.atan2(sin_sum, cos_sum))
-            if mean_direction < 0:
-                mean_direction += 360
-            
+            mean_direction = columnar.circular_mean_deg(data.winddirection[lo:hi])
             return round(mean_direction, 1)
         except Exception as e:
             logger.error(f"Error in get_dominant_wind_direction: {e}")
             return None
 
-    async def get_wind_direction_variability(self, period: int) -> Optional[float]:
+    @instrument("weather_analyse_duration_seconds", metric="get_wind_direction_variability")
+    async def get_wind_direction_variability(self, period: int, start: Optional[datetime] = None,
+                                             end: Optional[datetime] = None) -> Optional[float]:
         try:
-            data = await self.json_manager.read_data()
+            summary = await self._rollup_summary(period, start, end, ["wind_variability"])
+            if summary is not None:
+                return summary["wind_variability"]
+
+            data = await self._read(period, start, end)
             if not data or len(data) < 2:
                 logger.warning("Insufficient data for variability analysis.")
                 return None
@@ -147,90 +284,218 @@ class Analyse:
                 logger.warning("Invalid period: must be greater than zero.")
                 return None
 
-            period = min(period, len(data))
-            
-            changes = []
-            for i in range(1, period):
-                diff = data[i]["winddirection"] - data[i-1]["winddirection"]
-                if diff > 180:
-                    diff -= 360
-                elif diff < -180:
-                    diff += 360
-                changes.append(abs(diff))
-            
-            if not changes:
+            lo, hi = self._window(data, period, start, end)
+            std_dev = columnar.direction_change_std(data.winddirection[lo:hi])
+            if std_dev is None:
                 return 0.0
-            
-            mean_change = sum(changes) / len(changes)
-            variance = sum((x - mean_change) ** 2 for x in changes) / len(changes)
-            std_dev = math.sqrt(variance)
-            
+
             return round(std_dev, 2)
         except Exception as e:
             logger.error(f"Error in get_wind_direction_variability: {e}")
             return None
-        
-    async def get_calm_periods(self, period: int, threshold: float = 5.0) -> Optional[Dict]:
+
+    @instrument("weather_analyse_duration_seconds", metric="get_calm_periods")
+    async def get_calm_periods(self, period: int, threshold: float = DEFAULT_CALM_THRESHOLD,
+                               start: Optional[datetime] = None, end: Optional[datetime] = None) -> Optional[Dict]:
         try:
-            data = await self.json_manager.read_data()
+            if period <= 0:
+                logger.warning("Invalid period: must be greater than zero.")
+                return None
+
+            if threshold == DEFAULT_CALM_THRESHOLD:
+                rolling = await self._rolling(period, start, end)
+                if rolling is not None:
+                    return rolling["calm_periods"]
+
+            stats = await self._aggregate(period, start, end, threshold)
+            if stats is not None:
+                if not stats["count"]:
+                    logger.warning("No data in requested window.")
+                    return None
+                return {
+                    "calm_periods": stats["calm_count"],
+                    "total_periods": stats["count"],
+                    "calm_percentage": round((stats["calm_count"] / stats["count"]) * 100, 1)
+                }
+
+            summary = await self._rollup_summary(period, start, end, ["calm_periods"], threshold)
+            if summary is not None:
+                return summary["calm_periods"]
+
+            data = await self._read(period, start, end)
             if not data:
                 logger.warning("No data available for wind analysis.")
                 return None
 
-            if period <= 0:
-                logger.warning("Invalid period: must be greater than zero.")
+            lo, hi = self._window(data, period, start, end)
+            if lo == hi:
+                logger.warning("No data in requested window.")
                 return None
 
-            period = min(period, len(data))
-            calm_count = sum(1 for ent in data[:period] if ent["windspeed"] < threshold)
-            
+            calm_count = columnar.count_below(data.windspeed[lo:hi], threshold)
+            total = hi - lo
+
             return {
                 "calm_periods": calm_count,
-                "total_periods": period,
-                "calm_percentage": round((calm_count / period) * 100, 1)
+                "total_periods": total,
+                "calm_percentage": round((calm_count / total) * 100, 1)
             }
         except Exception as e:
             logger.error(f"Error in get_calm_periods: {e}")
             return None
 
-    async def get_temperature_range(self, period: int) -> Optional[Dict]:
+    @instrument("weather_analyse_duration_seconds", metric="get_temperature_range")
+    async def get_temperature_range(self, period: int, start: Optional[datetime] = None,
+                                    end: Optional[datetime] = None) -> Optional[Dict]:
         try:
-            data = await self.json_manager.read_data()
+            rolling = await self._rolling(period, start, end)
+            if rolling is not None:
+                return rolling["temp_range"]
+
+            stats = await self._aggregate(period, start, end)
+            if stats is not None:
+                if not stats["count"]:
+                    logger.warning("No data in requested window.")
+                    return None
+                min_temp, max_temp = stats["min_temperature"], stats["max_temperature"]
+                return {
+                    "min": round(min_temp, 2),
+                    "max": round(max_temp, 2),
+                    "range": round(max_temp - min_temp, 2)
+                }
+
+            summary = await self._rollup_summary(period, start, end, ["temp_range"])
+            if summary is not None:
+                return summary["temp_range"]
+
+            data = await self._read(period, start, end)
             if not data:
                 logger.warning("No data available.")
                 return None
-            
-            period = min(period, len(data))
-            temps = [ent["temperature"] for ent in data[:period]]
-            
+
+            lo, hi = self._window(data, period, start, end)
+            temps = data.temperature[lo:hi]
+            min_temp, max_temp = float(temps.min()), float(temps.max())
+
             return {
-                "min": round(min(temps), 2),
-                "max": round(max(temps), 2),
-                "range": round(max(temps) - min(temps), 2)
+                "min": round(min_temp, 2),
+                "max": round(max_temp, 2),
+                "range": round(max_temp - min_temp, 2)
             }
         except Exception as e:
             logger.error(f"Error in get_temperature_range: {e}")
             return None
 
-    async def get_weather_summary(self, period: int) -> Optional[Dict]:
+    @instrument("weather_analyse_duration_seconds", metric="get_rolling_aggregates")
+    async def get_rolling_aggregates(self, window: str) -> Optional[Dict]:
         try:
-            data = await self.json_manager.read_data()
-            if not data:
-                logger.warning("No data available.")
+            result = await self.json_manager.read_rolling(window)
+            if result is None:
+                logger.warning(f"No rolling aggregates available for window {window}.")
                 return None
-            
-            period = min(period, len(data))
-            
+
+            return result
+        except Exception as e:
+            logger.error(f"Error in get_rolling_aggregates: {e}")
+            return None
+
+    @instrument("weather_analyse_duration_seconds", metric="get_series")
+    async def get_series(self, field: str, period: int, bucket: Optional[str] = None, points: int = 500,
+                         start: Optional[datetime] = None, end: Optional[datetime] = None) -> Optional[Dict]:
+        try:
+            rows = await self._rollup(period, start, end, hourly=bucket in (None, "hour"))
+            if rows is not None and rows["count"].sum():
+                hourly = series_from_rows(rows, field, bucket or "hour")
+                times, values, source_points = hourly["time"], hourly["mean"], int(rows["count"].sum())
+                buckets = hourly if bucket is not None else None
+            else:
+                data = await self._read(period, start, end)
+                if not data:
+                    logger.warning("No data available for series.")
+                    return None
+
+                lo, hi = self._window(data, period, start, end)
+                if lo == hi:
+                    logger.warning("No data in requested window.")
+                    return None
+
+                times = data.time[lo:hi]
+                values = data.column(field)[lo:hi]
+                source_points = hi - lo
+                buckets = bucket_aggregate(times, values, bucket) if bucket is not None else None
+
+            if buckets is not None:
+                return {
+                    "bucket": bucket,
+                    "points": [
+                        {"time": moment, "mean": round(mean, 2), "min": round(low, 2), "max": round(high, 2), "count": count}
+                        for moment, mean, low, high, count in zip(
+                            format_times(buckets["time"]), buckets["mean"].tolist(), buckets["min"].tolist(),
+                            buckets["max"].tolist(), buckets["count"].tolist()
+                        )
+                    ],
+                    "source_points": source_points
+                }
+
+            selected = lttb(times, values, points)
             return {
-                "avg_temperature": await self.get_avg(period),
-                "temp_range": await self.get_temperature_range(period),
-                "avg_windspeed": await self.get_avg_windspeed(period),
-                "peak_windspeed": await self.get_peak_windspeed(period),
-                "dominant_wind_direction": await self.get_dominant_wind_direction(period),
-                "wind_variability": await self.get_wind_direction_variability(period),
-                "calm_periods": await self.get_calm_periods(period),
-                "data_points": period
+                "bucket": None,
+                "points": [
+                    {"time": moment, "value": round(value, 2)}
+                    for moment, value in zip(format_times(times[selected]), values[selected].astype(float).tolist())
+                ],
+                "source_points": source_points
             }
+        except Exception as e:
+            logger.error(f"Error in get_series: {e}")
+            return None
+
+    @instrument("weather_analyse_duration_seconds", metric="get_weather_summary")
+    async def get_weather_summary(self, period: int, metrics: Optional[List[str]] = None,
+                                  start: Optional[datetime] = None, end: Optional[datetime] = None) -> Optional[Dict]:
+        try:
+            rows = await self._rollup(period, start, end)
+            if rows is not None:
+                summary = summarise_rows(rows, metrics)
+                if summary is not None:
+                    summary["data_points"] = int(rows["count"].sum())
+                    return summary
+
+            data = await self._read(period, start, end)
+            if not data:
+                logger.warning("No data available.")
+                return None
+
+            lo, hi = self._window(data, period, start, end)
+            if lo == hi:
+                logger.warning("No data in requested window.")
+                return None
+
+            summary = compute_summary(data, lo, hi, metrics)
+            summary["data_points"] = hi - lo
+            return summary
         except Exception as e:
             logger.error(f"Error in get_weather_summary: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    @instrument("weather_analyse_duration_seconds", metric="get_metrics_batch")
+    async def get_metrics_batch(self, specs: List[Dict]) -> Optional[Dict]:
+        try:
+            resolved = []
+            for spec in specs:
+                start, end = self._bounds(spec.get("start"), spec.get("end"))
+                resolved.append(dict(spec, start=start, end=end))
+
+            windows = [(spec["period"], spec["start"], spec["end"]) for spec in resolved]
+            lower, upper = snapshot_bounds(windows, self.json_manager.latest_time())
+            self._check_retained(lower)
+            version, data = await self.json_manager.read_snapshot(None, lower, upper)
+
+            if not data:
+                logger.warning("No data available.")
+                return None
+
+            return {"version": version, "results": evaluate_batch(data, resolved)}
+        except Exception as e:
+            logger.error(f"Error in get_metrics_batch: {e}")
+            return None
@@ -1,8 +1,32 @@
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
-from typing import Optional
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from brotli_asgi import BrotliMiddleware
+from starlette.middleware.exceptions import ExceptionMiddleware
+from starlette.routing import Route, Router
+from typing import Any, Dict, List, Optional
+from itertools import islice
+import asyncio
+import os
+import time
+from datetime import datetime
 from data_json_manager import JSONDataManager
 from analyse import Analyse
+from catalog import DEFAULT_LOCATIONS, StationCatalog
+from record_stream import project
+from observation import dumps
+import blocking_pool
+from blocking_pool import run_blocking
+from instrumentation import SamplingProfiler, registry
+from live_updates import Broadcaster, UpdateWatcher, event_stream
+from ingest_daemon import HEALTH_NAME, read_health
+from forecasting import (DEFAULT_HISTORY_DAYS, DEFAULT_HORIZON, DEFAULT_THRESHOLD, EVENT_HOURS, MAX_HORIZON,
+                         MIN_THRESHOLD, ForecastService)
+from summary_engine import unknown_metrics
+from batch_metrics import METRIC_NAMES
+from rolling_aggregates import ROLLING_WINDOWS
+from series import BUCKET_SECONDS, SERIES_FIELDS
+from response_cache import CachedResponse, ResponseCache, etag_matches, http_date, make_etag, not_modified_since
 from loguru import logger
 import uvicorn
 
@@ -14,8 +38,149 @@ app = FastAPI(
     version="1.0.0"
 )
 
-data_manager = JSONDataManager('data/forecast_data_tehran.json')
-analyser = Analyse(json_manager=data_manager)
+catalog = StationCatalog(
+    'data/catalog.json',
+    shared_columns=os.environ.get("WEATHER_SHARED_COLUMNS") == "1",
+    backend=os.environ.get("WEATHER_BACKEND", "json")
+)
+analysers: Dict[str, Analyse] = {}
+response_cache = ResponseCache(max_entries=512, ttl=300)
+
+DEFAULT_PAGE_SIZE = 1000
+CACHEABLE_PREFIXES = ("/temperature/", "/wind/", "/summary", "/rolling", "/series")
+CACHE_CONTROL = "public, max-age=60, must-revalidate"
+
+
+@app.middleware("http")
+async def cache_responses(request: Request, call_next):
+    if request.method != "GET" or not request.url.path.startswith(CACHEABLE_PREFIXES):
+        return await call_next(request)
+
+    manager = catalog.manager(request.query_params.get("location", DEFAULT_LOCATIONS[0].name))
+    if manager is None:
+        return await call_next(request)
+
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    version = f"{manager.filename}:{manager.data_version()}"
+    modified = manager.last_modified()
+    etag = make_etag(key, version)
+    headers = {"ETag": etag, "Last-Modified": http_date(modified), "Cache-Control": CACHE_CONTROL}
+
+    if_none_match = request.headers.get("if-none-match")
+    if etag_matches(if_none_match, etag) or \
+            (if_none_match is None and not_modified_since(request.headers.get("if-modified-since"), modified)):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    cached = response_cache.get(key, version)
+    if cached is not None:
+        return Response(content=cached.body, media_type=cached.media_type, headers=headers)
+
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    media_type = response.headers.get("content-type", "application/json")
+    response_cache.put(key, CachedResponse(version, body, media_type, etag, headers["Last-Modified"]))
+    return Response(content=body, status_code=200, media_type=media_type, headers=headers)
+
+
+app.add_middleware(BrotliMiddleware, quality=4, minimum_size=1024, gzip_fallback=True)
+
+
+@app.middleware("http")
+async def record_timing(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    registry.observe(
+        "weather_http_request_duration_seconds",
+        time.perf_counter() - started,
+        handler=getattr(route, "path", "unmatched"),
+        method=request.method,
+        status=response.status_code
+    )
+    return response
+
+
+class DirectRoutes:
+
+    def __init__(self, app, routes, exception_handlers):
+        self.app = app
+        self.direct = ExceptionMiddleware(Router(routes=routes), handlers=exception_handlers)
+        self.paths = {route.path for route in routes}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            await self.direct(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+def collect_metrics():
+    for name, value in response_cache.stats().items():
+        yield f"weather_response_cache_{name}", "API response cache state", {}, value
+    for name, value in blocking_pool.default_pool.stats().items():
+        yield f"weather_io_pool_{name}", "Blocking I/O pool state", {}, value
+    for name, value in broadcaster.stats().items():
+        yield f"weather_stream_{name}", "Live update stream state", {}, value
+    for location, manager in list(catalog._managers.items()):
+        stats = manager.cache_stats()
+        yield "weather_data_cache_hits", "Dataset cache hits", {"location": location}, stats["hits"]
+        yield "weather_data_cache_misses", "Dataset cache misses", {"location": location}, stats["misses"]
+        yield "weather_data_cache_hit_rate", "Dataset cache hit rate", {"location": location}, stats["hit_rate"]
+        yield "weather_station_records", "Stored records per station", {"location": location}, manager.record_count()
+
+    for name, value in forecaster.stats().items():
+        yield f"weather_forecast_{name}", "Forecast and anomaly model state", {}, value
+
+    health = read_health(ingest_health_path())
+    yield "weather_ingest_up", "Ingest daemon is reporting", {}, 0 if health["status"] == "down" else 1
+    yield "weather_ingest_pending_records", "Fetched observations waiting to be written", {}, \
+        health.get("pending_records", 0)
+    for location, stats in health.get("stations", {}).items():
+        if stats.get("lag_s") is not None:
+            yield "weather_ingest_lag_seconds", "Age of the newest stored observation", {"location": location}, \
+                stats["lag_s"]
+        yield "weather_ingest_consecutive_failures", "Failed fetches in a row", {"location": location}, \
+            stats["consecutive_failures"]
+
+
+def ingest_health_path() -> str:
+    return os.path.join(catalog.data_dir, HEALTH_NAME)
+
+
+registry.register_collector(collect_metrics)
+profiler = SamplingProfiler() if os.environ.get("WEATHER_PROFILER") == "1" else None
+
+
+def get_data_manager(
+    location: str = Query(DEFAULT_LOCATIONS[0].name, description="Station name from /locations")
+) -> JSONDataManager:
+    manager = catalog.manager(location)
+    if manager is None:
+        raise HTTPException(status_code=404, detail=f"Unknown location {location}")
+    return manager
+
+
+def get_analyser(data_manager: JSONDataManager = Depends(get_data_manager)) -> Analyse:
+    if data_manager.filename not in analysers:
+        analysers[data_manager.filename] = Analyse(json_manager=data_manager)
+    return analysers[data_manager.filename]
+
+
+async def live_summary(location: str) -> Optional[Dict]:
+    return await get_analyser(catalog.manager(location)).get_weather_summary(24)
+
+
+forecaster = ForecastService(
+    catalog, int(os.environ.get("WEATHER_FORECAST_HISTORY_DAYS", DEFAULT_HISTORY_DAYS))
+)
+broadcaster = Broadcaster(max_queue=16)
+watcher = UpdateWatcher(
+    catalog, broadcaster, live_summary, interval=float(os.environ.get("WEATHER_STREAM_INTERVAL", "2"))
+)
 
 
 @app.get("/")
@@ -26,44 +191,126 @@ async def root():
             "data": "/data",
             "temperature": "/temperature/*",
             "wind": "/wind/*",
-            "summary": "/summary"
+            "summary": "/summary",
+            "rolling": "/rolling",
+            "series": "/series",
+            "forecast": "/forecast",
+            "anomalies": "/anomalies",
+            "stream": "/stream",
+            "metrics_batch": "/metrics/batch",
+            "metrics": "/metrics",
+            "ingest_health": "/ingest/health",
+            "locations": "/locations"
         }
     }
 
 
+@app.get("/locations")
+async def get_locations():
+    try:
+        return {
+            "locations": {
+                location.name: {
+                    "lat": location.lat,
+                    "lon": location.lon,
+                    "partitions": catalog.partitions(location.name)
+                }
+                for location in catalog.locations()
+            }
+        }
+    except Exception as e:
+        logger.error(f"Error in get_locations: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def stream_ndjson(records):
+    for record in records:
+        yield dumps(record) + b"\n"
+
+
+def stream_json(records):
+    count = 0
+    yield b'{"data":['
+    for record in records:
+        yield (b"," if count else b"") + dumps(record)
+        count += 1
+    yield f'],"count":{count}}}'.encode()
+
+
 @app.get("/data")
-async def get_all_data(limit: Optional[int] = Query(None, ge=1, description="Limit number of records")):
+async def get_all_data(
+    limit: Optional[int] = Query(None, ge=1, description="Limit number of records"),
+    after: Optional[int] = Query(None, ge=-1, description="Cursor: only records with id greater than this"),
+    before: Optional[int] = Query(None, ge=0, description="Cursor: only records with id lower than this"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to include"),
+    output: str = Query("json", alias="format", pattern="^(json|ndjson)$", description="json or ndjson"),
+    data_manager: JSONDataManager = Depends(get_data_manager)
+):
+    if after is not None and before is not None:
+        raise HTTPException(status_code=400, detail="Pass either after or before, not both")
+
+    selected = [name.strip() for name in fields.split(",") if name.strip()] if fields else None
+    paginated = limit is not None or after is not None or before is not None
+    page_size = limit or DEFAULT_PAGE_SIZE
+
+    if not await run_blocking(data_manager.record_count):
+        raise HTTPException(status_code=404, detail="No data available")
+
     try:
-        data = await data_manager.read_data()
-        if not data:
-            raise HTTPException(status_code=404, detail="No data available")
-        
-        if limit:
-            data = data[:limit]
-        
-        return JSONResponse(content={"count": len(data), "data": data})
+        if before is not None:
+            records = iter(await run_blocking(data_manager.page_before, before, page_size))
+        else:
+            records = data_manager.iter_after(after)
+            if limit or (paginated and output == "json"):
+                records = islice(records, page_size)
+
+        if output == "ndjson":
+            projected = (project(record, selected) for record in records)
+            return StreamingResponse(stream_ndjson(projected), media_type="application/x-ndjson")
+
+        if not paginated:
+            projected = (project(record, selected) for record in records)
+            return StreamingResponse(stream_json(projected), media_type="application/json")
+
+        data = await run_blocking(list, records)
+        return Response(content=dumps({
+            "count": len(data),
+            "data": [project(record, selected) for record in data],
+            "next_cursor": data[-1].get("id") if before is None and len(data) == page_size else None,
+            "prev_cursor": data[0].get("id") if data else None
+        }), media_type="application/json")
     except Exception as e:
         logger.error(f"Error in get_all_data: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/temperature/average")
-async def get_average_temperature(period: int = Query(24, ge=1, description="Period in hours")):
+async def get_average_temperature(
+    period: int = Query(24, ge=1, description="Period in hours"),
+    start: Optional[datetime] = Query(None, description="Window start (ISO 8601), overrides period"),
+    end: Optional[datetime] = Query(None, description="Window end (ISO 8601), overrides period"),
+    analyser: Analyse = Depends(get_analyser)
+):
     try:
-        result = await analyser.get_avg(period)
-        if result is None:
-            raise HTTPException(status_code=404, detail="Unable to calculate average")
-        
-        return {"period": period, "average_temperature": result, "unit": "celsius"}
+        result = await analyser.get_avg(period, start, end)
     except Exception as e:
         logger.error(f"Error in get_average_temperature: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unable to calculate average")
+    return {"period": period, "average_temperature": result, "unit": "celsius"}
+
 
 @app.get("/temperature/range")
-async def get_temperature_range(period: int = Query(24, ge=1, description="Period in hours")):
+async def get_temperature_range(
+    period: int = Query(24, ge=1, description="Period in hours"),
+    start: Optional[datetime] = Query(None, description="Window start (ISO 8601), overrides period"),
+    end: Optional[datetime] = Query(None, description="Window end (ISO 8601), overrides period"),
+    analyser: Analyse = Depends(get_analyser)
+):
     try:
-        result = await analyser.get_temperature_range(period)
+        result = await analyser.get_temperature_range(period, start, end)
         if result is None:
             raise HTTPException(status_code=404, detail="Unable to calculate range")
         
@@ -74,9 +321,14 @@ async def get_temperature_range(period: int = Query(24, ge=1, description="Perio
 
 
 @app.get("/temperature/rate-of-change")
-async def get_temperature_rate_of_change(hours: int = Query(10, ge=2, description="Hours to analyze")):
+async def get_temperature_rate_of_change(
+    hours: int = Query(10, ge=2, description="Hours to analyze"),
+    start: Optional[datetime] = Query(None, description="Window start (ISO 8601), overrides hours"),
+    end: Optional[datetime] = Query(None, description="Window end (ISO 8601), overrides hours"),
+    analyser: Analyse = Depends(get_analyser)
+):
     try:
-        result = await analyser.estimate_avg_of_rate_of_change(hours)
+        result = await analyser.estimate_avg_of_rate_of_change(hours, start, end)
         if result is None:
             raise HTTPException(status_code=404, detail="Unable to calculate rate of change")
         
@@ -87,9 +339,14 @@ async def get_temperature_rate_of_change(hours: int = Query(10, ge=2, descriptio
 
 
 @app.get("/temperature/delta")
-async def get_temperature_delta(hours: int = Query(10, ge=1, description="Hours to analyze")):
+async def get_temperature_delta(
+    hours: int = Query(10, ge=1, description="Hours to analyze"),
+    start: Optional[datetime] = Query(None, description="Window start (ISO 8601), overrides hours"),
+    end: Optional[datetime] = Query(None, description="Window end (ISO 8601), overrides hours"),
+    analyser: Analyse = Depends(get_analyser)
+):
     try:
-        result = await analyser.estimate_delta(hours)
+        result = await analyser.estimate_delta(hours, start, end)
         if result is None:
             raise HTTPException(status_code=404, detail="Unable to calculate delta")
         
@@ -100,9 +357,14 @@ async def get_temperature_delta(hours: int = Query(10, ge=1, description="Hours
 
 
 @app.get("/wind/average-speed")
-async def get_average_windspeed(period: int = Query(24, ge=1, description="Period in hours")):
+async def get_average_windspeed(
+    period: int = Query(24, ge=1, description="Period in hours"),
+    start: Optional[datetime] = Query(None, description="Window start (ISO 8601), overrides period"),
+    end: Optional[datetime] = Query(None, description="Window end (ISO 8601), overrides period"),
+    analyser: Analyse = Depends(get_analyser)
+):
     try:
-        result = await analyser.get_avg_windspeed(period)
+        result = await analyser.get_avg_windspeed(period, start, end)
         if result is None:
             raise HTTPException(status_code=404, detail="Unable to calculate average windspeed")
         
@@ -113,9 +375,14 @@ async def get_average_windspeed(period: int = Query(24, ge=1, description="Perio
 
 
 @app.get("/wind/peak-speed")
-async def get_peak_windspeed(period: int = Query(24, ge=1, description="Period in hours")):
+async def get_peak_windspeed(
+    period: int = Query(24, ge=1, description="Period in hours"),
+    start: Optional[datetime] = Query(None, description="Window start (ISO 8601), overrides period"),
+    end: Optional[datetime] = Query(None, description="Window end (ISO 8601), overrides period"),
+    analyser: Analyse = Depends(get_analyser)
+):
     try:
-        result = await analyser.get_peak_windspeed(period)
+        result = await analyser.get_peak_windspeed(period, start, end)
         if result is None:
             raise HTTPException(status_code=404, detail="Unable to calculate peak windspeed")
         
@@ -126,9 +393,14 @@ async def get_peak_windspeed(period: int = Query(24, ge=1, description="Period i
 
 
 @app.get("/wind/dominant-direction")
-async def get_dominant_wind_direction(period: int = Query(24, ge=1, description="Period in hours")):
+async def get_dominant_wind_direction(
+    period: int = Query(24, ge=1, description="Period in hours"),
+    start: Optional[datetime] = Query(None, description="Window start (ISO 8601), overrides period"),
+    end: Optional[datetime] = Query(None, description="Window end (ISO 8601), overrides period"),
+    analyser: Analyse = Depends(get_analyser)
+):
     try:
-        result = await analyser.get_dominant_wind_direction(period)
+        result = await analyser.get_dominant_wind_direction(period, start, end)
         if result is None:
             raise HTTPException(status_code=404, detail="Unable to calculate dominant direction")
         
@@ -139,9 +411,14 @@ async def get_dominant_wind_direction(period: int = Query(24, ge=1, description=
 
 
 @app.get("/wind/direction-variability")
-async def get_wind_direction_variability(period: int = Query(24, ge=2, description="Period in hours")):
+async def get_wind_direction_variability(
+    period: int = Query(24, ge=2, description="Period in hours"),
+    start: Optional[datetime] = Query(None, description="Window start (ISO 8601), overrides period"),
+    end: Optional[datetime] = Query(None, description="Window end (ISO 8601), overrides period"),
+    analyser: Analyse = Depends(get_analyser)
+):
     try:
-        result = await analyser.get_wind_direction_variability(period)
+        result = await analyser.get_wind_direction_variability(period, start, end)
         if result is None:
             raise HTTPException(status_code=404, detail="Unable to calculate variability")
         
@@ -154,10 +431,13 @@ async def get_wind_direction_variability(period: int = Query(24, ge=2, descripti
 @app.get("/wind/calm-periods")
 async def get_calm_periods(
     period: int = Query(24, ge=1, description="Period in hours"),
-    threshold: float = Query(5.0, ge=0, description="Windspeed threshold for calm")
+    threshold: float = Query(5.0, ge=0, description="Windspeed threshold for calm"),
+    start: Optional[datetime] = Query(None, description="Window start (ISO 8601), overrides period"),
+    end: Optional[datetime] = Query(None, description="Window end (ISO 8601), overrides period"),
+    analyser: Analyse = Depends(get_analyser)
 ):
     try:
-        result = await analyser.get_calm_periods(period, threshold)
+        result = await analyser.get_calm_periods(period, threshold, start, end)
         if result is None:
             raise HTTPException(status_code=404, detail="Unable to calculate calm periods")
         
@@ -168,17 +448,210 @@ async def get_calm_periods(
 
 
 @app.get("/summary")
-async def get_weather_summary(period: int = Query(24, ge=1, description="Period in hours")):
+async def get_weather_summary(
+    period: int = Query(24, ge=1, description="Period in hours"),
+    metrics: Optional[str] = Query(None, description="Comma-separated list of summary metrics to include"),
+    start: Optional[datetime] = Query(None, description="Window start (ISO 8601), overrides period"),
+    end: Optional[datetime] = Query(None, description="Window end (ISO 8601), overrides period"),
+    analyser: Analyse = Depends(get_analyser)
+):
+    selected = [name.strip() for name in metrics.split(",") if name.strip()] if metrics else None
+    if selected is not None and unknown_metrics(selected):
+        raise HTTPException(status_code=400, detail=f"Unknown metrics: {', '.join(unknown_metrics(selected))}")
+
     try:
-        result = await analyser.get_weather_summary(period)
-        if result is None:
-            raise HTTPException(status_code=404, detail="Unable to generate summary")
-        
-        return {"period": period, "summary": result}
+        result = await analyser.get_weather_summary(period, selected, start, end)
     except Exception as e:
         logger.error(f"Error in get_weather_summary: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unable to generate summary")
+    return {"period": period, "summary": result}
+
+
+@app.get("/series")
+async def get_series(
+    field: str = Query("temperature", pattern=f"^({'|'.join(SERIES_FIELDS)})$", description="Field to chart"),
+    period: int = Query(24 * 30, ge=1, description="Period in hours"),
+    bucket: Optional[str] = Query(None, pattern=f"^({'|'.join(BUCKET_SECONDS)})$", description="Aggregate per hour, day or week"),
+    points: int = Query(500, ge=3, le=10000, description="Point budget for downsampling when no bucket is given"),
+    start: Optional[datetime] = Query(None, description="Window start (ISO 8601), overrides period"),
+    end: Optional[datetime] = Query(None, description="Window end (ISO 8601), overrides period"),
+    analyser: Analyse = Depends(get_analyser)
+):
+    try:
+        result = await analyser.get_series(field, period, bucket, points, start, end)
+    except Exception as e:
+        logger.error(f"Error in get_series: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unable to build series")
+    return {"field": field, "period": period, **result}
+
+
+@app.get("/rolling")
+async def get_rolling_aggregates(
+    window: str = Query("24h", description=f"Rolling window, one of: {', '.join(ROLLING_WINDOWS)}"),
+    analyser: Analyse = Depends(get_analyser)
+):
+    if window not in ROLLING_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"Unknown window {window}, expected one of: {', '.join(ROLLING_WINDOWS)}")
+
+    try:
+        result = await analyser.get_rolling_aggregates(window)
+    except Exception as e:
+        logger.error(f"Error in get_rolling_aggregates: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unable to calculate rolling aggregates")
+    return {"window": window, "aggregates": result}
+
+
+@app.get("/forecast")
+async def get_forecast(
+    hours: int = Query(DEFAULT_HORIZON, ge=1, le=MAX_HORIZON, description="Hours ahead to forecast"),
+    location: Optional[str] = Query(None, description="Station name from /locations, all stations when omitted")
+):
+    if location is not None and catalog.manager(location) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown location {location}")
+
+    try:
+        result = await forecaster.forecast(hours, location)
+    except Exception as e:
+        logger.error(f"Error in get_forecast: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if result is None:
+        raise HTTPException(status_code=500, detail="Unable to build forecast")
+    if location is not None and result[location] is None:
+        raise HTTPException(status_code=404, detail=f"Not enough history to forecast {location}")
+    return {"hours": hours, "forecasts": result}
+
+
+@app.get("/anomalies")
+async def get_anomalies(
+    hours: int = Query(24, ge=1, le=EVENT_HOURS, description="Look back this many hours for anomalous observations"),
+    threshold: float = Query(DEFAULT_THRESHOLD, ge=MIN_THRESHOLD, description="Score at which an hour is anomalous"),
+    location: Optional[str] = Query(None, description="Station name from /locations, all stations when omitted")
+):
+    if location is not None and catalog.manager(location) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown location {location}")
+
+    try:
+        result = await forecaster.anomalies(hours, threshold, location)
+    except Exception as e:
+        logger.error(f"Error in get_anomalies: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if result is None:
+        raise HTTPException(status_code=500, detail="Unable to score anomalies")
+    return {"hours": hours, "threshold": threshold, **result}
+
+
+async def stream_updates(request: Request):
+    location = request.query_params.get("location", DEFAULT_LOCATIONS[0].name)
+    if catalog.manager(location) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown location {location}")
+
+    watcher.ensure_running()
+    subscriber = broadcaster.subscribe(location)
+    return StreamingResponse(
+        event_stream(broadcaster, subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+app.add_middleware(DirectRoutes, routes=[Route("/stream", stream_updates, methods=["GET"])],
+                   exception_handlers=app.exception_handlers)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    try:
+        body = await run_blocking(registry.render)
+        return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+    except Exception as e:
+        logger.error(f"Error in get_metrics: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/ingest/health")
+async def get_ingest_health():
+    try:
+        health = await run_blocking(read_health, ingest_health_path())
+        return Response(content=dumps(health), media_type="application/json",
+                        status_code=503 if health["status"] == "down" else 200)
+    except Exception as e:
+        logger.error(f"Error in get_ingest_health: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+async def get_profile(
+    seconds: float = Query(5.0, gt=0, le=60, description="Sampling duration in seconds"),
+    limit: Optional[int] = Query(200, ge=1, description="Number of distinct stacks to return")
+):
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profiler disabled, set WEATHER_PROFILER=1")
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="Profiler already sampling")
+
+    profiler.reset()
+    profiler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+    return PlainTextResponse(profiler.collapsed(limit))
+
+
+class MetricSpec(BaseModel):
+    name: str = Field(..., description=f"One of: {', '.join(METRIC_NAMES)}")
+    period: int = Field(24, ge=1, description="Period in hours")
+    params: Dict[str, Any] = Field(default_factory=dict, description="Optional start, end and threshold")
+
+
+class MetricsBatchRequest(BaseModel):
+    metrics: List[MetricSpec] = Field(..., min_length=1, max_length=100)
+
+
+def parse_metric_spec(spec: MetricSpec) -> Dict:
+    if spec.name not in METRIC_NAMES:
+        raise ValueError(f"Unknown metric {spec.name}")
+
+    parsed = {"name": spec.name, "period": spec.period}
+    for key in ("start", "end"):
+        value = spec.params.get(key)
+        parsed[key] = datetime.fromisoformat(value) if value is not None else None
+    if "threshold" in spec.params:
+        parsed["threshold"] = float(spec.params["threshold"])
+    return parsed
+
+
+@app.post("/metrics/batch")
+async def get_metrics_batch(
+    request: MetricsBatchRequest,
+    analyser: Analyse = Depends(get_analyser)
+):
+    try:
+        specs = [parse_metric_spec(spec) for spec in request.metrics]
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        result = await analyser.get_metrics_batch(specs)
+    except Exception as e:
+        logger.error(f"Error in get_metrics_batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unable to evaluate metrics")
+    return result
+
 
 if __name__ == "__main__":
     uvicorn.run("apis:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,197 @@
+from loguru import logger
+import argparse
+import asyncio
+import json
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from catalog import Location, StationCatalog
+from columnar import record_epoch
+from fetch_weather import WeatherFetcher, load_locations
+
+
+logger.add('logs/backfill.txt', rotation="1 week")
+
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+HOURLY_FIELDS = {
+    "temperature_2m": "temperature",
+    "windspeed_10m": "windspeed",
+    "winddirection_10m": "winddirection",
+    "weathercode": "weathercode",
+    "is_day": "is_day",
+}
+HOURLY_INTERVAL = 3600
+
+
+def date_chunks(start: date, end: date, days: int) -> Iterator[Tuple[date, date]]:
+    current = start
+    while current <= end:
+        chunk_end = min(end, current + timedelta(days=days - 1))
+        yield current, chunk_end
+        current = chunk_end + timedelta(days=1)
+
+
+def hourly_records(hourly: Dict) -> List[Dict]:
+    times = hourly.get("time") or []
+    columns = {field: hourly.get(source) or [] for source, field in HOURLY_FIELDS.items()}
+
+    records = []
+    for index, moment in enumerate(times):
+        record = {"time": moment, "interval": HOURLY_INTERVAL}
+        for field, values in columns.items():
+            if index < len(values) and values[index] is not None:
+                record[field] = values[index]
+        if "temperature" in record:
+            records.append(record)
+    return records
+
+
+def chunk_key(location: str, start: date, end: date) -> str:
+    return f"{location}:{start.isoformat()}:{end.isoformat()}"
+
+
+async def stored_times(manager, records: List[Dict]) -> Set[int]:
+    epochs = [record_epoch(record) for record in records]
+    epochs = [epoch for epoch in epochs if epoch is not None]
+    if not epochs:
+        return set()
+    columns = await manager.read_columns(start=min(epochs), end=max(epochs))
+    return set(columns.time.tolist())
+
+
+class Checkpoint:
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.completed: Set[str] = set()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                self.completed = set(json.load(f).get("completed", []))
+        except FileNotFoundError:
+            self.completed = set()
+        except Exception as e:
+            logger.error(f"Issues loading checkpoint {self.path}, starting over: {e}")
+            self.completed = set()
+
+    def done(self, key: str) -> bool:
+        return key in self.completed
+
+    def mark(self, keys: List[str]):
+        self.completed.update(keys)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({"completed": sorted(self.completed), "updated": datetime.now().isoformat()}, f)
+        os.replace(tmp_path, self.path)
+
+
+class Backfiller:
+
+    def __init__(self, catalog: StationCatalog, fetcher: WeatherFetcher, checkpoint: Checkpoint,
+                 chunk_days: int = 31, parallel: int = 4):
+        self.catalog = catalog
+        self.fetcher = fetcher
+        self.checkpoint = checkpoint
+        self.chunk_days = chunk_days
+        self.semaphore = asyncio.Semaphore(parallel)
+        self.inserted: Dict[str, int] = {}
+        self.failed: List[str] = []
+
+    async def load_chunk(self, name: str, hourly: Dict) -> Optional[int]:
+        records = hourly_records(hourly)
+        seen = await stored_times(self.catalog.manager(name), records)
+        fresh = []
+        for record in records:
+            epoch = record_epoch(record)
+            if epoch is None or epoch in seen:
+                continue
+            seen.add(epoch)
+            fresh.append(record)
+
+        if not fresh:
+            return 0
+        saved = await self.catalog.manager(name).save_many(fresh)
+        return saved if saved == len(fresh) else None
+
+    async def run_chunk(self, locations: List[Location], start: date, end: date):
+        pending = [location for location in locations if not self.checkpoint.done(chunk_key(location.name, start, end))]
+        if not pending:
+            return
+
+        async with self.semaphore:
+            try:
+                payloads = await self.fetcher.fetch_hourly_batch(pending, start.isoformat(), end.isoformat())
+            except Exception as e:
+                logger.error(f"Error fetching {start}..{end} for {[location.name for location in pending]}: {e}")
+                self.failed.extend(chunk_key(location.name, start, end) for location in pending)
+                return
+
+            completed = []
+            for location in pending:
+                key = chunk_key(location.name, start, end)
+                saved = await self.load_chunk(location.name, payloads[location.name])
+                if saved is None:
+                    logger.error(f"Issues saving backfill chunk {key}")
+                    self.failed.append(key)
+                    continue
+                self.inserted[location.name] = self.inserted.get(location.name, 0) + saved
+                completed.append(key)
+            self.checkpoint.mark(completed)
+            logger.info(f"Backfilled {start}..{end} for {len(completed)}/{len(pending)} locations")
+
+    async def run(self, locations: List[Location], start: date, end: date) -> Dict[str, int]:
+        for location in locations:
+            self.catalog.register(location)
+
+        size = self.fetcher.batch_size
+        batches = [locations[i:i + size] for i in range(0, len(locations), size)]
+        await asyncio.gather(*(
+            self.run_chunk(batch, chunk_start, chunk_end)
+            for chunk_start, chunk_end in date_chunks(start, end, self.chunk_days)
+            for batch in batches
+        ))
+        return self.inserted
+
+
+async def backfill(start: date, end: date, catalog: StationCatalog, locations: List[Location],
+                   checkpoint_path: str, base_url: str = ARCHIVE_URL, chunk_days: int = 31,
+                   parallel: int = 4, batch_size: int = 50) -> Backfiller:
+    checkpoint = Checkpoint(checkpoint_path)
+    async with WeatherFetcher(base_url=base_url, max_concurrency=parallel, batch_size=batch_size) as fetcher:
+        backfiller = Backfiller(catalog, fetcher, checkpoint, chunk_days, parallel)
+        await backfiller.run(locations, start, end)
+    return backfiller
+
+
+def main():
+    yesterday = date.today() - timedelta(days=1)
+    parser = argparse.ArgumentParser(description="Backfill historical hourly weather into storage")
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="First day, YYYY-MM-DD")
+    parser.add_argument("--end", type=date.fromisoformat, default=yesterday, help="Last day, defaults to yesterday")
+    parser.add_argument("--chunk-days", type=int, default=31)
+    parser.add_argument("--parallel", type=int, default=4, help="Concurrent archive requests")
+    parser.add_argument("--batch-size", type=int, default=50, help="Locations per archive request")
+    parser.add_argument("--checkpoint", default="data/backfill_checkpoint.json")
+    parser.add_argument("--base-url", default=os.environ.get("WEATHER_ARCHIVE_URL", ARCHIVE_URL))
+    parser.add_argument("--locations", default=None, help="JSON file of locations, defaults to the catalog")
+    args = parser.parse_args()
+
+    catalog = StationCatalog(backend=os.environ.get("WEATHER_BACKEND", "json"))
+    locations = load_locations(args.locations, catalog=catalog)
+    backfiller = asyncio.run(backfill(
+        args.start, args.end, catalog, locations, args.checkpoint, args.base_url,
+        args.chunk_days, args.parallel, args.batch_size
+    ))
+
+    for name, inserted in sorted(backfiller.inserted.items()):
+        print(f"{name}: {inserted} records backfilled")
+    if backfiller.failed:
+        print(f"{len(backfiller.failed)} chunks failed, rerun to resume")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+from typing import Dict, List, Optional, Tuple
+from columnar import WeatherColumns
+from rolling_aggregates import DEFAULT_CALM_THRESHOLD
+from summary_engine import SUMMARY_METRICS, compute_summary
+import columnar
+
+
+SUMMARY_METRIC_NAMES = {
+    "temperature.average": "avg_temperature",
+    "temperature.range": "temp_range",
+    "wind.average_speed": "avg_windspeed",
+    "wind.peak_speed": "peak_windspeed",
+    "wind.dominant_direction": "dominant_wind_direction",
+    "wind.direction_variability": "wind_variability",
+    "wind.calm_periods": "calm_periods",
+}
+
+DERIVED_METRIC_NAMES = ("temperature.rate_of_change", "temperature.delta", "summary")
+
+METRIC_NAMES = tuple(SUMMARY_METRIC_NAMES) + DERIVED_METRIC_NAMES
+
+
+def snapshot_bounds(windows: List[Tuple[int, Optional[int], Optional[int]]],
+                    latest: Optional[int]) -> Tuple[Optional[int], Optional[int]]:
+    starts, ends = [], []
+    for period, start, end in windows:
+        if start is None and end is None:
+            starts.append(latest - period * 3600 if latest is not None else None)
+            ends.append(None)
+        else:
+            starts.append(start)
+            ends.append(end)
+
+    lower = None if any(value is None for value in starts) else min(starts)
+    upper = None if any(value is None for value in ends) else max(ends)
+    return lower, upper
+
+
+def evaluate_batch(data: WeatherColumns, specs: List[Dict]) -> List[Dict]:
+    groups: Dict[Tuple, Dict] = {}
+    resolved = []
+
+    for spec in specs:
+        lo, hi = data.time_window(spec["period"], spec.get("start"), spec.get("end"))
+        threshold = float(spec.get("threshold", DEFAULT_CALM_THRESHOLD))
+        group = groups.setdefault((lo, hi, threshold), {"metrics": set(), "summary": None})
+        if spec["name"] == "summary":
+            group["metrics"].update(SUMMARY_METRICS)
+        elif spec["name"] in SUMMARY_METRIC_NAMES:
+            group["metrics"].add(SUMMARY_METRIC_NAMES[spec["name"]])
+        resolved.append((spec, lo, hi, threshold))
+
+    for (lo, hi, threshold), group in groups.items():
+        if group["metrics"] and hi > lo:
+            group["summary"] = compute_summary(data, lo, hi, group["metrics"], calm_threshold=threshold)
+
+    results = []
+    for spec, lo, hi, threshold in resolved:
+        summary = groups[(lo, hi, threshold)]["summary"]
+        name = spec["name"]
+        value = None
+
+        if hi <= lo:
+            value = None
+        elif name == "summary":
+            value = dict(summary, data_points=hi - lo)
+        elif name in SUMMARY_METRIC_NAMES:
+            value = summary[SUMMARY_METRIC_NAMES[name]]
+        elif name == "temperature.rate_of_change":
+            rate = columnar.rate_of_change(data.temperature[lo:hi], data.time[lo:hi])
+            value = round(rate, 2) if rate is not None else None
+        elif name == "temperature.delta":
+            value = round(columnar.delta_per_hour(data.temperature[lo:hi], data.time[lo:hi]), 2)
+
+        results.append({"name": name, "period": spec["period"], "value": value, "data_points": hi - lo})
+    return results
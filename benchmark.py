@@ -0,0 +1,797 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import blocking_pool
+from columnar import WeatherColumns
+from record_stream import batched
+from summary_engine import compute_summary
+
+
+SUITES = ("summary", "storage", "analyse", "converter", "codec", "api", "forecast")
+ANALYSE_PERIODS = (24, 24 * 30 + 1)
+PER_SERIES_SAMPLE = 20
+
+
+def iter_generated(count: int, start: str = "2020-01-01T00:00", seed: int = 42) -> Iterator[Dict]:
+    rng = random.Random(seed)
+    origin = datetime.fromisoformat(start)
+    direction = rng.uniform(0, 360)
+    for i in range(count):
+        moment = origin + timedelta(hours=i)
+        daily = math.sin((moment.hour - 9) / 24 * 2 * math.pi)
+        direction = (direction + rng.gauss(0, 25)) % 360
+        yield {
+            "time": moment.strftime("%Y-%m-%dT%H:%M"),
+            "interval": 900,
+            "temperature": round(15 + 8 * daily + rng.gauss(0, 1.5), 1),
+            "windspeed": round(abs(rng.gauss(8, 5)), 1),
+            "winddirection": int(direction),
+            "is_day": int(6 <= moment.hour < 18),
+            "weathercode": rng.choice((0, 0, 0, 1, 2, 3, 45, 61)),
+            "id": i,
+            "timestamp": moment.isoformat()
+        }
+
+
+def generate_records(count: int, start: str = "2020-01-01T00:00", seed: int = 42) -> List[Dict]:
+    return list(iter_generated(count, start, seed))
+
+
+def legacy_summary(data: List[Dict], period: int, threshold: float = 5.0) -> Dict:
+    period = min(period, len(data))
+    window = data[:period]
+
+    temps = [ent["temperature"] for ent in window]
+    sin_sum = sum(math.sin(math.radians(ent["winddirection"])) for ent in window)
+    cos_sum = sum(math.cos(math.radians(ent["winddirection"])) for ent in window)
+    mean_direction = math.degrees(math.atan2(sin_sum, cos_sum))
+    if mean_direction < 0:
+        mean_direction += 360
+
+    changes = []
+    for i in range(1, period):
+        diff = data[i]["winddirection"] - data[i-1]["winddirection"]
+        if diff > 180:
+            diff -= 360
+        elif diff < -180:
+            diff += 360
+        changes.append(abs(diff))
+    mean_change = sum(changes) / len(changes) if changes else 0.0
+    variance = sum((x - mean_change) ** 2 for x in changes) / len(changes) if changes else 0.0
+
+    calm_count = sum(1 for ent in window if ent["windspeed"] < threshold)
+    return {
+        "avg_temperature": round(sum(temps) / period, 2),
+        "temp_range": {
+            "min": round(min(temps), 2),
+            "max": round(max(temps), 2),
+            "range": round(max(temps) - min(temps), 2)
+        },
+        "avg_windspeed": round(sum(ent["windspeed"] for ent in window) / period, 2),
+        "peak_windspeed": round(max(ent["windspeed"] for ent in window), 2),
+        "dominant_wind_direction": round(mean_direction, 1),
+        "wind_variability": round(math.sqrt(variance), 2),
+        "calm_periods": {
+            "calm_periods": calm_count,
+            "total_periods": period,
+            "calm_percentage": round((calm_count / period) * 100, 1)
+        },
+        "data_points": period
+    }
+
+
+def best_of(func: Callable, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def bench_summary(sizes: List[int], repeat: int) -> List[Dict]:
+    results = []
+    for size in sizes:
+        records = generate_records(size)
+        columns = WeatherColumns.from_records(records)
+
+        legacy = best_of(lambda: legacy_summary(records, size), repeat)
+        fused = best_of(lambda: compute_summary(columns, 0, size), repeat)
+        results.append({
+            "benchmark": "summary",
+            "records": size,
+            "legacy_ms": round(legacy * 1000, 3),
+            "fused_ms": round(fused * 1000, 3),
+            "speedup": round(legacy / fused, 1)
+        })
+    return results
+
+
+def percentile_ms(timings: List[float], q: float) -> float:
+    return round(float(np.percentile(timings, q)) * 1000, 2) if timings else 0.0
+
+
+async def _load_round(app, light_url: str, heavy_urls: List[str], clients: int, requests: int) -> Dict:
+    import httpx
+
+    light, heavy = [], []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(index: int):
+            rng = random.Random(index)
+            for i in range(requests):
+                is_heavy = (index + i) % 2 == 0
+                url = rng.choice(heavy_urls) if is_heavy else light_url
+                started = time.perf_counter()
+                response = await client.get(url)
+                elapsed = time.perf_counter() - started
+                if response.status_code == 200:
+                    (heavy if is_heavy else light).append(elapsed)
+
+        await client.get(light_url)
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(index) for index in range(clients)))
+        wall = time.perf_counter() - started
+
+    return {
+        "light_p50_ms": percentile_ms(light, 50),
+        "light_p99_ms": percentile_ms(light, 99),
+        "heavy_p50_ms": percentile_ms(heavy, 50),
+        "heavy_p99_ms": percentile_ms(heavy, 99),
+        "throughput_rps": round((len(light) + len(heavy)) / wall, 1)
+    }
+
+
+def bench_load(size: int, clients: int, requests: int, pool_sizes: List[int], cpu_workers: int) -> List[Dict]:
+    import apis
+    from catalog import Location, StationCatalog
+    from data_json_manager import JSONDataManager
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        records = generate_records(size)
+        months = sorted({record["time"][:7] for record in records})
+        heavy_urls = [
+            f"/temperature/average?location=bench&start={month}-01T00:00&end={month}-28T00:00"
+            for month in months
+        ]
+
+        apis.catalog = StationCatalog(str(Path(tmp) / "catalog.json"), tmp)
+        entry = apis.catalog.register(Location("bench", 0.0, 0.0))
+        JSONDataManager(entry["filename"]).store.append_many(records)
+
+        for workers in pool_sizes:
+            cpu = cpu_workers if workers else 0
+            blocking_pool.configure(workers, cpu_workers=cpu)
+            apis.analysers.clear()
+            apis.response_cache.entries.clear()
+            apis.catalog._managers["bench"] = JSONDataManager(entry["filename"], max_cached_partitions=1)
+
+            row = asyncio.run(_load_round(apis.app, "/rolling?location=bench", heavy_urls, clients, requests))
+            results.append({
+                "benchmark": "load", "records": size, "clients": clients,
+                "pool_workers": workers, "cpu_workers": cpu, **row
+            })
+    return results
+
+
+def _process_cpu(pid: int) -> float:
+    with open(f"/proc/{pid}/stat", 'r') as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_server(base_url: str, timeout: float = 30.0):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError(f"server at {base_url} did not start")
+
+
+async def _wait_for_subscribers(client, count: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            metrics = (await client.get("/metrics")).text
+        except Exception:
+            metrics = ""
+        for line in metrics.splitlines():
+            if line.startswith("weather_stream_subscribers ") and float(line.split()[1]) == count:
+                return
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"server never reported {count} subscribers")
+
+
+async def _stream_round(base_url: str, pid: int, manager, pending: List[Dict], subscribers: int,
+                        settle: float) -> Dict:
+    import httpx
+
+    received = [0] * subscribers
+    ingests = len(pending)
+    limits = httpx.Limits(max_connections=subscribers + 4, max_keepalive_connections=subscribers + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        async def listen(index: int):
+            async with client.stream("GET", "/stream?location=bench") as response:
+                async for line in response.aiter_lines():
+                    if line.startswith("event: observation"):
+                        received[index] += 1
+                        if received[index] >= ingests:
+                            return
+
+        listeners = [asyncio.create_task(listen(index)) for index in range(subscribers)]
+        await _wait_for_subscribers(client, subscribers)
+        await asyncio.sleep(settle)
+
+        latencies = []
+        cpu_before = _process_cpu(pid)
+        for number, record in enumerate(pending, start=1):
+            started = time.perf_counter()
+            await manager.save_data(record)
+            while min(received) < number:
+                await asyncio.sleep(0.002)
+            latencies.append(time.perf_counter() - started)
+        server_cpu = _process_cpu(pid) - cpu_before
+
+        await asyncio.gather(*listeners)
+        await _wait_for_subscribers(client, 0)
+
+    return {
+        "server_cpu_ms_per_ingest": round(server_cpu / ingests * 1000, 2),
+        "delivery_p50_ms": percentile_ms(latencies, 50),
+        "delivery_p99_ms": percentile_ms(latencies, 99),
+        "events_delivered": sum(received)
+    }
+
+
+def bench_stream(size: int, subscriber_counts: List[int], ingests: int, interval: float = 0.05) -> List[Dict]:
+    from catalog import Location, StationCatalog
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        records = generate_records(size + ingests * len(subscriber_counts))
+        catalog = StationCatalog(str(Path(tmp) / "data" / "catalog.json"), str(Path(tmp) / "data"))
+        catalog.register(Location("bench", 0.0, 0.0))
+        manager = catalog.manager("bench")
+        manager.store.append_many(records[:size])
+
+        port = _free_port()
+        env = {**os.environ, "PYTHONPATH": str(Path(__file__).resolve().parent),
+               "WEATHER_BACKEND": "json", "WEATHER_STREAM_INTERVAL": str(interval)}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "apis:app", "--port", str(port), "--log-level", "warning"],
+            cwd=tmp, env=env
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            _wait_for_server(base_url)
+            pending = records[size:]
+            for round_index, subscribers in enumerate(subscriber_counts):
+                batch = [dict(record) for record in pending[round_index * ingests:(round_index + 1) * ingests]]
+                row = asyncio.run(_stream_round(base_url, server.pid, manager, batch,
+                                                subscribers, interval * 4))
+                results.append({"benchmark": "stream", "records": size, "subscribers": subscribers,
+                                "ingests": ingests, **row})
+        finally:
+            server.terminate()
+            server.wait()
+    return results
+
+
+def timing_row(suite: str, name: str, records: int, timings: List[float], **extra) -> Dict:
+    return {
+        "suite": suite,
+        "name": name,
+        "records": records,
+        "runs": len(timings),
+        "min_ms": round(min(timings) * 1000, 3),
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "p95_ms": round(float(np.percentile(timings, 95)) * 1000, 3),
+        **extra
+    }
+
+
+def time_sync(func: Callable, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def time_async(factory: Callable[[], Awaitable], repeat: int, before: Optional[Callable] = None) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        await factory()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def build_station(directory: str, size: int, backend: str):
+    from catalog import Location, StationCatalog
+
+    catalog = StationCatalog(str(Path(directory) / "catalog.json"), directory, backend=backend)
+    catalog.register(Location("bench", 0.0, 0.0))
+    manager = catalog.manager("bench")
+    for batch in batched(iter_generated(size), 50_000):
+        if backend == "sqlite":
+            manager.insert_many(batch)
+        else:
+            manager.store.append_many(batch)
+    return catalog, manager
+
+
+def fresh_manager(catalog, backend: str):
+    catalog._managers.pop("bench", None)
+    return catalog.manager("bench")
+
+
+def bench_storage(size: int, repeat: int, backend: str) -> List[Dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        catalog, manager = build_station(tmp, size, backend)
+        ingest = time.perf_counter() - started
+        results.append(timing_row("storage", "bulk_ingest", size, [ingest], backend=backend,
+                                  records_per_s=round(size / ingest, 1)))
+
+        async def run():
+            cold = []
+            for _ in range(repeat):
+                manager = fresh_manager(catalog, backend)
+                started = time.perf_counter()
+                await manager.read_data()
+                cold.append(time.perf_counter() - started)
+            results.append(timing_row("storage", "read_data_cold", size, cold, backend=backend))
+
+            manager = catalog.manager("bench")
+            results.append(timing_row("storage", "read_data_warm", size,
+                                      await time_async(manager.read_data, repeat), backend=backend))
+            results.append(timing_row("storage", "read_columns_full", size,
+                                      await time_async(manager.read_columns, repeat), backend=backend))
+
+            manager = fresh_manager(catalog, backend)
+            results.append(timing_row("storage", "read_columns_30d_cold", size,
+                                      await time_async(lambda: manager.read_columns(24 * 30), 1), backend=backend))
+
+            rng = random.Random(7)
+            saves = []
+            for i in range(max(repeat, 10)):
+                record = {"time": f"2099-01-01T{i % 24:02d}:00", "interval": 900, "temperature": rng.uniform(0, 30),
+                          "windspeed": rng.uniform(0, 20), "winddirection": rng.randint(0, 359),
+                          "is_day": 1, "weathercode": 0}
+                started = time.perf_counter()
+                await manager.save_data(record)
+                saves.append(time.perf_counter() - started)
+            results.append(timing_row("storage", "save_data", size, saves, backend=backend))
+
+        asyncio.run(run())
+    return results
+
+
+def analyse_calls(analyser, period: int) -> List[Tuple[str, Callable[[], Awaitable]]]:
+    return [
+        ("get_avg", lambda: analyser.get_avg(period)),
+        ("estimate_avg_of_rate_of_change", lambda: analyser.estimate_avg_of_rate_of_change(period)),
+        ("estimate_delta", lambda: analyser.estimate_delta(period)),
+        ("get_avg_windspeed", lambda: analyser.get_avg_windspeed(period)),
+        ("get_peak_windspeed", lambda: analyser.get_peak_windspeed(period)),
+        ("get_dominant_wind_direction", lambda: analyser.get_dominant_wind_direction(period)),
+        ("get_wind_direction_variability", lambda: analyser.get_wind_direction_variability(period)),
+        ("get_calm_periods", lambda: analyser.get_calm_periods(period)),
+        ("get_temperature_range", lambda: analyser.get_temperature_range(period)),
+        ("get_weather_summary", lambda: analyser.get_weather_summary(period)),
+        ("get_series", lambda: analyser.get_series("temperature", period)),
+        ("get_metrics_batch", lambda: analyser.get_metrics_batch([
+            {"name": "summary", "period": period},
+            {"name": "temperature.rate_of_change", "period": period},
+            {"name": "temperature.delta", "period": period},
+        ])),
+    ]
+
+
+def bench_analyse(size: int, repeat: int, backend: str) -> List[Dict]:
+    from analyse import Analyse
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        _, manager = build_station(tmp, size, backend)
+        analyser = Analyse(manager)
+
+        async def run():
+            results.append(timing_row("analyse", "get_rolling_aggregates[24h]", size,
+                                      await time_async(lambda: analyser.get_rolling_aggregates("24h"), repeat),
+                                      backend=backend))
+            for period in ANALYSE_PERIODS:
+                for name, call in analyse_calls(analyser, period):
+                    timings = await time_async(call, repeat)
+                    results.append(timing_row("analyse", f"{name}[{period}h]", size, timings, backend=backend))
+
+        asyncio.run(run())
+    return results
+
+
+def bench_converter(size: int, repeat: int) -> List[Dict]:
+    from data_type_convertor import WeatherDataConverter
+
+    records = generate_records(size)
+    converter = WeatherDataConverter(records)
+
+    async def run():
+        return await time_async(converter.to_dataframe, repeat)
+
+    return [
+        timing_row("converter", "to_dataframe", size, asyncio.run(run())),
+        timing_row("converter", "to_table", size, time_sync(converter.to_table, repeat)),
+    ]
+
+
+def allocated_bytes(build: Callable) -> Tuple[object, int]:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        value = build()
+        return value, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def bench_codec(size: int, repeat: int) -> List[Dict]:
+    from observation import Observation, dumps
+    from segment_store import SegmentStore, read_segment_columns, segment_format
+
+    records = generate_records(size)
+    results = []
+    for fmt in ("jsonl", "bin"):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SegmentStore(tmp, max_segment_records=50_000, fmt=fmt)
+            started = time.perf_counter()
+            for batch in batched(records, 50_000):
+                store.append_many([dict(record) for record in batch])
+            ingest = time.perf_counter() - started
+            disk = sum(segment["bytes"] for segment in store.manifest["segments"])
+            extra = {"format": fmt, "bytes_per_record": round(disk / size, 1)}
+            results.append(timing_row("codec", "encode_segments", size, [ingest], **extra))
+
+            def to_columns():
+                for segment in store.manifest["segments"]:
+                    read_segment_columns(str(store.segment_path(segment)), 0, segment["bytes"],
+                                         fmt=segment_format(segment))
+
+            results.append(timing_row("codec", "decode_columns", size, time_sync(to_columns, repeat), **extra))
+            results.append(timing_row("codec", "decode_records", size, time_sync(store.read_all, repeat), **extra))
+
+    decoded = generate_records(size)
+    results.append(timing_row("codec", "response_json", size, time_sync(
+        lambda: json.dumps(decoded, separators=(",", ":")).encode(), repeat)))
+    results.append(timing_row("codec", "response_orjson", size, time_sync(lambda: dumps(decoded), repeat)))
+
+    _, dict_bytes = allocated_bytes(lambda: generate_records(size))
+    _, typed_bytes = allocated_bytes(lambda: [Observation.from_dict(record) for record in records])
+    results.append(timing_row("codec", "memory_dict_records", size, [0.0], bytes_per_record=round(dict_bytes / size, 1)))
+    results.append(timing_row("codec", "memory_observations", size, [0.0], bytes_per_record=round(typed_bytes / size, 1)))
+    return results
+
+
+def generate_station_matrix(stations: int, hours: int, seed: int = 42) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    daily = np.sin(2 * np.pi * (np.arange(hours)[:, None] % 24 - 9) / 24 + rng.uniform(-1, 1, stations))
+    matrix = np.empty((hours, stations * 2))
+    matrix[:, 0::2] = rng.uniform(5, 25, stations) + 8 * daily + \
+        np.cumsum(rng.normal(0, 0.1, (hours, stations)), axis=0) + rng.normal(0, 1.5, (hours, stations))
+    matrix[:, 1::2] = np.abs(8 + 3 * daily + rng.normal(0, 5, (hours, stations)))
+    matrix[rng.random(matrix.shape) < 0.01] = np.nan
+    return matrix
+
+
+def per_series_fit(first_hour: int, values: List[float]) -> Dict:
+    from forecasting import ALPHA, BASELINE_HALF_LIFE, BETA, GAMMA, PHI, SEASON
+
+    smoothing = 1 - 0.5 ** (1 / BASELINE_HALF_LIFE)
+    state = None
+    for offset, value in enumerate(values):
+        if math.isnan(value):
+            continue
+        hour = first_hour + offset
+        if state is None:
+            state = {"hour": hour, "level": value, "trend": 0.0, "season": [0.0] * SEASON,
+                     "mean": value, "var": 0.0, "error_var": 0.0}
+            continue
+
+        decay = PHI ** (hour - state["hour"])
+        reach = PHI * (1 - decay) / (1 - PHI)
+        seasonal = state["season"][hour % SEASON]
+        expected = state["level"] + reach * state["trend"]
+        residual = value - expected - seasonal
+        level = ALPHA * (value - seasonal) + (1 - ALPHA) * expected
+        state["trend"] = BETA * (level - expected + decay * state["trend"]) + (1 - BETA) * decay * state["trend"]
+        state["level"] = level
+        state["season"][hour % SEASON] = GAMMA * (value - level) + (1 - GAMMA) * seasonal
+
+        deviation = value - state["mean"]
+        state["mean"] += smoothing * deviation
+        state["var"] = (1 - smoothing) * (state["var"] + deviation * smoothing * deviation)
+        state["error_var"] = (1 - smoothing) * state["error_var"] + smoothing * residual * residual
+        state["hour"] = hour
+    return state
+
+
+def bench_forecast(stations: int, hours: int, repeat: int) -> List[Dict]:
+    from forecasting import BatchForecaster
+
+    first_hour = int(datetime(2020, 1, 1, tzinfo=timezone.utc).timestamp()) // 3600
+    matrix = generate_station_matrix(stations, hours)
+    names = [f"station-{i}" for i in range(stations)]
+    records = stations * hours
+
+    fitted = []
+
+    def fit():
+        model = BatchForecaster()
+        model.fit(names, first_hour, matrix)
+        fitted[:] = [model]
+
+    batched = time_sync(fit, repeat)
+    model = fitted[0]
+
+    sample = min(stations, PER_SERIES_SAMPLE)
+    columns = [matrix[:, i].tolist() for i in range(sample * 2)]
+    per_series = time_sync(lambda: [per_series_fit(first_hour, column) for column in columns], 1)
+    scaled = [timing * stations / sample for timing in per_series]
+
+    reference = per_series_fit(first_hour, columns[0])
+    drift = abs(reference["level"] - float(model.level[0]))
+
+    results = [
+        timing_row("forecast", "fit_batched", records, batched, stations=stations,
+                   speedup=round(statistics.median(scaled) / statistics.median(batched), 1),
+                   level_drift=float(f"{drift:.3g}")),
+        timing_row("forecast", f"fit_per_series_python[{sample} stations, scaled]", records, scaled, stations=stations),
+    ]
+
+    next_hour = first_hour + hours
+    latest = matrix[-1].reshape(stations, 2).tolist()
+
+    def observe_and_close():
+        for name, values in zip(names, latest):
+            model.observe(name, next_hour * 3600 + 600, values)
+        model.close_hours(next_hour + 1)
+
+    timings = []
+    for offset in range(repeat):
+        next_hour = first_hour + hours + offset
+        timings.extend(time_sync(observe_and_close, 1))
+    results.append(timing_row("forecast", "observe_and_close_hour", stations, timings, stations=stations))
+
+    results.append(timing_row("forecast", "forecast_24h", stations, time_sync(lambda: model.forecast(24), repeat),
+                              stations=stations))
+    results.append(timing_row("forecast", "anomalies_24h", stations,
+                              time_sync(lambda: model.anomalies(next_hour - 23, 3.0), repeat), stations=stations))
+    return results
+
+
+API_ENDPOINTS = (
+    "/temperature/average?period=24",
+    "/temperature/average?period=721",
+    "/temperature/range?period=721",
+    "/temperature/rate-of-change?hours=721",
+    "/temperature/delta?hours=721",
+    "/wind/average-speed?period=721",
+    "/wind/peak-speed?period=721",
+    "/wind/dominant-direction?period=721",
+    "/wind/direction-variability?period=721",
+    "/wind/calm-periods?period=721",
+    "/summary?period=721",
+    "/series?period=721&bucket=day",
+    "/rolling?window=24h",
+    "/data?limit=1000",
+)
+
+
+async def _api_round(app, urls: List[str], repeat: int, concurrency: int, clear: Callable) -> List[Tuple]:
+    import httpx
+
+    rows = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for url in urls:
+            await client.get(url)
+            uncached = await time_async(lambda: client.get(url), repeat, before=clear)
+
+            total = concurrency * repeat
+            started = time.perf_counter()
+            await asyncio.gather(*(client.get(url) for _ in range(total)))
+            throughput = total / (time.perf_counter() - started)
+            rows.append((url, uncached, throughput))
+
+        body = {"metrics": [{"name": "summary", "period": 721}, {"name": "temperature.delta", "period": 24}]}
+        batch = await time_async(lambda: client.post("/metrics/batch?location=bench", json=body), repeat)
+        rows.append(("POST /metrics/batch", batch, len(batch) / sum(batch)))
+    return rows
+
+
+def bench_api(size: int, repeat: int, concurrency: int, backend: str) -> List[Dict]:
+    import apis
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog, _ = build_station(tmp, size, backend)
+        apis.catalog = catalog
+        apis.analysers.clear()
+        apis.response_cache.entries.clear()
+
+        urls = [f"{url}&location=bench" for url in API_ENDPOINTS]
+        rows = asyncio.run(_api_round(apis.app, urls, repeat, concurrency, apis.response_cache.entries.clear))
+        for url, timings, throughput in rows:
+            name = url.replace("&location=bench", "")
+            results.append(timing_row("api", name, size, timings, backend=backend,
+                                      throughput_rps=round(throughput, 1)))
+    return results
+
+
+def run_suites(suites: List[str], sizes: List[int], repeat: int, backends: List[str], concurrency: int,
+               stations: int = 1000, station_hours: int = 365 * 24) -> List[Dict]:
+    results = []
+    if "forecast" in suites:
+        results.extend(bench_forecast(stations, station_hours, repeat))
+    for size in sizes:
+        if "summary" in suites:
+            for row in bench_summary([size], repeat):
+                results.append(timing_row("summary", "compute_summary", size, [row["fused_ms"] / 1000],
+                                          legacy_ms=row["legacy_ms"], speedup=row["speedup"]))
+        if "converter" in suites:
+            results.extend(bench_converter(size, repeat))
+        if "codec" in suites:
+            results.extend(bench_codec(size, repeat))
+        for backend in backends:
+            if "storage" in suites:
+                results.extend(bench_storage(size, repeat, backend))
+            if "analyse" in suites:
+                results.extend(bench_analyse(size, repeat, backend))
+            if "api" in suites:
+                results.extend(bench_api(size, repeat, concurrency, backend))
+    return results
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "pool": blocking_pool.default_pool.stats()
+    }
+
+
+def result_key(row: Dict) -> Tuple:
+    return (row["suite"], row["name"], row["records"], row.get("backend"), row.get("format"))
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[Dict]:
+    previous = {result_key(row): row for row in baseline}
+    changes = []
+    for row in results:
+        before = previous.get(result_key(row))
+        if before is None or not before["median_ms"]:
+            continue
+        ratio = row["median_ms"] / before["median_ms"]
+        changes.append({
+            "suite": row["suite"],
+            "name": row["name"],
+            "records": row["records"],
+            "backend": row.get("backend"),
+            "baseline_ms": before["median_ms"],
+            "median_ms": row["median_ms"],
+            "ratio": round(ratio, 3),
+            "regression": ratio > 1 + tolerance
+        })
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark weather analytics hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="Row counts to generate, e.g. 1000 100000 10000000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--backends", nargs="+", choices=("json", "sqlite"), default=["json"])
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent requests for API throughput")
+    parser.add_argument("--stations", type=int, default=1000, help="Stations for the forecast suite")
+    parser.add_argument("--station-hours", type=int, default=365 * 24, help="Hours of history per station")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="Baseline JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging a regression")
+    parser.add_argument("--load", action="store_true", help="Run the concurrent API load test")
+    parser.add_argument("--load-records", type=int, default=50_000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[0, 4])
+    parser.add_argument("--cpu-workers", type=int, default=2)
+    parser.add_argument("--stream", action="store_true", help="Run the live update fan-out test")
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--ingests", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.stream:
+        for row in bench_stream(args.load_records, args.subscribers, args.ingests):
+            print(f"{row['subscribers']:>5} subscribers  server cpu {row['server_cpu_ms_per_ingest']:>8.2f} ms/ingest  "
+                  f"delivery p50 {row['delivery_p50_ms']:>8.2f} ms  p99 {row['delivery_p99_ms']:>8.2f} ms  "
+                  f"{row['events_delivered']:>6} events")
+        return
+
+    if args.load:
+        for row in bench_load(args.load_records, args.clients, args.requests, args.pool_sizes, args.cpu_workers):
+            print(f"pool {row['pool_workers']:>3}/{row['cpu_workers']} workers  light p50 {row['light_p50_ms']:>8.2f} ms  "
+                  f"p99 {row['light_p99_ms']:>8.2f} ms  heavy p99 {row['heavy_p99_ms']:>8.2f} ms  "
+                  f"{row['throughput_rps']:>7.1f} req/s")
+        return
+
+    results = run_suites(args.suites, args.sizes, args.repeat, args.backends, args.concurrency,
+                         args.stations, args.station_hours)
+    report = {"environment": environment(), "results": results}
+
+    for row in results:
+        extra = f"  {row['throughput_rps']:>9.1f} req/s" if "throughput_rps" in row else ""
+        if "bytes_per_record" in row:
+            extra += f"  {row['bytes_per_record']:>7.1f} B/record"
+        if "speedup" in row and row["suite"] == "forecast":
+            extra += f"  {row['speedup']:>7.1f}x vs per-series"
+        print(f"{row['suite']:<10} {row.get('backend') or row.get('format') or '':<7} {row['records']:>10}  {row['name']:<45} "
+              f"median {row['median_ms']:>10.3f} ms  p95 {row['p95_ms']:>10.3f} ms{extra}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)["results"]
+        report["comparison"] = compare(results, baseline, args.tolerance)
+        for change in report["comparison"]:
+            if change["regression"]:
+                print(f"REGRESSION {change['suite']} {change['name']} [{change['records']}]: "
+                      f"{change['baseline_ms']} ms -> {change['median_ms']} ms ({change['ratio']}x)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+from loguru import logger
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional, Tuple
+
+
+logger.add('logs/blocking_pool.txt', rotation="1 week")
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_PENDING = 64
+DEFAULT_CPU_WORKERS = 0
+
+
+class BlockingPool:
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS, max_pending: int = DEFAULT_MAX_PENDING,
+                 cpu_workers: int = DEFAULT_CPU_WORKERS):
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self.cpu_workers = cpu_workers
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="weather-io") if max_workers > 0 else None
+        self._processes = ProcessPoolExecutor(cpu_workers) if cpu_workers > 0 else None
+        self._slots: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+
+    @classmethod
+    def from_env(cls) -> "BlockingPool":
+        return cls(
+            int(os.environ.get("WEATHER_IO_WORKERS", DEFAULT_WORKERS)),
+            int(os.environ.get("WEATHER_IO_MAX_PENDING", DEFAULT_MAX_PENDING)),
+            int(os.environ.get("WEATHER_CPU_WORKERS", DEFAULT_CPU_WORKERS))
+        )
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots[0] is not loop:
+            self._slots = (loop, asyncio.Semaphore(self.max_pending))
+        return self._slots[1]
+
+    async def run(self, func: Callable, *args, **kwargs):
+        if self._executor is None:
+            return func(*args, **kwargs)
+
+        semaphore = self._semaphore()
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+        finally:
+            self.active -= 1
+            self.completed += 1
+            semaphore.release()
+
+    def call_cpu(self, func: Callable, *args):
+        if self._processes is None:
+            return func(*args)
+        return self._processes.submit(func, *args).result()
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.max_workers,
+            "cpu_workers": self.cpu_workers,
+            "max_pending": self.max_pending,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=True)
+
+
+default_pool = BlockingPool.from_env()
+
+
+async def run_blocking(func: Callable, *args, **kwargs):
+    return await default_pool.run(func, *args, **kwargs)
+
+
+def run_cpu(func: Callable, *args):
+    return default_pool.call_cpu(func, *args)
+
+
+def configure(max_workers: int, max_pending: int = DEFAULT_MAX_PENDING,
+              cpu_workers: int = DEFAULT_CPU_WORKERS) -> BlockingPool:
+    global default_pool
+    previous = default_pool
+    default_pool = BlockingPool(max_workers, max_pending, cpu_workers)
+    previous.shutdown()
+    logger.info(f"Blocking pool configured with {max_workers} workers, {cpu_workers} cpu workers "
+                f"and {max_pending} pending slots")
+    return default_pool
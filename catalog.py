@@ -0,0 +1,119 @@
+from loguru import logger
+import json
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from pathlib import Path
+from data_json_manager import JSONDataManager
+from sqlite_data_manager import SQLiteDataManager
+from file_lock import FileLock
+
+
+logger.add('logs/catalog.txt', rotation="1 week")
+
+
+class Location(NamedTuple):
+    name: str
+    lat: float
+    lon: float
+
+
+DEFAULT_LOCATIONS = [Location("tehran", 35.685017, 51.389693)]
+
+BACKENDS = ("json", "sqlite")
+
+
+class StationCatalog:
+
+    def __init__(self, filename: str = 'data/catalog.json', data_dir: str = 'data', shared_columns: bool = False,
+                 backend: str = 'json'):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown storage backend {backend}, expected one of: {', '.join(BACKENDS)}")
+
+        self.filename = filename
+        self.data_dir = data_dir
+        self.shared_columns = shared_columns
+        self.backend = backend
+        Path(self.filename).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = FileLock(f"{self.filename}.lock")
+
+        self.stations: Dict[str, Dict] = {}
+        self._signature: Optional[Tuple] = None
+        self._managers: Dict[str, Union[JSONDataManager, SQLiteDataManager]] = {}
+        self._load()
+
+        if not self.stations:
+            for location in DEFAULT_LOCATIONS:
+                self.register(location)
+
+    def _stat_signature(self) -> Optional[Tuple]:
+        try:
+            st = os.stat(self.filename)
+            return (st.st_ino, st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        signature = self._stat_signature()
+        if signature is not None and signature == self._signature:
+            return
+
+        try:
+            with open(self.filename, 'r') as f:
+                self.stations = json.load(f)
+        except FileNotFoundError:
+            self.stations = {}
+        except json.JSONDecodeError as e:
+            logger.warning(f"Invalid JSON in {self.filename}: {e}")
+        self._signature = signature
+
+    def _save(self):
+        tmp_path = f"{self.filename}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.stations, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.filename)
+        self._signature = self._stat_signature()
+
+    def register(self, location: Location) -> Dict:
+        entry = {
+            "lat": location.lat,
+            "lon": location.lon,
+            "filename": str(Path(self.data_dir) / f"forecast_data_{location.name}.json")
+        }
+        with self.lock:
+            self._load()
+            if self.stations.get(location.name) != entry:
+                self.stations[location.name] = entry
+                self._save()
+                logger.info(f"Registered station {location.name} at {entry['filename']}")
+        return entry
+
+    def get(self, name: str) -> Optional[Dict]:
+        self._load()
+        return self.stations.get(name)
+
+    def locations(self) -> List[Location]:
+        self._load()
+        return [Location(name, entry["lat"], entry["lon"]) for name, entry in self.stations.items()]
+
+    @property
+    def database(self) -> str:
+        return str(Path(self.data_dir) / "weather.db")
+
+    def manager(self, name: str) -> Optional[Union[JSONDataManager, SQLiteDataManager]]:
+        if name not in self._managers:
+            entry = self.get(name)
+            if entry is None:
+                return None
+            if self.backend == "sqlite":
+                self._managers[name] = SQLiteDataManager(self.database, name)
+            else:
+                self._managers[name] = JSONDataManager(entry["filename"], shared_columns=self.shared_columns)
+        return self._managers[name]
+
+    def partitions(self, name: str) -> Optional[Dict[str, Dict]]:
+        manager = self.manager(name)
+        if manager is None:
+            return None
+        return manager.partitions()
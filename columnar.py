@@ -0,0 +1,238 @@
+import numpy as np
+from datetime import datetime, timezone
+from typing import Iterable, List, Dict, Optional, Tuple
+
+
+COLUMN_DTYPES = {
+    "id": np.int64,
+    "time": np.int64,
+    "interval": np.int32,
+    "temperature": np.float32,
+    "windspeed": np.float32,
+    "winddirection": np.float32,
+    "weathercode": np.int16,
+    "is_day": np.int8,
+}
+
+FLOAT_COLUMNS = ("temperature", "windspeed", "winddirection")
+
+
+def epoch_seconds(moment: datetime) -> int:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+def record_epoch(record: Dict) -> Optional[int]:
+    try:
+        return epoch_seconds(datetime.fromisoformat(record["time"]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def parse_times(values: List) -> np.ndarray:
+    if not values:
+        return np.empty(0, dtype=np.int64)
+    times = np.array(values, dtype="datetime64[s]")
+    return times.astype(np.int64)
+
+
+class WeatherColumns:
+
+    def __init__(self, capacity: int = 0):
+        self.size = 0
+        self.is_sorted = True
+        self._data = {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMN_DTYPES.items()}
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> "WeatherColumns":
+        columns = cls(capacity=len(records))
+        columns.append_records(records)
+        if not columns.is_sorted:
+            columns.sort_by_time()
+        return columns
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "WeatherColumns":
+        columns = cls()
+        columns._data = {name: arrays[name] for name in COLUMN_DTYPES}
+        columns.size = len(arrays["time"])
+        times = columns.time
+        columns.is_sorted = bool(np.all(times[1:] >= times[:-1]))
+        return columns
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data["time"])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self.column(name).nbytes for name in COLUMN_DTYPES)
+
+    def _reserve(self, needed: int):
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2, 64)
+        for name, values in self._data.items():
+            grown = np.empty(capacity, dtype=values.dtype)
+            grown[:self.size] = values[:self.size]
+            self._data[name] = grown
+
+    def append_records(self, records: List[Dict]):
+        if not records:
+            return
+
+        start, stop = self.size, self.size + len(records)
+        self._reserve(stop)
+
+        for name in COLUMN_DTYPES:
+            if name == "time":
+                values = parse_times([record.get("time") or "NaT" for record in records])
+            else:
+                default = np.nan if name in FLOAT_COLUMNS else 0
+                values = [record.get(name, default) for record in records]
+            self._data[name][start:stop] = values
+
+        if self.is_sorted:
+            times = self._data["time"][max(start - 1, 0):stop]
+            self.is_sorted = bool(np.all(times[1:] >= times[:-1]))
+        self.size = stop
+
+    def append_arrays(self, arrays: Dict[str, np.ndarray]):
+        count = len(arrays["time"])
+        if not count:
+            return
+
+        start, stop = self.size, self.size + count
+        self._reserve(stop)
+        for name in COLUMN_DTYPES:
+            self._data[name][start:stop] = arrays[name]
+
+        if self.is_sorted:
+            times = self._data["time"][max(start - 1, 0):stop]
+            self.is_sorted = bool(np.all(times[1:] >= times[:-1]))
+        self.size = stop
+
+    def sort_by_time(self):
+        order = np.argsort(self.time, kind="stable")
+        for name, values in self._data.items():
+            values[:self.size] = values[:self.size][order]
+        self.is_sorted = True
+
+    @classmethod
+    def from_batches(cls, batches: Iterable[List[Dict]]) -> "WeatherColumns":
+        columns = cls()
+        for batch in batches:
+            columns.append_records(batch)
+        if not columns.is_sorted:
+            columns.sort_by_time()
+        return columns
+
+    @classmethod
+    def concat(cls, parts: List["WeatherColumns"]) -> "WeatherColumns":
+        columns = cls(capacity=sum(len(part) for part in parts))
+        for name, values in columns._data.items():
+            offset = 0
+            for part in parts:
+                values[offset:offset + len(part)] = part.column(name)
+                offset += len(part)
+        columns.size = len(values)
+        times = columns.time
+        columns.is_sorted = bool(np.all(times[1:] >= times[:-1]))
+        if not columns.is_sorted:
+            columns.sort_by_time()
+        return columns
+
+    def time_window(self, hours: Optional[int] = None, start: Optional[int] = None,
+                    end: Optional[int] = None) -> Tuple[int, int]:
+        times = self.time
+        if not self.size:
+            return (0, 0)
+
+        if start is None and end is None:
+            cutoff = times[-1] - hours * 3600
+            return (int(np.searchsorted(times, cutoff, side="right")), self.size)
+
+        lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        hi = self.size if end is None else int(np.searchsorted(times, end, side="right"))
+        return (lo, max(lo, hi))
+
+    def column(self, name: str) -> np.ndarray:
+        return self._data[name][:self.size]
+
+    @property
+    def time(self) -> np.ndarray:
+        return self.column("time")
+
+    @property
+    def interval(self) -> np.ndarray:
+        return self.column("interval")
+
+    @property
+    def temperature(self) -> np.ndarray:
+        return self.column("temperature")
+
+    @property
+    def windspeed(self) -> np.ndarray:
+        return self.column("windspeed")
+
+    @property
+    def winddirection(self) -> np.ndarray:
+        return self.column("winddirection")
+
+    @property
+    def weathercode(self) -> np.ndarray:
+        return self.column("weathercode")
+
+    @property
+    def is_day(self) -> np.ndarray:
+        return self.column("is_day")
+
+
+def mean(values: np.ndarray) -> float:
+    return float(np.mean(values, dtype=np.float64))
+
+
+def rate_of_change(temperature: np.ndarray, times: np.ndarray) -> Optional[float]:
+    hours = np.diff(times).astype(np.float64) / 3600
+    deltas = np.diff(temperature.astype(np.float64))
+    valid = hours > 0
+    if not valid.any():
+        return None
+    return float(np.mean(deltas[valid] / hours[valid]))
+
+
+def delta_per_hour(temperature: np.ndarray, times: np.ndarray) -> float:
+    elapsed = (times[-1] - times[0]) / 3600
+    if elapsed <= 0:
+        return 0.0
+    return (float(temperature[-1]) - float(temperature[0])) / elapsed
+
+
+def circular_mean_deg(directions: np.ndarray) -> float:
+    radians = np.radians(directions.astype(np.float64))
+    mean_direction = float(np.degrees(np.arctan2(np.sin(radians).sum(), np.cos(radians).sum())))
+    if mean_direction < 0:
+        mean_direction += 360
+    return mean_direction
+
+
+def direction_changes(directions: np.ndarray) -> np.ndarray:
+    diff = np.diff(directions.astype(np.float64))
+    diff = np.where(diff > 180, diff - 360, diff)
+    diff = np.where(diff < -180, diff + 360, diff)
+    return np.abs(diff)
+
+
+def direction_change_std(directions: np.ndarray) -> Optional[float]:
+    changes = direction_changes(directions)
+    if changes.size == 0:
+        return None
+    return float(np.std(changes))
+
+
+def count_below(values: np.ndarray, threshold: float) -> int:
+    return int(np.count_nonzero(values < threshold))
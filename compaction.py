@@ -0,0 +1,51 @@
+from loguru import logger
+import argparse
+import asyncio
+import os
+from typing import Dict, Optional
+from catalog import StationCatalog
+
+
+logger.add('logs/compaction.txt', rotation="1 week")
+
+DEFAULT_RETAIN_DAYS = 90
+DEFAULT_HOURLY_RETAIN_DAYS = 365
+
+
+async def compact_catalog(catalog: StationCatalog, retain_days: int, hourly_retain_days: int,
+                          location: Optional[str] = None) -> Dict[str, Dict]:
+    results = {}
+    names = [location] if location else [station.name for station in catalog.locations()]
+    for name in names:
+        manager = catalog.manager(name)
+        if manager is None:
+            logger.warning(f"Unknown station {name}, skipping")
+            continue
+        if not hasattr(manager, "compact"):
+            logger.info(f"Backend for {name} does not support compaction, skipping")
+            continue
+        results[name] = await manager.compact(retain_days, hourly_retain_days)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold old raw observations into hourly and daily rollups")
+    parser.add_argument("--catalog", default="data/catalog.json")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--retain-days", type=int,
+                        default=int(os.environ.get("WEATHER_RETAIN_DAYS", DEFAULT_RETAIN_DAYS)),
+                        help="Days of raw observations to keep, at least the longest rolling window")
+    parser.add_argument("--hourly-retain-days", type=int,
+                        default=int(os.environ.get("WEATHER_HOURLY_RETAIN_DAYS", DEFAULT_HOURLY_RETAIN_DAYS)),
+                        help="Days of hourly rollups to keep, daily rollups are kept forever")
+    parser.add_argument("--location", default=None, help="Compact a single station")
+    args = parser.parse_args()
+
+    catalog = StationCatalog(args.catalog, args.data_dir, backend=os.environ.get("WEATHER_BACKEND", "json"))
+    results = asyncio.run(compact_catalog(catalog, args.retain_days, args.hourly_retain_days, args.location))
+    for name, result in results.items():
+        print(f"{name}: {result}")
+
+
+if __name__ == "__main__":
+    main()
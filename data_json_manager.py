@@ -1,69 +1,562 @@
 from loguru import logger
+import copy
 import json
-from typing import List , Dict
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Iterator, List , Dict, NamedTuple, Optional, Sequence, Tuple
 from datetime import datetime
 from pathlib import Path
+from segment_store import SegmentStore, partition_summary, read_segment_columns, segment_format
+from columnar import COLUMN_DTYPES, WeatherColumns
+from observation import SchemaError
+from record_stream import batched, iter_json_array, project
+from rolling_aggregates import ROLLING_WINDOWS, RollingAggregates
+from rollups import TIERS, Rows, build_rows, concat_rows, cover, load_rows, merge_rows, save_rows
+from shared_columns import SharedColumnCache
+from blocking_pool import run_blocking, run_cpu
+from instrumentation import instrument, record_read, timed
 
 
 logger.add('logs/json_data.txt', rotation="1 week")
 
+
+class ManifestView(NamedTuple):
+    signature: Optional[Tuple]
+    record_count: int
+    latest_time: Optional[int]
+    last_id: int
+    compaction: Dict
+    partitions: Dict[str, Dict]
+
+
+def manifest_view(signature: Optional[Tuple], manifest: Dict) -> ManifestView:
+    segments = manifest["segments"]
+    bounds = [segment["max_time"] for segment in segments if segment.get("max_time") is not None]
+    return ManifestView(signature, sum(segment["records"] for segment in segments), max(bounds) if bounds else None,
+                        manifest["last_id"], copy.deepcopy(manifest.get("compaction") or {}),
+                        partition_summary(segments))
+
+
 class JSONDataManager:
-    
-    def __init__(self, filename: str):
+
+    def __init__(self, filename: str, max_segment_records: int = 10000, max_cached_partitions: int = 64,
+                 batch_size: int = 5000, shared_columns: bool = False, fmt: Optional[str] = None):
         self.filename = filename
+        self.batch_size = batch_size
         self._ensure_directory()
-    
+        self.store = SegmentStore(str(Path(self.filename).with_suffix('')), max_segment_records, fmt)
+        self._migrate_legacy_file()
+
+        self._cache: Optional[List[Dict]] = None
+        self.rolling = RollingAggregates()
+        self._rolling_seeded = False
+        self._rolling_position = ("", 0, 0)
+        self._cache_signature: Optional[Tuple] = None
+        self._cache_position = ("", 0, 0)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self.max_cached_partitions = max_cached_partitions
+        self._partitions: "OrderedDict[str, Tuple[int, WeatherColumns]]" = OrderedDict()
+        self._window_cache: Tuple[Tuple, Optional[WeatherColumns]] = ((), None)
+        self._manifest_signature: Optional[Tuple] = None
+        self._view = manifest_view(self._stat_signature(), self.store.manifest)
+        self.shared_columns = SharedColumnCache(str(self.store.directory / "columns")) if shared_columns else None
+        self._rollups: Tuple[Tuple, Dict[str, Rows]] = ((), {})
+        self._lock = threading.RLock()
+
     def _ensure_directory(self):
         Path(self.filename).parent.mkdir(parents=True, exist_ok=True)
-    
-    async def read_data(self) -> List[Dict]:
+
+    def _migrate_legacy_file(self):
+        if not self.store.is_empty() or not Path(self.filename).exists():
+            return
+
+        migrated = 0
         try:
-            with open(self.filename, 'r') as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    return data
-                
-                logger.warning("No list data in json file")
-                return []
+            with self.store.lock:
+                self.store.reload()
+                if not self.store.is_empty():
+                    return
+                for batch in batched(iter_json_array(self.filename), self.batch_size):
+                    migrated += self.store.append_many(batch)
+            logger.info(f"Migrated {migrated} records from {self.filename} into {self.store.directory}")
+        except json.JSONDecodeError as e:
+            logger.warning(f"Invalid JSON in {self.filename}, stopped migration after {migrated} records: {e}")
+        except SchemaError as e:
+            logger.warning(f"Invalid record in {self.filename}, stopped migration after {migrated} records: {e}")
+        except ValueError as e:
+            logger.warning(f"No list data in legacy json file, skipping migration: {e}")
+        except Exception as e:
+            logger.error(f"Issues in _migrate_legacy_file: {e}")
+
+    def _stat_signature(self) -> Optional[Tuple]:
+        try:
+            st = os.stat(self.store.manifest_path)
+            return (st.st_ino, st.st_size, st.st_mtime_ns)
         except FileNotFoundError:
-            logger.info(f"File {self.filename} not found, creating new file")
+            return None
+
+    def invalidate_cache(self):
+        self._cache_signature = None
+
+    def cache_stats(self) -> Dict:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": round(self.cache_hits / lookups, 4) if lookups else 0.0,
+            "cached_records": len(self._cache) if self._cache is not None else 0
+        }
+
+    def _refresh_cache(self, signature: Optional[Tuple]):
+        self.store.reload()
+        name, segment_index, offset = self._cache_position
+
+        if self._cache is not None and self.store.can_resume_from(name, segment_index, offset):
+            new_records = self.store.read_from(segment_index, offset)
+            self._cache.extend(new_records)
+            if len(self._cache) != self.store.record_count:
+                logger.warning("Cached record count drifted from manifest, reloading full dataset")
+                self._cache = self.store.read_all()
+        else:
+            self._cache = self.store.read_all()
+
+        segment_index, offset = self.store.position()
+        self._cache_position = (self.store.segment_name(segment_index), segment_index, offset)
+        self._cache_signature = signature
+
+    def _sync_rolling(self):
+        self._sync_manifest()
+        name, segment_index, offset = self._rolling_position
+        current_index, current_offset = self.store.position()
+        if self._rolling_seeded and self._rolling_position == \
+                (self.store.segment_name(current_index), current_index, current_offset):
+            return
+
+        records = None
+        if self._rolling_seeded and self.store.can_resume_from(name, segment_index, offset):
+            records = self.store.read_from(segment_index, offset)
+
+        if records is not None and self.rolling.accepts(records):
+            self.rolling.push_many(records)
+        else:
+            self.rolling = RollingAggregates()
+            latest = self.store.latest_time
+            start = latest - self.rolling.longest if latest is not None else None
+            records = []
+            for segment in self.store.segments_overlapping(start, None):
+                records.extend(self.store.read_segment(segment))
+            self.rolling.push_many(records)
+            self._rolling_seeded = True
+
+        segment_index, offset = self.store.position()
+        self._rolling_position = (self.store.segment_name(segment_index), segment_index, offset)
+
+    def iter_records(self, fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        self._sync_manifest()
+        for record in self.store.iter_all():
+            yield project(record, fields)
+
+    def iter_after(self, after_id: Optional[int] = None, fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        self._sync_manifest()
+        for segment in self.store.segments_after_id(after_id):
+            for record in self.store.iter_segment(segment):
+                if after_id is None or record.get("id", -1) > after_id:
+                    yield project(record, fields)
+
+    def page_before(self, before_id: int, limit: int, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        self._sync_manifest()
+        page: List[Dict] = []
+        for segment in reversed(self.store.segments_before_id(before_id)):
+            matches = [
+                project(record, fields) for record in self.store.iter_segment(segment)
+                if record.get("id", -1) < before_id
+            ]
+            page = matches[-(limit - len(page)):] + page
+            if len(page) >= limit:
+                break
+        return page
+
+    def iter_batches(self, batch_size: Optional[int] = None,
+                     fields: Optional[Sequence[str]] = None) -> Iterator[List[Dict]]:
+        yield from batched(self.iter_records(fields), batch_size or self.batch_size)
+
+    @instrument("weather_stage_duration_seconds", stage="read_data", backend="json")
+    async def read_data(self) -> List[Dict]:
+        try:
+            signature = self._stat_signature()
+            if self._cache is not None and signature is not None and signature == self._cache_signature:
+                self.cache_hits += 1
+                return self._cache
+
+            self.cache_misses += 1
+            return await run_blocking(self._read_data_locked, signature)
+        except FileNotFoundError as e:
+            logger.info(f"Segment missing for {self.filename}: {e}")
+            self._cache = None
             return []
         except json.JSONDecodeError as e:
-            logger.warning(f"Invalid JSON in {self.filename}: {e}")
+            logger.warning(f"Invalid JSON in {self.store.directory}: {e}")
+            self._cache = None
             return []
         except Exception as e:
             logger.error(f"Issues in read_data: {e}")
+            self._cache = None
             return []
-    
-    async def add_id_and_timestamp(self, current_data: List[Dict], new_data: Dict) -> Dict:
+
+    def _read_data_locked(self, signature: Optional[Tuple]) -> List[Dict]:
+        with self._lock:
+            if self._cache is None or signature != self._cache_signature:
+                self._refresh_cache(signature)
+            return self._cache
+
+    def _sync_manifest(self):
+        with self._lock:
+            signature = self._stat_signature()
+            if signature is None or signature != self._manifest_signature:
+                self.store.reload()
+                self._manifest_signature = signature
+                self._view = manifest_view(signature, self.store.manifest)
+
+    def _manifest_view(self) -> ManifestView:
+        # Lock free for callers on the event loop, a writer may hold _lock for a whole compaction.
+        view, signature = self._view, self._stat_signature()
+        if signature is None or signature != view.signature:
+            view = manifest_view(signature, self.store.read_manifest())
+            self._view = view
+        return view
+
+    def _load_shared_columns(self, segment: Dict) -> WeatherColumns:
+        sealed = segment["name"] != self.store.manifest["segments"][-1]["name"]
+        if self.shared_columns is not None and sealed:
+            columns = self.shared_columns.load(segment)
+            if columns is not None:
+                return columns
+
+        with timed("weather_stage_duration_seconds", stage="parse_columns", backend="json"):
+            arrays = run_cpu(read_segment_columns, str(self.store.segment_path(segment)), 0, segment["bytes"],
+                             self.batch_size, segment_format(segment))
+        record_read(segment["records"], segment["bytes"], backend="json")
+        columns = WeatherColumns.from_arrays(arrays)
+        if not columns.is_sorted:
+            columns.sort_by_time()
+        if self.shared_columns is not None and sealed:
+            self.shared_columns.store(segment, columns)
+        return columns
+
+    def _partition_columns(self, segment: Dict) -> WeatherColumns:
+        name = segment["name"]
+        cached = self._partitions.get(name)
+
+        if cached is not None and cached[0] == segment["bytes"]:
+            columns = cached[1]
+        elif cached is not None and cached[0] < segment["bytes"]:
+            # Copy on write, readers may still be slicing the cached columns outside the lock.
+            tail = WeatherColumns.from_arrays(read_segment_columns(str(self.store.segment_path(segment)), cached[0],
+                                                                   segment["bytes"], self.batch_size,
+                                                                   segment_format(segment)))
+            columns = WeatherColumns.concat([cached[1], tail])
+        else:
+            columns = self._load_shared_columns(segment)
+
+        self._partitions[name] = (segment["bytes"], columns)
+        self._partitions.move_to_end(name)
+        while len(self._partitions) > self.max_cached_partitions:
+            self._partitions.popitem(last=False)
+        return columns
+
+    def _read_window_columns(self, period: Optional[int], start: Optional[int], end: Optional[int]) -> WeatherColumns:
+        self._sync_manifest()
+        if start is None and end is None and period is not None:
+            latest = self.store.latest_time
+            start = latest - period * 3600 if latest is not None else None
+
+        segments = self.store.segments_overlapping(start, end)
+        key = tuple((segment["name"], segment["bytes"]) for segment in segments)
+        if self._window_cache[0] == key and self._window_cache[1] is not None:
+            self.cache_hits += 1
+            return self._window_cache[1]
+
+        self.cache_misses += 1
+        parts = [self._partition_columns(segment) for segment in segments]
+        if not parts:
+            columns = WeatherColumns()
+        elif len(parts) == 1:
+            columns = parts[0]
+        else:
+            columns = WeatherColumns.concat(parts)
+        self._window_cache = (key, columns)
+        return columns
+
+    @instrument("weather_stage_duration_seconds", stage="read_columns", backend="json")
+    async def read_columns(self, period: Optional[int] = None, start: Optional[int] = None,
+                           end: Optional[int] = None) -> WeatherColumns:
         try:
-            if len(current_data) > 0:
-                last_data = current_data[-1]
-                last_id = last_data.get('id', -1)
-                new_data["id"] = last_id + 1
+            return await run_blocking(self._read_window_locked, period, start, end)
+        except Exception as e:
+            logger.error(f"Issues in read_columns: {e}")
+            return WeatherColumns()
+
+    def _read_window_locked(self, period: Optional[int], start: Optional[int], end: Optional[int]) -> WeatherColumns:
+        with self._lock:
+            return self._read_window_columns(period, start, end)
+
+    def _read_snapshot_locked(self, period: Optional[int], start: Optional[int],
+                              end: Optional[int]) -> Tuple[int, WeatherColumns]:
+        with self._lock:
+            columns = self._read_window_columns(period, start, end)
+            return self.store.last_id, columns
+
+    @instrument("weather_stage_duration_seconds", stage="read_snapshot", backend="json")
+    async def read_snapshot(self, period: Optional[int] = None, start: Optional[int] = None,
+                            end: Optional[int] = None) -> Tuple[int, WeatherColumns]:
+        try:
+            return await run_blocking(self._read_snapshot_locked, period, start, end)
+        except Exception as e:
+            logger.error(f"Issues in read_snapshot: {e}")
+            return -1, WeatherColumns()
+
+    def record_count(self) -> int:
+        return self._manifest_view().record_count
+
+    def latest_time(self) -> Optional[int]:
+        return self._manifest_view().latest_time
+
+    def data_version(self) -> int:
+        return self._manifest_view().last_id
+
+    def last_modified(self) -> Optional[float]:
+        try:
+            return os.stat(self.store.manifest_path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def partitions(self) -> Dict[str, Dict]:
+        return self._manifest_view().partitions
+
+    @property
+    def rollup_directory(self) -> Path:
+        return self.store.directory / "rollups"
+
+    def compaction_state(self) -> Dict:
+        return self._manifest_view().compaction
+
+    def _rollup_tiers(self) -> Dict[str, Rows]:
+        files = self.store.compaction.get("tiers", {})
+        key = tuple(sorted(files.items()))
+        if self._rollups[0] != key:
+            self._rollups = (key, {tier: load_rows(self.rollup_directory / name) for tier, name in files.items()})
+        return self._rollups[1]
+
+    def _fold_columns(self, segments: List[Dict], until: int, previous_until: Optional[int],
+                      folded_id: int) -> WeatherColumns:
+        parts = []
+        for segment in segments:
+            arrays = read_segment_columns(str(self.store.segment_path(segment)), 0, segment["bytes"], self.batch_size,
+                                          segment_format(segment))
+            times, ids = arrays["time"], arrays["id"]
+            keep = times < until
+            if previous_until is not None:
+                keep &= (times >= previous_until) | (ids > folded_id)
+            parts.append({name: values[keep] for name, values in arrays.items()})
+        if not parts:
+            return WeatherColumns()
+
+        columns = WeatherColumns.from_arrays({name: np.concatenate([part[name] for part in parts]) for name in parts[0]})
+        if not columns.is_sorted:
+            columns.sort_by_time()
+        return columns
+
+    def _compact_locked(self, retain: int, hourly_retain: int) -> Optional[Dict]:
+        retain = max(retain, max(ROLLING_WINDOWS.values()))
+        hourly_retain = max(hourly_retain, retain)
+        with self._lock, self.store.lock:
+            self.store.sync()
+            latest = self.store.latest_time
+            if latest is None:
+                return None
+
+            state = self.store.compaction
+            previous_until, folded_id = state.get("until"), state.get("last_id", -1)
+            until = (latest - retain) // TIERS["day"] * TIERS["day"]
+            if previous_until is not None:
+                until = max(until, previous_until)
+            hour_since = max(
+                (latest - hourly_retain) // TIERS["day"] * TIERS["day"], state.get("since", {}).get("hour", -2 ** 62)
+            )
+
+            segments = [
+                segment for segment in self.store.manifest["segments"]
+                if segment["records"] and segment.get("min_time") is not None and segment["min_time"] < until and (
+                    previous_until is None or segment["max_time"] >= previous_until or
+                    (segment.get("max_id") or -1) > folded_id
+                )
+            ]
+            tail = self.store.manifest["segments"][-1]["name"]
+            dropped = [
+                segment for segment in self.store.manifest["segments"]
+                if segment["name"] != tail and (
+                    not segment["records"] or (segment.get("max_time") is not None and segment["max_time"] < until)
+                )
+            ]
+            if not segments and not dropped and until == previous_until:
+                return {"folded": 0, "dropped_segments": 0, "until": until}
+
+            fresh = self._fold_columns(segments, until, previous_until, folded_id)
+            existing = self._rollup_tiers()
+            self.rollup_directory.mkdir(parents=True, exist_ok=True)
+            files, rows = {}, {}
+            for tier, seconds in TIERS.items():
+                if tier in existing:
+                    rows[tier] = merge_rows(existing[tier], build_rows(fresh, seconds))
+                else:
+                    rows[tier] = build_rows(fresh, seconds)
+                if tier == "hour":
+                    kept = rows[tier]["bucket"] >= hour_since
+                    rows[tier] = {name: values[kept] for name, values in rows[tier].items()}
+                files[tier] = f"{tier}-{self.store.generation}.npz"
+                save_rows(self.rollup_directory / files[tier], rows[tier])
+
+            self.store.commit_compaction({
+                "until": until,
+                "last_id": self.store.last_id,
+                "tiers": files,
+                "since": {"hour": hour_since},
+                "compacted_at": datetime.now().isoformat()
+            }, dropped)
+
+            for entry in self.rollup_directory.iterdir():
+                if entry.name not in files.values():
+                    entry.unlink(missing_ok=True)
+            for segment in dropped:
+                self._partitions.pop(segment["name"], None)
+                if self.shared_columns is not None:
+                    self.shared_columns.discard(segment)
+            self._cache = None
+            self._window_cache = ((), None)
+            self.invalidate_cache()
+            self._manifest_signature = None
+
+            return {
+                "folded": len(fresh),
+                "dropped_segments": len(dropped),
+                "freed_bytes": sum(segment["bytes"] for segment in dropped),
+                "until": until,
+                "rollup_rows": {tier: len(tier_rows["bucket"]) for tier, tier_rows in rows.items()}
+            }
+
+    async def compact(self, retain_days: int, hourly_retain_days: int = 365) -> Optional[Dict]:
+        try:
+            result = await run_blocking(self._compact_locked, retain_days * 24 * 3600, hourly_retain_days * 24 * 3600)
+            logger.info(f"Compacted {self.store.directory}: {result}")
+            return result
+        except Exception as e:
+            logger.error(f"Issues in compact: {e}")
+            return None
+
+    def _read_rollup_locked(self, period: Optional[int], start: Optional[int], end: Optional[int],
+                            hourly: bool) -> Optional[Rows]:
+        with self._lock:
+            self._sync_manifest()
+            state = self.store.compaction
+            if not state.get("tiers"):
+                return None
+
+            if start is None and end is None:
+                latest = self.store.latest_time
+                if latest is None or period is None:
+                    return None
+                lo, hi = latest - period * 3600 + 1, latest
             else:
-                new_data['id'] = 0
-            
-            new_data['timestamp'] = datetime.now().isoformat()
-            
-            return new_data
+                lo = start if start is not None else -2 ** 62
+                hi = end if end is not None else 2 ** 62
+            until = state["until"]
+            if lo >= until:
+                return None
+
+            tiers = self._rollup_tiers()
+            since = state.get("since", {})
+            chosen = [(seconds, tiers[tier], since.get(tier, -2 ** 62)) for tier, seconds in TIERS.items()
+                      if tier in tiers and (not hourly or tier == "hour")]
+            rolled = cover(chosen, lo, min(hi, until - 1))
+            if rolled is None:
+                logger.info(f"No rollup tier answers {lo}..{hi} exactly")
+                return None
+
+            raw = self._read_window_columns(None, lo, hi)
+            first, last = raw.time_window(None, lo, hi)
+            times, ids = raw.time[first:last], raw.column("id")[first:last]
+            keep = (times >= until) | (ids > state["last_id"])
+            retained = WeatherColumns.from_arrays({
+                name: raw.column(name)[first:last][keep] for name in COLUMN_DTYPES
+            })
+            raw_rows = build_rows(retained, TIERS["hour"])
+            late = raw_rows["bucket"] < until
+            if late.any():
+                raw_rows["turn_count"][late] = -1
+            return concat_rows([rolled, raw_rows])
+
+    @instrument("weather_stage_duration_seconds", stage="read_rollup", backend="json")
+    async def read_rollup(self, period: Optional[int] = None, start: Optional[int] = None,
+                          end: Optional[int] = None, hourly: bool = False) -> Optional[Rows]:
+        try:
+            return await run_blocking(self._read_rollup_locked, period, start, end, hourly)
         except Exception as e:
-            logger.error(f"Issues in add_id_and_timestamp: {e}")
-            new_data['id'] = 0
-            new_data['timestamp'] = datetime.now().isoformat()
-            return new_data
-    
+            logger.error(f"Issues in read_rollup: {e}")
+            return None
+
+    @instrument("weather_stage_duration_seconds", stage="read_rolling", backend="json")
+    async def read_rolling(self, window: str) -> Optional[Dict]:
+        try:
+            return await run_blocking(self._read_rolling_locked, window)
+        except Exception as e:
+            logger.error(f"Issues in read_rolling: {e}")
+            self._rolling_seeded = False
+            return None
+
+    def _read_rolling_locked(self, window: str) -> Optional[Dict]:
+        with self._lock:
+            self._sync_rolling()
+            return self.rolling.snapshot(window)
+
+    @instrument("weather_stage_duration_seconds", stage="save_data", backend="json")
     async def save_data(self, data: Dict) -> bool:
         try:
-            old_data = await self.read_data()
-            data = await self.add_id_and_timestamp(old_data, data)
-            old_data.append(data)
+            data['timestamp'] = datetime.now().isoformat()
+            await run_blocking(self._save_locked, [data])
 
-            with open(self.filename, 'w') as f:
-                json.dump(old_data, f, indent=2)
-            
             logger.info(f"Data saved successfully with id: {data.get('id')}")
             return True
         except Exception as e:
             logger.error(f"Issues in save json: {e}")
             return False
+
+    @instrument("weather_stage_duration_seconds", stage="save_many", backend="json")
+    async def save_many(self, records: List[Dict]) -> int:
+        if not records:
+            return 0
+
+        try:
+            timestamp = datetime.now().isoformat()
+            for record in records:
+                record['timestamp'] = timestamp
+            saved = await run_blocking(self._save_locked, records)
+
+            logger.info(f"Saved {saved} records in one write")
+            return saved
+        except Exception as e:
+            logger.error(f"Issues in save_many json: {e}")
+            return 0
+
+    def _save_locked(self, records: List[Dict]) -> int:
+        with self._lock:
+            saved = self.store.append_many(records, assign_ids=True)
+            self.invalidate_cache()
+            if self._cache is not None:
+                self._refresh_cache(self._stat_signature())
+            if self._rolling_seeded:
+                self._sync_rolling()
+            return saved
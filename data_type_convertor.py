@@ -1,31 +1,183 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
 from loguru import logger
+from columnar import WeatherColumns, epoch_seconds
+from blocking_pool import run_blocking
 
 logger.add('logs/df.txt', rotation="1 week")
 
+ARROW_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("time", pa.timestamp("s")),
+    ("interval", pa.int32()),
+    ("temperature", pa.float32()),
+    ("windspeed", pa.float32()),
+    ("winddirection", pa.float32()),
+    ("weathercode", pa.int16()),
+    ("is_day", pa.int8()),
+])
+
+
+def columns_to_table(columns: WeatherColumns) -> pa.Table:
+    arrays = []
+    for field in ARROW_SCHEMA:
+        values = columns.column(field.name)
+        if field.name == "time":
+            arrays.append(pa.array(values.astype("datetime64[s]"), type=field.type))
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=ARROW_SCHEMA)
+
+
+def _time_bounds(start: Optional[datetime], end: Optional[datetime]) -> Tuple[Optional[pa.Scalar], Optional[pa.Scalar]]:
+    """Normalise naive (UTC) or tz-aware bounds to scalars of the stored time type."""
+    time_type = ARROW_SCHEMA.field("time").type
+    lower = None if start is None else pa.scalar(epoch_seconds(start), type=pa.int64()).cast(time_type)
+    upper = None if end is None else pa.scalar(epoch_seconds(end), type=pa.int64()).cast(time_type)
+    return lower, upper
+
+
+def _time_filter(start: Optional[datetime], end: Optional[datetime]) -> Optional[pc.Expression]:
+    lower, upper = _time_bounds(start, end)
+    expression = None
+    if lower is not None:
+        expression = pc.field("time") >= lower
+    if upper is not None:
+        bound = pc.field("time") <= upper
+        expression = bound if expression is None else expression & bound
+    return expression
+
+
+def _time_filter_mask(times: pa.Array, lower: Optional[pa.Scalar], upper: Optional[pa.Scalar]) -> pa.Array:
+    if lower is None:
+        return pc.less_equal(times, upper)
+    if upper is None:
+        return pc.greater_equal(times, lower)
+    return pc.and_(pc.greater_equal(times, lower), pc.less_equal(times, upper))
+
+
+def _filter_batch(batch: pa.RecordBatch, lower: Optional[pa.Scalar],
+                  upper: Optional[pa.Scalar]) -> Optional[pa.RecordBatch]:
+    if lower is None and upper is None:
+        return batch
+    if batch.num_rows == 0:
+        return None
+    bounds = pc.min_max(batch.column("time"))
+    low, high = bounds["min"], bounds["max"]
+    if (lower is not None and high.as_py() < lower.as_py()) or (upper is not None and low.as_py() > upper.as_py()):
+        return None
+    if (lower is None or low.as_py() >= lower.as_py()) and (upper is None or high.as_py() <= upper.as_py()):
+        return batch
+    return batch.filter(_time_filter_mask(batch.column("time"), lower, upper))
+
+
+def _read_arrow_table(path: str, columns: Optional[List[str]], start: Optional[datetime],
+                      end: Optional[datetime]) -> pa.Table:
+    """Read an Arrow IPC file batch by batch from a memory map.
+
+    Batches wholly outside ``start``/``end`` are skipped and batches wholly
+    inside are kept as-is, so only the batches straddling a bound are copied.
+    """
+    lower, upper = _time_bounds(start, end)
+    with pa.memory_map(path, "r") as source:
+        reader = pa.ipc.open_file(source)
+        schema = reader.schema if columns is None else pa.schema([reader.schema.field(name) for name in columns])
+        batches = []
+        for index in range(reader.num_record_batches):
+            batch = _filter_batch(reader.get_batch(index), lower, upper)
+            if batch is None:
+                continue
+            batches.append(batch if columns is None else batch.select(columns))
+        return pa.Table.from_batches(batches, schema=schema)
+
+
 class WeatherDataConverter:
-    def __init__(self , data:List[Dict]):
-        self.raw_data = data
-        self.df = None 
+    def __init__(self , data:Optional[List[Dict]] = None, columns: Optional[WeatherColumns] = None):
+        self.raw_data = data if data is not None else []
+        self.columns = columns
+        self.df = None
+
+    @classmethod
+    def from_columns(cls, columns: WeatherColumns) -> "WeatherDataConverter":
+        return cls(columns=columns)
+
+    def __len__(self) -> int:
+        return len(self.columns) if self.columns is not None else len(self.raw_data)
+
+    def _build_dataframe(self) -> pd.DataFrame:
+        if self.columns is not None:
+            return self.to_table().to_pandas()
+        df = pd.DataFrame(self.raw_data)
+
+        if "time" in df.columns:
+            df["time"] = pd.to_datetime(df["time"])
+
+        if "time" in df.columns:
+            df = df.sort_values("time").reset_index(drop=True)
+        return df
 
     async def to_dataframe(self):
         try:
-            df = pd.DataFrame(self.raw_data)
+            df = await run_blocking(self._build_dataframe)
+            self.df = df
+            return df
+        except Exception as e :
+            logger.info(f"we have issues with to dataframe : {e}")
+            return None
 
-            if "time" in df.columns:
-                df["time"] = pd.to_datetime(df["time"])
+    def to_table(self) -> pa.Table:
+        columns = self.columns if self.columns is not None else WeatherColumns.from_records(self.raw_data)
+        return columns_to_table(columns)
 
-            if "time" in df.columns:
-                df = df.sort_values("time").reset_index(drop=True)
+    async def to_parquet(self, path: str, compression: str = "zstd", row_group_size: int = 24 * 31) -> bool:
+        try:
+            table = await run_blocking(self.to_table)
+            await run_blocking(pq.write_table, table, path, compression=compression, row_group_size=row_group_size)
+            logger.info(f"Wrote {len(self)} records to {path}")
+            return True
+        except Exception as e :
+            logger.info(f"we have issues with to parquet : {e}")
+            return False
 
-            self.df = df 
-            return df 
+    async def to_arrow(self, path: str, batch_size: int = 24 * 31) -> bool:
+        try:
+            await run_blocking(self._write_arrow, path, batch_size)
+            logger.info(f"Wrote {len(self)} records to {path}")
+            return True
         except Exception as e :
-            logger.info(f"we have issues with to dataframe : {e}")
-            return None 
-    
+            logger.info(f"we have issues with to arrow : {e}")
+            return False
+
+    def _write_arrow(self, path: str, batch_size: int):
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, ARROW_SCHEMA) as writer:
+                writer.write_table(self.to_table(), max_chunksize=batch_size)
+
+    @staticmethod
+    async def read_parquet(path: str, columns: Optional[List[str]] = None,
+                           start: Optional[datetime] = None, end: Optional[datetime] = None):
+        try:
+            table = await run_blocking(pq.read_table, path, columns=columns, filters=_time_filter(start, end), memory_map=True)
+            return await run_blocking(table.to_pandas)
+        except Exception as e :
+            logger.info(f"we have issues with read parquet : {e}")
+            return None
+
+    @staticmethod
+    async def read_arrow(path: str, columns: Optional[List[str]] = None,
+                         start: Optional[datetime] = None, end: Optional[datetime] = None):
+        try:
+            table = await run_blocking(_read_arrow_table, path, columns, start, end)
+            return await run_blocking(table.to_pandas)
+        except Exception as e :
+            logger.info(f"we have issues with read arrow : {e}")
+            return None
+
     async def info(self):
         try:
             if self.df is None :
@@ -33,7 +185,7 @@ class WeatherDataConverter:
             print(f"Info is : {self.df.info()}")
         except Exception as e :
             logger.info(f"we have issues with info {e}")
-            return None 
-        
-    
-        
\ No newline at end of file
+            return None
+
+
+
@@ -1,10 +1,11 @@
 #!/bin/bash
 
-echo "Starting cron service..."
-cron
-
-echo "Running initial weather data fetch..."
-python /app/fetch_weather.py
+echo "Starting ingest daemon..."
+(cd /app && while true; do
+    python /app/ingest_daemon.py
+    echo "Ingest daemon exited with status $?, restarting in 5s"
+    sleep 5
+done) &
 
 echo "Starting FastAPI server..."
-exec uvicorn apis:app --host 0.0.0.0 --port 8000
\ No newline at end of file
+exec uvicorn apis:app --host 0.0.0.0 --port 8000 --workers "${API_WORKERS:-1}"
\ No newline at end of file
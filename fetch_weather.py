@@ -1,19 +1,169 @@
-import requests
+import httpx
 import asyncio
+import json
+import os
+import random
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
 from loguru import logger
-from data_json_manager import JSONDataManager
+from catalog import DEFAULT_LOCATIONS, Location, StationCatalog
 
 logger.add('logs/fetch.txt', rotation="1 week")
 
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+HOURLY_VARIABLES = ("temperature_2m", "windspeed_10m", "winddirection_10m", "weathercode", "is_day")
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
 
-async def fetch_weather_data(lat: float, lon: float):
+
+class RateLimiter:
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class WeatherFetcher:
+
+    def __init__(self, base_url: str = OPEN_METEO_URL, max_concurrency: int = 10,
+                 requests_per_second: float = 5.0, max_retries: int = 3, backoff_base: float = 0.5,
+                 batch_size: int = 50, timeout: float = 10.0, keepalive_expiry: float = 5.0):
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.keepalive_expiry = keepalive_expiry
+
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.limiters: Dict[str, RateLimiter] = {}
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self) -> "WeatherFetcher":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency,
+                                    keepalive_expiry=self.keepalive_expiry)
+            )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _limiter(self, url: str) -> RateLimiter:
+        host = urlparse(url).netloc
+        if host not in self.limiters:
+            self.limiters[host] = RateLimiter(self.requests_per_second, burst=max(1, int(self.requests_per_second)))
+        return self.limiters[host]
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    async def _get_json(self, params: Dict):
+        await self.open()
+        limiter = self._limiter(self.base_url)
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with self.semaphore:
+                    await limiter.acquire()
+                    response = await self.client.get(self.base_url, params=params)
+                if response.status_code not in RETRYABLE_STATUS:
+                    response.raise_for_status()
+                    return response.json()
+                retry_after = response.headers.get("Retry-After")
+                error = httpx.HTTPStatusError(
+                    f"Retryable status {response.status_code}", request=response.request, response=response
+                )
+            except httpx.TransportError as e:
+                error = e
+
+            if attempt == self.max_retries:
+                raise error
+            delay = self._backoff(attempt, retry_after)
+            logger.warning(f"Request failed ({error}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def fetch_batch(self, locations: List[Location]) -> Dict[str, Dict]:
+        params = {
+            "latitude": ",".join(str(location.lat) for location in locations),
+            "longitude": ",".join(str(location.lon) for location in locations),
+            "current_weather": "true"
+        }
+        result = await self._get_json(params)
+        results = result if isinstance(result, list) else [result]
+        if len(results) != len(locations):
+            raise KeyError(f"expected {len(locations)} results, got {len(results)}")
+
+        return {location.name: item["current_weather"] for location, item in zip(locations, results)}
+
+    async def fetch_hourly_batch(self, locations: List[Location], start_date: str, end_date: str) -> Dict[str, Dict]:
+        params = {
+            "latitude": ",".join(str(location.lat) for location in locations),
+            "longitude": ",".join(str(location.lon) for location in locations),
+            "hourly": ",".join(HOURLY_VARIABLES),
+            "start_date": start_date,
+            "end_date": end_date,
+            "timezone": "GMT"
+        }
+        result = await self._get_json(params)
+        results = result if isinstance(result, list) else [result]
+        if len(results) != len(locations):
+            raise KeyError(f"expected {len(locations)} results, got {len(results)}")
+
+        return {location.name: item["hourly"] for location, item in zip(locations, results)}
+
+    async def fetch_all(self, locations: List[Location]) -> Dict[str, Dict]:
+        batches = [locations[i:i + self.batch_size] for i in range(0, len(locations), self.batch_size)]
+        responses = await asyncio.gather(*(self.fetch_batch(batch) for batch in batches), return_exceptions=True)
+
+        weather = {}
+        for batch, response in zip(batches, responses):
+            if isinstance(response, Exception):
+                logger.error(f"Error fetching batch {[location.name for location in batch]}: {response}")
+                continue
+            weather.update(response)
+        return weather
+
+
+async def fetch_weather_data(lat: float, lon: float, base_url: str = OPEN_METEO_URL):
     try:
-        url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current_weather=true"
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        result = response.json()
-        return result["current_weather"]
-    except requests.RequestException as e:
+        async with WeatherFetcher(base_url=base_url) as fetcher:
+            result = await fetcher.fetch_batch([Location("single", lat, lon)])
+            return result["single"]
+    except httpx.HTTPError as e:
         logger.error(f"Error fetching weather data: {e}")
         raise
     except KeyError as e:
@@ -21,16 +171,34 @@ async def fetch_weather_data(lat: float, lon: float):
         raise
 
 
+def load_locations(path: Optional[str] = None, catalog: Optional[StationCatalog] = None) -> List[Location]:
+    path = path or os.environ.get("WEATHER_LOCATIONS_FILE")
+    if not path:
+        return catalog.locations() if catalog is not None else DEFAULT_LOCATIONS
+
+    try:
+        with open(path, 'r') as f:
+            return [Location(item["name"], float(item["lat"]), float(item["lon"])) for item in json.load(f)]
+    except Exception as e:
+        logger.error(f"Issues loading locations from {path}, using defaults: {e}")
+        return DEFAULT_LOCATIONS
+
+
 async def main():
     try:
         logger.info("Starting weather data collection")
-        lat, lon = 35.685017, 51.389693
-        
-        weather_data = await fetch_weather_data(lat, lon)
-        data_manager = JSONDataManager('data/forecast_data_tehran.json')
-        await data_manager.save_data(weather_data)
-        
-        logger.info("Weather data collection completed")
+        catalog = StationCatalog(backend=os.environ.get("WEATHER_BACKEND", "json"))
+        locations = load_locations(catalog=catalog)
+        for location in locations:
+            catalog.register(location)
+
+        async with WeatherFetcher() as fetcher:
+            weather = await fetcher.fetch_all(locations)
+
+        for name, weather_data in weather.items():
+            await catalog.manager(name).save_data(weather_data)
+
+        logger.info(f"Weather data collection completed for {len(weather)}/{len(locations)} locations")
     except Exception as e:
         logger.error(f"Issues in main: {e}")
 
@@ -0,0 +1,90 @@
+from loguru import logger
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+logger.add('logs/file_lock.txt', rotation="1 week")
+
+
+class LockTimeout(Exception):
+    pass
+
+
+class FileLock:
+
+    def __init__(self, path: str, timeout: Optional[float] = 30.0, poll_interval: float = 0.05):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd: Optional[int] = None
+        self._depth = 0
+        self._owner: Optional[int] = None
+        self._thread_lock = threading.Lock()
+
+    @property
+    def is_held(self) -> bool:
+        return self._owner == threading.get_ident()
+
+    def acquire(self, shared: bool = False):
+        if self.is_held:
+            self._depth += 1
+            return
+
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        if not self._thread_lock.acquire(timeout=-1 if deadline is None else self.timeout):
+            raise LockTimeout(f"Timed out waiting for lock {self.path}")
+
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is not None:
+                mode = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB
+                while True:
+                    try:
+                        fcntl.flock(fd, mode)
+                        break
+                    except BlockingIOError:
+                        if deadline is not None and time.monotonic() >= deadline:
+                            os.close(fd)
+                            raise LockTimeout(f"Timed out waiting for lock {self.path}")
+                        time.sleep(self.poll_interval)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+        self._fd = fd
+        self._depth = 1
+        self._owner = threading.get_ident()
+
+    def release(self):
+        if not self.is_held:
+            return
+        self._depth -= 1
+        if self._depth:
+            return
+
+        fd, self._fd, self._owner = self._fd, None, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+            self._thread_lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+if fcntl is None:
+    logger.warning("fcntl is unavailable, file locks will not exclude other processes")
@@ -0,0 +1,474 @@
+from loguru import logger
+import asyncio
+import math
+import threading
+import time
+import numpy as np
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+from blocking_pool import run_blocking
+from columnar import record_epoch
+from instrumentation import instrument
+from rollups import series_from_rows
+from series import bucket_aggregate, format_times
+
+
+logger.add('logs/forecasting.txt', rotation="1 week")
+
+FORECAST_FIELDS = ("temperature", "windspeed")
+NON_NEGATIVE = ("windspeed",)
+STEP = 3600
+SEASON = 24
+
+DEFAULT_HISTORY_DAYS = 30
+DEFAULT_HORIZON = 24
+MAX_HORIZON = 7 * 24
+DEFAULT_THRESHOLD = 3.0
+MIN_THRESHOLD = 2.0
+EVENT_HOURS = 7 * 24
+MAX_EVENTS = 50_000
+CLOSE_GRACE = 300
+REFRESH_INTERVAL = 5.0
+
+ALPHA = 0.3
+BETA = 0.01
+GAMMA = 0.2
+PHI = 0.98
+BASELINE_HALF_LIFE = 24
+
+
+class BatchForecaster:
+
+    def __init__(self, alpha: float = ALPHA, beta: float = BETA, gamma: float = GAMMA, phi: float = PHI,
+                 half_life: float = BASELINE_HALF_LIFE, min_threshold: float = MIN_THRESHOLD,
+                 warmup: int = 2 * SEASON, max_events: int = MAX_EVENTS):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.phi = phi
+        self.log_phi = np.log(phi)
+        self.smoothing = 1 - 0.5 ** (1 / half_life)
+        self.min_threshold = min_threshold
+        self.warmup = warmup
+
+        self.names: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.events = deque(maxlen=max_events)
+        self.late = 0
+
+        self.hour = np.empty(0, dtype=np.int64)
+        self.count = np.empty(0, dtype=np.int64)
+        self.level = np.empty(0)
+        self.trend = np.empty(0)
+        self.season = np.empty((SEASON, 0))
+        self.mean = np.empty(0)
+        self.var = np.empty(0)
+        self.error_var = np.empty(0)
+
+        self.value = np.empty(0)
+        self.expected = np.empty(0)
+        self.zscore = np.empty(0)
+        self.residual_score = np.empty(0)
+
+        self.open_hour = np.empty(0, dtype=np.int64)
+        self.open_sum = np.empty(0)
+        self.open_count = np.empty(0)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def stations(self, names: Sequence[str]) -> np.ndarray:
+        added = [name for name in dict.fromkeys(names) if name not in self.index]
+        if added:
+            for name in added:
+                self.index[name] = len(self.names)
+                self.names.append(name)
+            size = len(added) * len(FORECAST_FIELDS)
+            for name, fill in (("hour", -1), ("count", 0), ("open_hour", -1)):
+                setattr(self, name, np.concatenate((getattr(self, name), np.full(size, fill, dtype=np.int64))))
+            for name in ("level", "trend", "mean", "var", "error_var", "open_sum", "open_count"):
+                setattr(self, name, np.concatenate((getattr(self, name), np.zeros(size))))
+            for name in ("value", "expected", "zscore", "residual_score"):
+                setattr(self, name, np.concatenate((getattr(self, name), np.full(size, np.nan))))
+            self.season = np.concatenate((self.season, np.zeros((SEASON, size))), axis=1)
+        return np.array([self.index[name] for name in names], dtype=np.int64)
+
+    def series_of(self, rows: np.ndarray) -> np.ndarray:
+        fields = len(FORECAST_FIELDS)
+        return (rows[:, None] * fields + np.arange(fields)).ravel()
+
+    def _reach(self, steps: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        decay = np.exp(steps * self.log_phi)
+        return decay, self.phi * (1 - decay) / (1 - self.phi)
+
+    def _start(self, part: slice, fresh: np.ndarray, hours: np.ndarray, values: np.ndarray):
+        for name in ("level", "mean", "value"):
+            np.copyto(getattr(self, name)[part], values, where=fresh)
+        for name in ("trend", "var", "error_var"):
+            np.copyto(getattr(self, name)[part], 0.0, where=fresh)
+        for name in ("expected", "zscore", "residual_score"):
+            np.copyto(getattr(self, name)[part], np.nan, where=fresh)
+        np.copyto(self.hour[part], hours, where=fresh)
+        np.copyto(self.count[part], 1, where=fresh)
+        self.season[:, part][:, fresh] = 0.0
+
+    def step(self, part: slice, hours: np.ndarray, values: np.ndarray, valid: np.ndarray, record: bool = True) -> int:
+        last, count = self.hour[part], self.count[part]
+        late = valid & (hours <= last)
+        if late.any():
+            self.late += int(late.sum())
+            valid = valid & ~late
+
+        fresh = valid & (count == 0)
+        if fresh.any():
+            self._start(part, fresh, hours, values)
+            valid = valid & ~fresh
+        if not valid.any():
+            return int(fresh.sum())
+
+        level, trend = self.level[part], self.trend[part]
+        mean, var, error_var = self.mean[part], self.var[part], self.error_var[part]
+        if (hours == hours[0]).all():
+            seasonal = self.season[int(hours[0]) % SEASON, part]
+            columns = None
+        else:
+            columns = (hours % SEASON, np.arange(part.start, part.stop))
+            seasonal = self.season[columns]
+
+        with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+            decay, reach = self._reach(hours - last)
+            expected = level + reach * trend
+            forecast = expected + seasonal
+            residual = values - forecast
+            deviation = values - mean
+            warm = valid & (count >= self.warmup)
+            zscore = np.where(warm & (var > 0), deviation / np.sqrt(var), np.nan)
+            residual_score = np.where(warm & (error_var > 0), residual / np.sqrt(error_var), np.nan)
+
+            new_level = self.alpha * (values - seasonal) + (1 - self.alpha) * expected
+            new_trend = self.beta * (new_level - expected + decay * trend) + (1 - self.beta) * decay * trend
+            new_season = self.gamma * (values - new_level) + (1 - self.gamma) * seasonal
+            increment = self.smoothing * deviation
+            new_var = (1 - self.smoothing) * (var + deviation * increment)
+            new_error_var = (1 - self.smoothing) * error_var + self.smoothing * residual * residual
+
+        np.copyto(trend, new_trend, where=valid)
+        np.copyto(level, new_level, where=valid)
+        if columns is None:
+            np.copyto(seasonal, new_season, where=valid)
+        else:
+            self.season[columns[0][valid], columns[1][valid]] = new_season[valid]
+        np.copyto(mean, mean + increment, where=valid)
+        np.copyto(var, new_var, where=valid)
+        np.copyto(error_var, new_error_var, where=valid)
+
+        np.copyto(self.value[part], values, where=valid)
+        np.copyto(self.expected[part], forecast, where=valid)
+        np.copyto(self.zscore[part], zscore, where=valid)
+        np.copyto(self.residual_score[part], residual_score, where=valid)
+        np.copyto(last, hours, where=valid)
+        count += valid
+
+        if record:
+            with np.errstate(invalid="ignore"):
+                flagged = np.fmax(np.abs(zscore), np.abs(residual_score)) >= self.min_threshold
+            for i in np.flatnonzero(flagged & valid).tolist():
+                self.events.append((int(hours[i]), part.start + i, float(values[i]), float(forecast[i]),
+                                    float(zscore[i]), float(residual_score[i])))
+        return int(valid.sum()) + int(fresh.sum())
+
+    def fit(self, names: Sequence[str], first_hour: int, matrix: np.ndarray, record_after: Optional[int] = None) -> int:
+        series = self.series_of(self.stations(names))
+        if not series.size:
+            return 0
+
+        lo, hi = int(series.min()), int(series.max()) + 1
+        if hi - lo != series.size or (series != np.arange(lo, hi)).any():
+            expanded = np.full((matrix.shape[0], hi - lo), np.nan)
+            expanded[:, series - lo] = matrix
+            matrix = expanded
+
+        part = slice(lo, hi)
+        record_after = first_hour + matrix.shape[0] - EVENT_HOURS if record_after is None else record_after
+        applied = 0
+        for offset, column in enumerate(matrix):
+            valid = ~np.isnan(column)
+            if valid.any():
+                hour = first_hour + offset
+                applied += self.step(part, np.full(hi - lo, hour), column, valid, hour >= record_after)
+        return applied
+
+    def observe(self, name: str, moment: int, values: Sequence[Optional[float]], weight: int = 1) -> bool:
+        series = self.series_of(self.stations([name]))
+        hour = moment // STEP
+        if hour <= self.hour[series].max() or hour < self.open_hour[series].max():
+            self.late += 1
+            return False
+
+        for position, value in zip(series.tolist(), values):
+            if value is None or np.isnan(value):
+                continue
+            if self.open_hour[position] != hour:
+                if self.open_count[position]:
+                    self._close(slice(position, position + 1), np.ones(1, dtype=bool))
+                self.open_hour[position] = hour
+            self.open_sum[position] += value * weight
+            self.open_count[position] += weight
+        return True
+
+    def _close(self, part: slice, ready: np.ndarray, record: bool = True) -> int:
+        values = np.full(ready.size, np.nan)
+        np.divide(self.open_sum[part], self.open_count[part], out=values, where=ready)
+        applied = self.step(part, self.open_hour[part], values, ready, record)
+        np.copyto(self.open_sum[part], 0.0, where=ready)
+        np.copyto(self.open_count[part], 0.0, where=ready)
+        np.copyto(self.open_hour[part], -1, where=ready)
+        return applied
+
+    def close_hours(self, before_hour: int) -> int:
+        ready = (self.open_count > 0) & (self.open_hour < before_hour)
+        return self._close(slice(0, ready.size), ready) if ready.any() else 0
+
+    def forecast(self, horizon: int, rows: Optional[np.ndarray] = None) -> Dict[str, Optional[Dict]]:
+        rows = np.arange(len(self.names)) if rows is None else rows
+        fields = len(FORECAST_FIELDS)
+        series = self.series_of(rows)
+        hours = self.hour[series].reshape(-1, fields)
+        origin = hours.max(axis=1)
+        targets = origin[:, None] + np.arange(1, horizon + 1)
+
+        steps = np.repeat(targets, fields, axis=0) - self.hour[series][:, None]
+        decay, reach = self._reach(steps)
+        phase = np.repeat(targets, fields, axis=0) % SEASON
+        values = self.level[series][:, None] + reach * self.trend[series][:, None] + \
+            self.season[phase, series[:, None]]
+        for name in NON_NEGATIVE:
+            position = FORECAST_FIELDS.index(name)
+            values[position::fields] = np.maximum(values[position::fields], 0.0)
+        values[self.count[series] < self.warmup] = np.nan
+        values = np.round(values.reshape(len(rows), fields, horizon), 2)
+        rmse = np.round(np.sqrt(self.error_var[series]), 2).reshape(-1, fields)
+
+        labels = hour_labels(np.concatenate((origin, targets.ravel())))
+        results = {}
+        for i, row in enumerate(rows.tolist()):
+            if np.isnan(values[i]).all():
+                results[self.names[row]] = None
+                continue
+            columns = [
+                [None if math.isnan(value) else value for value in values[i, position].tolist()]
+                for position in range(fields)
+            ]
+            results[self.names[row]] = {
+                "from": labels[int(origin[i])],
+                "rmse": {
+                    name: None if np.isnan(values[i, position]).all() else float(rmse[i, position])
+                    for position, name in enumerate(FORECAST_FIELDS)
+                },
+                "points": [
+                    {"time": labels[target], **dict(zip(FORECAST_FIELDS, point))}
+                    for target, point in zip(targets[i].tolist(), zip(*columns))
+                ]
+            }
+        return results
+
+    def anomalies(self, since_hour: int, threshold: float,
+                  rows: Optional[np.ndarray] = None) -> Tuple[Dict[str, Dict], List[Dict]]:
+        rows = np.arange(len(self.names)) if rows is None else rows
+        fields = len(FORECAST_FIELDS)
+        series = self.series_of(rows)
+        series = series[self.count[series] > 0]
+
+        wanted = set(series.tolist())
+        recent = [event for event in self.events if event[0] >= since_hour and event[1] in wanted and
+                  max(abs(event[4]) if not math.isnan(event[4]) else 0.0,
+                      abs(event[5]) if not math.isnan(event[5]) else 0.0) >= threshold]
+        labels = hour_labels(np.array([event[0] for event in recent] + self.hour[series].tolist(), dtype=np.int64))
+
+        current = {}
+        for position, hour, value, expected, zscore, residual_score in zip(
+            series.tolist(), self.hour[series].tolist(), self.value[series].tolist(),
+            self.expected[series].tolist(), self.zscore[series].tolist(), self.residual_score[series].tolist()
+        ):
+            station = current.setdefault(self.names[position // fields], {})
+            station[FORECAST_FIELDS[position % fields]] = score_entry(
+                labels[hour], value, expected, zscore, residual_score, threshold
+            )
+
+        events = [
+            {"location": self.names[position // fields], "field": FORECAST_FIELDS[position % fields],
+             **score_entry(labels[hour], value, expected, zscore, residual_score, threshold)}
+            for hour, position, value, expected, zscore, residual_score in recent
+        ]
+        return current, events
+
+
+def hour_labels(hours: np.ndarray) -> Dict[int, str]:
+    unique = np.unique(hours)
+    return dict(zip(unique.tolist(), format_times(unique * STEP)))
+
+
+def score_entry(label: str, value: float, expected: float, zscore: float, residual_score: float,
+                threshold: float) -> Dict:
+    methods = [
+        method for method, score in (("zscore", zscore), ("forecast", residual_score))
+        if not math.isnan(score) and abs(score) >= threshold
+    ]
+    return {
+        "time": label,
+        "value": round(value, 2),
+        "expected": None if math.isnan(expected) else round(expected, 2),
+        "zscore": None if math.isnan(zscore) else round(zscore, 2),
+        "forecast_score": None if math.isnan(residual_score) else round(residual_score, 2),
+        "anomaly": bool(methods),
+        "methods": methods
+    }
+
+
+async def hourly_history(manager, hours: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    read_rollup = getattr(manager, "read_rollup", None)
+    rows = await read_rollup(hours, None, None, True) if read_rollup is not None else None
+    if rows is not None and rows["count"].sum():
+        buckets = [series_from_rows(rows, field, "hour") for field in FORECAST_FIELDS]
+    else:
+        data = await manager.read_columns(hours)
+        lo, hi = data.time_window(hours)
+        buckets = [bucket_aggregate(data.time[lo:hi], data.column(field)[lo:hi], "hour") for field in FORECAST_FIELDS]
+
+    return (
+        buckets[0]["time"] // STEP,
+        np.column_stack([bucket["mean"] for bucket in buckets]),
+        buckets[0]["count"]
+    )
+
+
+def history_matrix(histories: List[Tuple[np.ndarray, np.ndarray, np.ndarray]]) -> Tuple[int, np.ndarray]:
+    fields = len(FORECAST_FIELDS)
+    filled = [hours for hours, _, _ in histories if hours.size]
+    if not filled:
+        return 0, np.empty((0, len(histories) * fields))
+
+    first = int(min(hours[0] for hours in filled))
+    last = int(max(hours[-1] for hours in filled))
+    matrix = np.full((last - first + 1, len(histories) * fields), np.nan)
+    for i, (hours, values, _) in enumerate(histories):
+        matrix[hours - first, i * fields:(i + 1) * fields] = values
+    return first, matrix
+
+
+class ForecastService:
+
+    def __init__(self, catalog, history_days: int = DEFAULT_HISTORY_DAYS, refresh_interval: float = REFRESH_INTERVAL):
+        self.catalog = catalog
+        self.history_hours = history_days * 24
+        self.refresh_interval = refresh_interval
+        self.model = BatchForecaster()
+        self.versions: Dict[str, int] = {}
+        self.refreshed = 0.0
+        self._refreshing = asyncio.Lock()
+        self._lock = threading.Lock()
+
+    async def _seed(self, names: List[str]):
+        histories, open_hour = [], (int(time.time()) - CLOSE_GRACE) // STEP
+        for name in names:
+            manager = self.catalog.manager(name)
+            self.versions[name] = manager.data_version()
+            histories.append(await hourly_history(manager, self.history_hours))
+        await run_blocking(self._seed_locked, names, histories, open_hour)
+        logger.info(f"Seeded forecasts for {len(names)} stations from {self.history_hours}h of history")
+
+    def _seed_locked(self, names: List[str], histories: List, open_hour: int):
+        closed, still_open = [], []
+        for name, (hours, values, counts) in zip(names, histories):
+            current = hours >= open_hour
+            closed.append((hours[~current], values[~current], counts[~current]))
+            still_open.extend((name, int(hour) * STEP, row, int(count))
+                              for hour, row, count in zip(hours[current], values[current].tolist(), counts[current]))
+
+        first, matrix = history_matrix(closed)
+        with self._lock:
+            self.model.fit(names, first, matrix)
+            for name, moment, row, count in still_open:
+                self.model.observe(name, moment, row, count)
+
+    def _catch_up_locked(self, name: str, manager, after_id: int) -> int:
+        observed = 0
+        records = list(manager.iter_after(after_id, fields=("time",) + FORECAST_FIELDS))
+        with self._lock:
+            for record in records:
+                moment = record_epoch(record)
+                if moment is not None:
+                    observed += self.model.observe(name, moment, [record.get(field) for field in FORECAST_FIELDS])
+        return observed
+
+    @instrument("weather_forecast_duration_seconds", stage="refresh")
+    async def refresh(self, force: bool = False):
+        async with self._refreshing:
+            if not force and time.monotonic() - self.refreshed < self.refresh_interval:
+                return
+
+            names = [location.name for location in self.catalog.locations()]
+            new = [name for name in names if name not in self.versions]
+            if new:
+                await self._seed(new)
+
+            for name in names:
+                if name in new:
+                    continue
+                manager = self.catalog.manager(name)
+                version = manager.data_version()
+                if version > self.versions[name]:
+                    await run_blocking(self._catch_up_locked, name, manager, self.versions[name])
+                    self.versions[name] = version
+
+            await run_blocking(self._close_locked, (int(time.time()) - CLOSE_GRACE) // STEP)
+            self.refreshed = time.monotonic()
+
+    def _close_locked(self, before_hour: int) -> int:
+        with self._lock:
+            return self.model.close_hours(before_hour)
+
+    def _rows(self, location: Optional[str]) -> Optional[np.ndarray]:
+        if location is None:
+            return None
+        return np.array([self.model.index[location]], dtype=np.int64)
+
+    def _forecast_locked(self, horizon: int, location: Optional[str]) -> Dict[str, Optional[Dict]]:
+        with self._lock:
+            return self.model.forecast(horizon, self._rows(location))
+
+    def _anomalies_locked(self, hours: int, threshold: float, location: Optional[str]) -> Dict:
+        with self._lock:
+            latest = int(self.model.hour.max()) if self.model.hour.size else 0
+            current, events = self.model.anomalies(latest - hours + 1, threshold, self._rows(location))
+        return {"current": current, "events": events}
+
+    @instrument("weather_forecast_duration_seconds", stage="forecast")
+    async def forecast(self, horizon: int = DEFAULT_HORIZON, location: Optional[str] = None) -> Optional[Dict]:
+        try:
+            await self.refresh()
+            if location is not None and location not in self.model.index:
+                return {location: None}
+            return await run_blocking(self._forecast_locked, horizon, location)
+        except Exception as e:
+            logger.error(f"Error in forecast: {e}")
+            return None
+
+    @instrument("weather_forecast_duration_seconds", stage="anomalies")
+    async def anomalies(self, hours: int = 24, threshold: float = DEFAULT_THRESHOLD,
+                        location: Optional[str] = None) -> Optional[Dict]:
+        try:
+            await self.refresh()
+            if location is not None and location not in self.model.index:
+                return {"current": {}, "events": []}
+            return await run_blocking(self._anomalies_locked, hours, threshold, location)
+        except Exception as e:
+            logger.error(f"Error in anomalies: {e}")
+            return None
+
+    def stats(self) -> Dict:
+        return {
+            "stations": len(self.model),
+            "late_observations": self.model.late,
+            "events": len(self.model.events)
+        }
@@ -11,6 +11,17 @@ async function apiRequest(endpoint) {
     }
 }
 
+function subscribeUpdates(location, onUpdate) {
+    const source = new EventSource(`${API_BASE_URL}/stream?location=${encodeURIComponent(location)}`);
+    source.addEventListener('observation', (event) => {
+        onUpdate(JSON.parse(event.data));
+    });
+    source.onerror = (error) => {
+        console.error('Stream Error:', error);
+    };
+    return source;
+}
+
 function showLoading(show = true) {
     const loading = document.getElementById('loading');
     if (loading) {
@@ -1 +1,2 @@
-const API_BASE_URL = 'http://localhost:8342';
\ No newline at end of file
+const API_BASE_URL = 'http://localhost:8342';
+const DEFAULT_LOCATION = 'tehran';
\ No newline at end of file
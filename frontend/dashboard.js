@@ -1,11 +1,39 @@
+let updateSource = null;
+
+function selectedLocation() {
+    return document.getElementById('location').value || DEFAULT_LOCATION;
+}
+
+async function loadLocations() {
+    const select = document.getElementById('location');
+    let names = [DEFAULT_LOCATION];
+    try {
+        const data = await apiRequest('/locations');
+        names = Object.keys(data.locations).length ? Object.keys(data.locations) : names;
+    } catch (error) {
+        console.error('Failed to load locations:', error);
+    }
+    select.innerHTML = names.map(name => `<option value="${name}">${name}</option>`).join('');
+    select.value = names.includes(DEFAULT_LOCATION) ? DEFAULT_LOCATION : names[0];
+}
+
+function selectLocation(location) {
+    if (updateSource) {
+        updateSource.close();
+    }
+    updateSource = subscribeUpdates(location, handleUpdate);
+    loadSummary();
+}
+
 async function loadSummary() {
     showLoading(true);
     hideError();
     
     const period = document.getElementById('period').value;
+    const location = encodeURIComponent(selectedLocation());
     
     try {
-        const data = await apiRequest(`/summary?period=${period}`);
+        const data = await apiRequest(`/summary?period=${period}&location=${location}`);
         displaySummary(data.summary);
         showLoading(false);
     } catch (error) {
@@ -67,4 +95,15 @@ function displaySummary(summary) {
     `;
 }
 
-window.onload = loadSummary;
\ No newline at end of file
+function handleUpdate(update) {
+    if (document.getElementById('period').value === '24' && update.summary) {
+        displaySummary(update.summary);
+    } else {
+        loadSummary();
+    }
+}
+
+window.onload = async () => {
+    await loadLocations();
+    selectLocation(selectedLocation());
+};
\ No newline at end of file
@@ -0,0 +1,378 @@
+from loguru import logger
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from backfill import stored_times
+from catalog import Location, StationCatalog
+from columnar import record_epoch
+from compaction import DEFAULT_HOURLY_RETAIN_DAYS, DEFAULT_RETAIN_DAYS, compact_catalog
+from fetch_weather import OPEN_METEO_URL, WeatherFetcher, load_locations
+from file_lock import FileLock, LockTimeout
+from observation import Observation, SchemaError, format_time
+
+
+logger.add('logs/ingest_daemon.txt', rotation="1 week")
+
+DEFAULT_INTERVAL = 3600
+DEFAULT_JITTER = 0.05
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_MAX_PENDING = 1000
+DEFAULT_COMPACT_INTERVAL = 24 * 3600
+KEEPALIVE_EXPIRY = 300.0
+HEALTH_NAME = "ingest_health.json"
+LOCK_NAME = "ingest.lock"
+FAILURES_BEFORE_DEGRADED = 3
+
+
+def parse_cadences(text: Optional[str]) -> Dict[str, float]:
+    cadences = {}
+    for item in (text or "").split(","):
+        if not item.strip():
+            continue
+        name, _, seconds = item.partition("=")
+        cadences[name.strip()] = float(seconds)
+    return cadences
+
+
+def read_health(path: str) -> Dict:
+    try:
+        with open(path, 'r') as f:
+            health = json.load(f)
+    except FileNotFoundError:
+        return {"status": "down", "reason": "ingest daemon has not reported yet"}
+    except json.JSONDecodeError as e:
+        return {"status": "down", "reason": f"unreadable health file: {e}"}
+
+    health["age_s"] = round(time.time() - health.get("updated", 0), 1)
+    if health["age_s"] > max(3 * health.get("flush_interval_s", DEFAULT_FLUSH_INTERVAL), 60):
+        health["status"] = "down"
+        health["reason"] = "ingest daemon stopped reporting"
+    return health
+
+
+class StationState:
+    __slots__ = (
+        "location", "interval", "slot", "next_due", "running", "last_time", "last_success", "last_error",
+        "runs", "failures", "consecutive_failures", "skipped", "duplicates", "saved"
+    )
+
+    def __init__(self, location: Location, interval: float):
+        self.location = location
+        self.interval = interval
+        self.slot = 0.0
+        self.next_due = 0.0
+        self.running = False
+        self.last_time: Optional[int] = None
+        self.last_success: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.saved = 0
+
+    def stats(self, now: float) -> Dict:
+        return {
+            "interval_s": self.interval,
+            "running": self.running,
+            "last_observation": format_time(self.last_time) if self.last_time else None,
+            "lag_s": round(now - self.last_time, 1) if self.last_time else None,
+            "last_success": datetime.fromtimestamp(self.last_success).isoformat() if self.last_success else None,
+            "last_error": self.last_error,
+            "runs": self.runs,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "skipped_slots": self.skipped,
+            "duplicates": self.duplicates,
+            "saved": self.saved
+        }
+
+
+class IngestDaemon:
+
+    def __init__(self, catalog: StationCatalog, locations: List[Location], interval: float = DEFAULT_INTERVAL,
+                 cadences: Optional[Dict[str, float]] = None, jitter: float = DEFAULT_JITTER,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, max_pending: int = DEFAULT_MAX_PENDING,
+                 compact_interval: float = DEFAULT_COMPACT_INTERVAL, retain_days: int = DEFAULT_RETAIN_DAYS,
+                 hourly_retain_days: int = DEFAULT_HOURLY_RETAIN_DAYS, health_path: Optional[str] = None,
+                 fetcher: Optional[WeatherFetcher] = None):
+        cadences = cadences or {}
+        self.catalog = catalog
+        self.stations = {
+            location.name: StationState(location, cadences.get(location.name, interval)) for location in locations
+        }
+        self.jitter = jitter
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.compact_interval = compact_interval
+        self.retain_days = retain_days
+        self.hourly_retain_days = hourly_retain_days
+        self.health_path = Path(health_path or Path(catalog.data_dir) / HEALTH_NAME)
+        self.fetcher = fetcher or WeatherFetcher(keepalive_expiry=KEEPALIVE_EXPIRY)
+
+        self.pending: Dict[str, List[Dict]] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        self.started = time.time()
+        self.flushes = 0
+        self.last_flush: Optional[float] = None
+        self.compaction: Dict = {}
+        self._flush_now = asyncio.Event()
+        self._stopping = asyncio.Event()
+
+    def seed(self):
+        for name, station in self.stations.items():
+            self.catalog.register(station.location)
+            station.last_time = self.catalog.manager(name).latest_time()
+
+        now = time.monotonic()
+        for station in self.stations.values():
+            station.slot = now
+            station.next_due = now + random.uniform(0, self.jitter * station.interval)
+
+    def _reschedule(self, station: StationState, now: float):
+        station.slot += station.interval
+        while station.slot <= now:
+            station.slot += station.interval
+            station.skipped += 1
+        station.next_due = station.slot + random.uniform(0, self.jitter * station.interval)
+
+    def _due(self, now: float) -> List[StationState]:
+        ready = []
+        for station in self.stations.values():
+            if station.next_due > now:
+                continue
+            if station.running:
+                logger.warning(f"{station.location.name} is still running, skipping this slot")
+                station.skipped += 1
+            else:
+                station.running = True
+                ready.append(station)
+            self._reschedule(station, now)
+        return ready
+
+    async def run_stations(self, stations: List[StationState]):
+        try:
+            weather = await self.fetcher.fetch_all([station.location for station in stations])
+        except Exception as e:
+            logger.error(f"Issues in run_stations: {e}")
+            weather = {}
+
+        for station in stations:
+            station.runs += 1
+            station.running = False
+            record = weather.get(station.location.name)
+            if record is None:
+                station.failures += 1
+                station.consecutive_failures += 1
+                station.last_error = "no data returned"
+                continue
+
+            try:
+                moment = Observation.from_dict(record).time
+            except SchemaError as e:
+                logger.warning(f"Rejected observation for {station.location.name}: {e}")
+                station.failures += 1
+                station.consecutive_failures += 1
+                station.last_error = str(e)
+                continue
+
+            station.consecutive_failures = 0
+            station.last_success = time.time()
+            if station.last_time is not None and moment <= station.last_time:
+                station.duplicates += 1
+                continue
+            station.last_time = moment
+            self.pending.setdefault(station.location.name, []).append(record)
+
+        if sum(len(records) for records in self.pending.values()) >= self.max_pending:
+            self._flush_now.set()
+
+    async def flush(self):
+        pending, self.pending = self.pending, {}
+        for name, records in pending.items():
+            manager = self.catalog.manager(name)
+            saved = await manager.save_many(records)
+            station = self.stations.get(name)
+            if saved == len(records):
+                if station is not None:
+                    station.saved += saved
+                continue
+
+            # A failed write may have persisted part of the batch, retrying those would store them twice.
+            stored = await stored_times(manager, records)
+            unsaved = [record for record in records if record_epoch(record) not in stored]
+            if station is not None:
+                station.saved += len(records) - len(unsaved)
+            if not unsaved:
+                continue
+
+            logger.warning(f"Could not save {len(unsaved)} records for {name}, keeping them for the next flush")
+            if station is not None:
+                station.last_error = "save failed"
+            kept = self.pending.setdefault(name, [])
+            kept[:0] = unsaved
+            del kept[:-self.max_pending]
+
+        self.flushes += 1
+        self.last_flush = time.time()
+        self.write_health()
+
+    def health(self) -> Dict:
+        now = time.time()
+        stations = {name: station.stats(now) for name, station in self.stations.items()}
+        lagging = [
+            name for name, station in self.stations.items()
+            if station.consecutive_failures >= FAILURES_BEFORE_DEGRADED or (
+                station.last_time is not None and now - station.last_time > 2 * station.interval + 3600
+            )
+        ]
+        return {
+            "status": "degraded" if lagging else "ok",
+            "lagging": lagging,
+            "pid": os.getpid(),
+            "started": datetime.fromtimestamp(self.started).isoformat(),
+            "uptime_s": round(now - self.started, 1),
+            "updated": now,
+            "flush_interval_s": self.flush_interval,
+            "flushes": self.flushes,
+            "pending_records": sum(len(records) for records in self.pending.values()),
+            "compaction": self.compaction,
+            "stations": stations
+        }
+
+    def write_health(self):
+        try:
+            tmp_path = self.health_path.with_suffix(".tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(self.health(), f)
+            os.replace(tmp_path, self.health_path)
+        except Exception as e:
+            logger.error(f"Issues in write_health: {e}")
+
+    async def _sleep(self, seconds: float) -> bool:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=max(seconds, 0))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def schedule_loop(self):
+        while not self._stopping.is_set():
+            now = time.monotonic()
+            ready = self._due(now)
+            if ready:
+                task = asyncio.create_task(self.run_stations(ready))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+
+            wake = min(station.next_due for station in self.stations.values())
+            if await self._sleep(min(wake - time.monotonic(), self.flush_interval)):
+                return
+
+    async def flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+            if self._stopping.is_set():
+                return
+
+    async def compact_loop(self):
+        while self.compact_interval > 0:
+            delay = self.compact_interval * (1 + random.uniform(0, self.jitter))
+            if await self._sleep(delay):
+                return
+            started = time.perf_counter()
+            results = await compact_catalog(self.catalog, self.retain_days, self.hourly_retain_days)
+            self.compaction = {
+                "last_run": datetime.now().isoformat(),
+                "duration_s": round(time.perf_counter() - started, 2),
+                "stations": len(results)
+            }
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        self.seed()
+        await self.fetcher.open()
+        logger.info(f"Ingest daemon started for {len(self.stations)} stations")
+        scheduler = asyncio.create_task(self.schedule_loop())
+        compactor = asyncio.create_task(self.compact_loop())
+        flusher = asyncio.create_task(self.flush_loop())
+        try:
+            await self._stopping.wait()
+        finally:
+            self._stopping.set()
+            await asyncio.gather(scheduler, compactor, *self.tasks, return_exceptions=True)
+            self._flush_now.set()
+            await asyncio.gather(flusher, return_exceptions=True)
+            if self.pending:
+                await self.flush()
+            await self.fetcher.close()
+            logger.info("Ingest daemon stopped")
+
+
+async def serve(catalog: StationCatalog, **options):
+    lock = FileLock(str(Path(catalog.data_dir) / LOCK_NAME), timeout=0)
+    try:
+        lock.acquire()
+    except LockTimeout:
+        logger.error("Another ingest daemon holds the lock, exiting")
+        return
+
+    try:
+        daemon = IngestDaemon(catalog, load_locations(catalog=catalog), **options)
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, daemon.stop)
+        await daemon.run()
+    finally:
+        lock.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch current weather for every station on a schedule")
+    parser.add_argument("--catalog", default="data/catalog.json")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--interval", type=float, default=float(os.environ.get("WEATHER_INGEST_INTERVAL", DEFAULT_INTERVAL)),
+                        help="Seconds between fetches for each station")
+    parser.add_argument("--cadence", default=os.environ.get("WEATHER_INGEST_CADENCES"),
+                        help="Per station overrides, e.g. tehran=900,shiraz=1800")
+    parser.add_argument("--jitter", type=float, default=float(os.environ.get("WEATHER_INGEST_JITTER", DEFAULT_JITTER)),
+                        help="Random delay added to each run, as a fraction of the interval")
+    parser.add_argument("--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL,
+                        help="Seconds to coalesce fetched observations before writing")
+    parser.add_argument("--compact-interval", type=float,
+                        default=float(os.environ.get("WEATHER_COMPACT_INTERVAL", DEFAULT_COMPACT_INTERVAL)),
+                        help="Seconds between compaction runs, 0 disables compaction")
+    parser.add_argument("--base-url", default=os.environ.get("WEATHER_FORECAST_URL", OPEN_METEO_URL))
+    args = parser.parse_args()
+
+    catalog = StationCatalog(args.catalog, args.data_dir, backend=os.environ.get("WEATHER_BACKEND", "json"))
+    asyncio.run(serve(
+        catalog,
+        interval=args.interval,
+        cadences=parse_cadences(args.cadence),
+        jitter=args.jitter,
+        flush_interval=args.flush_interval,
+        compact_interval=args.compact_interval,
+        retain_days=int(os.environ.get("WEATHER_RETAIN_DAYS", DEFAULT_RETAIN_DAYS)),
+        hourly_retain_days=int(os.environ.get("WEATHER_HOURLY_RETAIN_DAYS", DEFAULT_HOURLY_RETAIN_DAYS)),
+        fetcher=WeatherFetcher(base_url=args.base_url, keepalive_expiry=KEEPALIVE_EXPIRY)
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count", "lock")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self, name: str, key: LabelKey) -> List[str]:
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(key, ('le', repr(bound)))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+        lines.append(f"{name}_sum{_format_labels(key)} {total}")
+        lines.append(f"{name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.help: Dict[str, str] = {}
+        self.collectors: List[Callable[[], Iterator[Tuple[str, str, Dict, float]]]] = []
+        self.lock = threading.Lock()
+
+    def describe(self, name: str, text: str):
+        self.help[name] = text
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = _label_key(labels)
+        series = self.histograms.get(name)
+        if series is None or key not in series:
+            with self.lock:
+                series = self.histograms.setdefault(name, {})
+                series.setdefault(key, Histogram())
+        return series[key]
+
+    def observe(self, name: str, value: float, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def register_collector(self, collector: Callable[[], Iterator[Tuple[str, str, Dict, float]]]):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            histograms = {name: dict(series) for name, series in self.histograms.items()}
+        for name, series in sorted(histograms.items()):
+            lines.append(f"# HELP {name} {self.help.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in sorted(series.items()):
+                lines.extend(histogram.render(name, key))
+
+        with self.lock:
+            counters = {name: dict(series) for name, series in self.counters.items()}
+        for name, series in sorted(counters.items()):
+            lines.append(f"# HELP {name} {self.help.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(key)} {value}")
+
+        gauges: Dict[str, List[Tuple[LabelKey, float]]] = {}
+        for collector in self.collectors:
+            for name, text, labels, value in collector():
+                self.help.setdefault(name, text)
+                gauges.setdefault(name, []).append((_label_key(labels), value))
+        for name, series in sorted(gauges.items()):
+            lines.append(f"# HELP {name} {self.help.get(name, name)}")
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in series:
+                lines.append(f"{name}{_format_labels(key)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.describe("weather_stage_duration_seconds", "Time spent in storage and parsing stages")
+registry.describe("weather_analyse_duration_seconds", "Time spent computing each Analyse metric")
+registry.describe("weather_http_request_duration_seconds", "FastAPI handler latency")
+registry.describe("weather_store_bytes_read_total", "Bytes read from segment files")
+registry.describe("weather_store_records_read_total", "Records parsed from storage")
+
+
+@contextmanager
+def timed(name: str, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.perf_counter() - started, **labels)
+
+
+def instrument(name: str, **labels):
+    def decorator(func):
+        histogram = registry.histogram(name, **labels)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def record_read(records: int, nbytes: int, **labels):
+    registry.inc("weather_store_records_read_total", records, **labels)
+    registry.inc("weather_store_bytes_read_total", nbytes, **labels)
+
+
+class SamplingProfiler:
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: StackCounter = StackCounter()
+        self.samples = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name="weather-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+
+    def reset(self):
+        self.stacks.clear()
+        self.samples = 0
+
+    def collapsed(self, limit: Optional[int] = None) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common(limit)) + "\n"
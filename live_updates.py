@@ -0,0 +1,166 @@
+from loguru import logger
+import asyncio
+import json
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from blocking_pool import run_blocking
+
+
+logger.add('logs/live_updates.txt', rotation="1 week")
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+def sse_frame(event: str, payload: Dict, event_id: Optional[int] = None) -> bytes:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(payload, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class Subscriber:
+    __slots__ = ("location", "queue", "dropped")
+
+    def __init__(self, location: str, max_queue: int):
+        self.location = location
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def offer(self, frame: bytes):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+
+class Broadcaster:
+
+    def __init__(self, max_queue: int = 16):
+        self.max_queue = max_queue
+        self.subscribers: Dict[str, Set[Subscriber]] = {}
+        self.latest: Dict[str, bytes] = {}
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, location: str) -> Subscriber:
+        subscriber = Subscriber(location, self.max_queue)
+        self.subscribers.setdefault(location, set()).add(subscriber)
+        if location in self.latest:
+            subscriber.offer(self.latest[location])
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self.subscribers.get(subscriber.location)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.subscribers[subscriber.location]
+
+    def locations(self) -> List[str]:
+        return list(self.subscribers)
+
+    def publish(self, location: str, frame: bytes) -> int:
+        self.latest[location] = frame
+        self.published += 1
+        subscribers = list(self.subscribers.get(location, ()))
+        for subscriber in subscribers:
+            subscriber.offer(frame)
+        self.delivered += len(subscribers)
+        return len(subscribers)
+
+    def stats(self) -> Dict:
+        # Copied first, metrics are rendered off the event loop while it keeps subscribing.
+        groups = [list(subscribers) for subscribers in list(self.subscribers.values())]
+        return {
+            "subscribers": sum(len(subscribers) for subscribers in groups),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": sum(subscriber.dropped for subscribers in groups for subscriber in subscribers),
+        }
+
+
+class UpdateWatcher:
+
+    def __init__(self, catalog, broadcaster: Broadcaster,
+                 summarise: Callable[[str], Awaitable[Optional[Dict]]],
+                 interval: float = 2.0, max_records: int = 100):
+        self.catalog = catalog
+        self.broadcaster = broadcaster
+        self.summarise = summarise
+        self.interval = interval
+        self.max_records = max_records
+        self.versions: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _new_records(self, manager, after_id: int) -> Dict:
+        tail, count = deque(maxlen=self.max_records), 0
+        for record in manager.iter_after(after_id):
+            tail.append(record)
+            count += 1
+        return {"records": list(tail), "count": count}
+
+    async def poll_location(self, location: str) -> bool:
+        manager = self.catalog.manager(location)
+        if manager is None:
+            return False
+
+        version = manager.data_version()
+        known = self.versions.get(location)
+        self.versions[location] = version
+        if known is None or version <= known:
+            return False
+
+        new = await run_blocking(self._new_records, manager, known)
+        payload = {
+            "location": location,
+            "version": version,
+            "count": new["count"],
+            "records": new["records"],
+            "summary": await self.summarise(location),
+        }
+        self.broadcaster.publish(location, sse_frame("observation", payload, version))
+        return True
+
+    async def poll_once(self) -> int:
+        published = 0
+        locations = self.broadcaster.locations()
+        for location in set(self.versions) - set(locations):
+            del self.versions[location]
+        for location in locations:
+            try:
+                published += await self.poll_location(location)
+            except Exception as e:
+                logger.error(f"Issues polling updates for {location}: {e}")
+        return published
+
+    async def run(self):
+        while True:
+            await self.poll_once()
+            await asyncio.sleep(self.interval)
+
+
+async def event_stream(broadcaster: Broadcaster, subscriber: Subscriber, keepalive: float = 15.0):
+    try:
+        yield b"retry: 5000\n\n"
+        while True:
+            try:
+                yield await asyncio.wait_for(subscriber.queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield KEEPALIVE
+    finally:
+        broadcaster.unsubscribe(subscriber)
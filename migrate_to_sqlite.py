@@ -0,0 +1,57 @@
+from loguru import logger
+import argparse
+from pathlib import Path
+from typing import Dict
+from catalog import StationCatalog
+from data_json_manager import JSONDataManager
+from sqlite_data_manager import SQLiteDataManager
+
+
+logger.add('logs/migrate_sqlite.txt', rotation="1 week")
+
+
+def migrate_station(filename: str, database: str, location: str, batch_size: int = 5000) -> int:
+    source = JSONDataManager(filename, batch_size=batch_size)
+    target = SQLiteDataManager(database, location, batch_size=batch_size)
+
+    inserted = 0
+    for batch in source.iter_batches(batch_size):
+        inserted += target.insert_many(batch)
+    logger.info(f"Imported {inserted} records for {location} from {filename} into {database}")
+    return inserted
+
+
+def migrate_catalog(catalog: StationCatalog, database: str, batch_size: int = 5000) -> Dict[str, int]:
+    results = {}
+    for location in catalog.locations():
+        filename = catalog.get(location.name)["filename"]
+        if not Path(filename).exists() and not Path(filename).with_suffix('').exists():
+            logger.warning(f"No JSON data for {location.name} at {filename}, skipping")
+            continue
+        results[location.name] = migrate_station(filename, database, location.name, batch_size)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import JSON weather data into the SQLite backend")
+    parser.add_argument("--catalog", default="data/catalog.json", help="Station catalog to migrate")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--database", default=None, help="Target database, defaults to <data-dir>/weather.db")
+    parser.add_argument("--json", dest="json_file", default=None, help="Migrate a single JSON file instead")
+    parser.add_argument("--location", default="tehran", help="Station name for --json")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.json_file:
+        database = args.database or str(Path(args.data_dir) / "weather.db")
+        migrate_station(args.json_file, database, args.location, args.batch_size)
+        return
+
+    catalog = StationCatalog(args.catalog, args.data_dir)
+    results = migrate_catalog(catalog, args.database or catalog.database, args.batch_size)
+    for name, inserted in results.items():
+        print(f"{name}: {inserted} records imported")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import math
+import time
+import numpy as np
+import orjson
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+from columnar import epoch_seconds
+
+
+OBSERVATION_FIELDS = (
+    "time", "interval", "temperature", "windspeed", "winddirection", "is_day", "weathercode", "id", "timestamp"
+)
+
+OBSERVATION_DTYPE = np.dtype([
+    ("id", "<i8"),
+    ("time", "<i8"),
+    ("timestamp", "<i8"),
+    ("interval", "<i4"),
+    ("weathercode", "<i2"),
+    ("is_day", "<i1"),
+    ("temperature", "<f8"),
+    ("windspeed", "<f8"),
+    ("winddirection", "<f8"),
+])
+
+RECORD_SIZE = OBSERVATION_DTYPE.itemsize
+MISSING = -1
+KNOWN_FIELDS = frozenset(OBSERVATION_FIELDS)
+DAY = 24 * 3600
+
+INT_LIMITS = {
+    "interval": (0, 2 ** 31 - 1),
+    "weathercode": (0, 2 ** 15 - 1),
+    "is_day": (0, 1),
+}
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def _epoch(value: Any, name: str) -> int:
+    if type(value) is int:
+        return value
+    if type(value) is str:
+        try:
+            return epoch_seconds(datetime.fromisoformat(value))
+        except ValueError:
+            pass
+    raise SchemaError(f"{name} must be an ISO time or epoch seconds, got {value!r}")
+
+
+@lru_cache(maxsize=1024)
+def _parse_timestamp(value: str) -> int:
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise SchemaError(f"timestamp must be an ISO time, got {value!r}")
+    return int(moment.replace(microsecond=0).timestamp()) * 1_000_000 + moment.microsecond
+
+
+def _timestamp_micros(value: Any) -> int:
+    if value is None:
+        return MISSING
+    if type(value) is str:
+        return _parse_timestamp(value)
+    if type(value) is int:
+        return value
+    raise SchemaError(f"timestamp must be an ISO time, got {value!r}")
+
+
+def _number(value: Any, name: str) -> float:
+    kind = type(value)
+    if kind is float:
+        return value
+    if kind is int:
+        return float(value)
+    if value is None:
+        return math.nan
+    raise SchemaError(f"{name} must be a number, got {value!r}")
+
+
+def _integer(value: Any, name: str) -> int:
+    if value is None:
+        return 0
+    if type(value) is float and value.is_integer():
+        value = int(value)
+    if type(value) is not int:
+        raise SchemaError(f"{name} must be an integer, got {value!r}")
+    low, high = INT_LIMITS[name]
+    if not low <= value <= high:
+        raise SchemaError(f"{name} must be between {low} and {high}, got {value}")
+    return value
+
+
+def format_time(seconds: int) -> str:
+    moment = np.datetime64(seconds, "s")
+    return str(moment.astype("datetime64[m]")) if seconds % 60 == 0 else str(moment)
+
+
+def format_timestamp(micros: int) -> Optional[str]:
+    if micros == MISSING:
+        return None
+    seconds, micro = divmod(micros, 1_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=micro).isoformat()
+
+
+@dataclass(slots=True, frozen=True)
+class Observation:
+    time: int
+    interval: int
+    temperature: float
+    windspeed: float
+    winddirection: float
+    is_day: int
+    weathercode: int
+    id: int = MISSING
+    timestamp: int = MISSING
+
+    @classmethod
+    def from_dict(cls, record: Dict) -> "Observation":
+        if not record.keys() <= KNOWN_FIELDS:
+            raise SchemaError(f"Unknown observation fields: {sorted(record.keys() - KNOWN_FIELDS)}")
+        if record.get("time") is None:
+            raise SchemaError("Observation is missing time")
+
+        record_id = record.get("id", MISSING)
+        if type(record_id) is not int:
+            raise SchemaError(f"id must be an integer, got {record_id!r}")
+
+        return cls(
+            time=_epoch(record["time"], "time"),
+            interval=_integer(record.get("interval"), "interval"),
+            temperature=_number(record.get("temperature"), "temperature"),
+            windspeed=_number(record.get("windspeed"), "windspeed"),
+            winddirection=_number(record.get("winddirection"), "winddirection"),
+            is_day=_integer(record.get("is_day"), "is_day"),
+            weathercode=_integer(record.get("weathercode"), "weathercode"),
+            id=record_id,
+            timestamp=_timestamp_micros(record.get("timestamp"))
+        )
+
+    def to_dict(self) -> Dict:
+        record = {
+            "time": format_time(self.time),
+            "interval": self.interval,
+            "temperature": None if math.isnan(self.temperature) else self.temperature,
+            "windspeed": None if math.isnan(self.windspeed) else self.windspeed,
+            "winddirection": None if math.isnan(self.winddirection) else self.winddirection,
+            "is_day": self.is_day,
+            "weathercode": self.weathercode,
+        }
+        if self.id != MISSING:
+            record["id"] = self.id
+        if self.timestamp != MISSING:
+            record["timestamp"] = format_timestamp(self.timestamp)
+        return record
+
+
+def validate_records(records: Iterable[Dict]) -> List[Observation]:
+    return [Observation.from_dict(record) for record in records]
+
+
+def encode_observations(observations: List[Observation]) -> bytes:
+    packed = np.empty(len(observations), dtype=OBSERVATION_DTYPE)
+    for name in OBSERVATION_DTYPE.names:
+        packed[name] = [getattr(observation, name) for observation in observations]
+    return packed.tobytes()
+
+
+def decode_array(payload: bytes) -> np.ndarray:
+    usable = len(payload) - len(payload) % RECORD_SIZE
+    return np.frombuffer(payload, dtype=OBSERVATION_DTYPE, count=usable // RECORD_SIZE)
+
+
+def local_offsets(seconds: np.ndarray) -> np.ndarray:
+    days, inverse = np.unique(seconds // DAY, return_inverse=True)
+    starts = np.array([time.localtime(day * DAY).tm_gmtoff for day in days.tolist()], dtype=np.int64)
+    ends = np.array([time.localtime(day * DAY + DAY - 1).tm_gmtoff for day in days.tolist()], dtype=np.int64)
+    offsets = starts[inverse]
+    changing = (starts != ends)[inverse]
+    if changing.any():
+        offsets[changing] = [time.localtime(second).tm_gmtoff for second in seconds[changing].tolist()]
+    return offsets
+
+
+def format_timestamps(micros: np.ndarray) -> List[Optional[str]]:
+    local = (micros + local_offsets(micros // 1_000_000) * 1_000_000).astype("datetime64[us]")
+    full = np.datetime_as_string(local, unit="us")
+    text = np.where(micros % 1_000_000 == 0, full.astype("U19"), full).tolist()
+    if (micros == MISSING).any():
+        text = [None if micro == MISSING else stamp for micro, stamp in zip(micros.tolist(), text)]
+    return text
+
+
+def array_to_dicts(packed: np.ndarray) -> List[Dict]:
+    if not packed.size:
+        return []
+
+    times = packed["time"].astype("datetime64[s]")
+    unit = "m" if not (packed["time"] % 60).any() else "s"
+    columns = {
+        "time": np.datetime_as_string(times, unit=unit).tolist(),
+        "interval": packed["interval"].tolist(),
+        "is_day": packed["is_day"].tolist(),
+        "weathercode": packed["weathercode"].tolist(),
+        "id": packed["id"].tolist(),
+    }
+    for name in ("temperature", "windspeed", "winddirection"):
+        values = packed[name].astype(object)
+        values[np.isnan(packed[name])] = None
+        columns[name] = values.tolist()
+    columns["timestamp"] = format_timestamps(packed["timestamp"])
+
+    records = [
+        {"time": moment, "interval": interval, "temperature": temperature, "windspeed": windspeed,
+         "winddirection": direction, "is_day": is_day, "weathercode": code, "id": record_id, "timestamp": stamp}
+        for moment, interval, temperature, windspeed, direction, is_day, code, record_id, stamp
+        in zip(*(columns[name] for name in OBSERVATION_FIELDS))
+    ]
+    if (packed["id"] == MISSING).any() or (packed["timestamp"] == MISSING).any():
+        for record in records:
+            if record["id"] == MISSING:
+                del record["id"]
+            if record["timestamp"] is None:
+                del record["timestamp"]
+    return records
+
+
+def dumps(payload: Any) -> bytes:
+    return orjson.dumps(payload)
+
+
+def loads(payload) -> Any:
+    return orjson.loads(payload)
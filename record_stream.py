@@ -0,0 +1,61 @@
+import json
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+
+def project(record: Dict, fields: Optional[Sequence[str]]) -> Dict:
+    if fields is None:
+        return record
+    return {key: record[key] for key in fields if key in record}
+
+
+def batched(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_json_array(path: str, chunk_size: int = 1 << 16) -> Iterator[Dict]:
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buffer, pos = "", 0
+        started, eof = False, False
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+
+            if pos >= len(buffer):
+                if eof:
+                    if started:
+                        raise ValueError(f"Unterminated JSON array in {path}")
+                    return
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"Expected a JSON array in {path}")
+                started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == "]":
+                return
+
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+
+            yield record
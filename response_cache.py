@@ -0,0 +1,79 @@
+import hashlib
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+
+class CachedResponse:
+    __slots__ = ("version", "body", "media_type", "etag", "last_modified", "stored_at")
+
+    def __init__(self, version: str, body: bytes, media_type: str, etag: str, last_modified: str):
+        self.version = version
+        self.body = body
+        self.media_type = media_type
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = time.monotonic()
+
+
+def make_etag(key: Tuple, version: str) -> str:
+    digest = hashlib.sha1(f"{key}|{version}".encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def http_date(timestamp: Optional[float]) -> str:
+    return formatdate(timestamp if timestamp is not None else time.time(), usegmt=True)
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def not_modified_since(header: Optional[str], last_modified: Optional[float]) -> bool:
+    if not header or last_modified is None:
+        return False
+    try:
+        return int(last_modified) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+class ResponseCache:
+
+    def __init__(self, max_entries: int = 512, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[Tuple, CachedResponse]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key: Tuple, version: str) -> Optional[CachedResponse]:
+        entry = self.entries.get(key)
+        if entry is None or entry.version != version or time.monotonic() - entry.stored_at > self.ttl:
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Tuple, entry: CachedResponse):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified
+        }
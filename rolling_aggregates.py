@@ -0,0 +1,175 @@
+import math
+from collections import deque
+from typing import Dict, List, Optional
+from columnar import record_epoch
+
+
+ROLLING_WINDOWS = {
+    "1h": 3600,
+    "24h": 24 * 3600,
+    "7d": 7 * 24 * 3600,
+    "30d": 30 * 24 * 3600,
+}
+
+DEFAULT_CALM_THRESHOLD = 5.0
+
+
+def window_for_hours(hours: int) -> Optional[str]:
+    for name, seconds in ROLLING_WINDOWS.items():
+        if seconds == hours * 3600:
+            return name
+    return None
+
+
+class MonotonicExtreme:
+
+    def __init__(self, largest: bool):
+        self.largest = largest
+        self.entries = deque()
+
+    def push(self, moment: int, value: float):
+        while self.entries and (
+            self.entries[-1][1] <= value if self.largest else self.entries[-1][1] >= value
+        ):
+            self.entries.pop()
+        self.entries.append((moment, value))
+
+    def evict(self, cutoff: int):
+        while self.entries and self.entries[0][0] <= cutoff:
+            self.entries.popleft()
+
+    def value(self) -> Optional[float]:
+        return self.entries[0][1] if self.entries else None
+
+
+class RollingWindow:
+
+    def __init__(self, seconds: int, calm_threshold: float = DEFAULT_CALM_THRESHOLD):
+        self.seconds = seconds
+        self.calm_threshold = calm_threshold
+        self.entries = deque()
+        self.latest: Optional[int] = None
+
+        self.count = 0
+        self.temp_mean = 0.0
+        self.temp_m2 = 0.0
+        self.speed_sum = 0.0
+        self.sin_sum = 0.0
+        self.cos_sum = 0.0
+        self.calm_count = 0
+
+        self.temp_min = MonotonicExtreme(largest=False)
+        self.temp_max = MonotonicExtreme(largest=True)
+        self.speed_max = MonotonicExtreme(largest=True)
+
+    def push(self, moment: int, temperature: float, windspeed: float, winddirection: float):
+        radians = math.radians(winddirection)
+        entry = (moment, temperature, windspeed, math.sin(radians), math.cos(radians))
+        self.entries.append(entry)
+        self.latest = moment
+
+        self.count += 1
+        delta = temperature - self.temp_mean
+        self.temp_mean += delta / self.count
+        self.temp_m2 += delta * (temperature - self.temp_mean)
+        self.speed_sum += windspeed
+        self.sin_sum += entry[3]
+        self.cos_sum += entry[4]
+        self.calm_count += windspeed < self.calm_threshold
+
+        self.temp_min.push(moment, temperature)
+        self.temp_max.push(moment, temperature)
+        self.speed_max.push(moment, windspeed)
+        self._evict(moment - self.seconds)
+
+    def _evict(self, cutoff: int):
+        while self.entries and self.entries[0][0] <= cutoff:
+            moment, temperature, windspeed, sin_value, cos_value = self.entries.popleft()
+            self.count -= 1
+            if self.count == 0:
+                self.temp_mean = 0.0
+                self.temp_m2 = 0.0
+            else:
+                delta = temperature - self.temp_mean
+                self.temp_mean -= delta / self.count
+                self.temp_m2 = max(self.temp_m2 - delta * (temperature - self.temp_mean), 0.0)
+            self.speed_sum -= windspeed
+            self.sin_sum -= sin_value
+            self.cos_sum -= cos_value
+            self.calm_count -= windspeed < self.calm_threshold
+
+        self.temp_min.evict(cutoff)
+        self.temp_max.evict(cutoff)
+        self.speed_max.evict(cutoff)
+
+    def snapshot(self) -> Optional[Dict]:
+        if self.count == 0:
+            return None
+
+        mean_direction = math.degrees(math.atan2(self.sin_sum, self.cos_sum))
+        if mean_direction < 0:
+            mean_direction += 360
+
+        return {
+            "count": self.count,
+            "avg_temperature": round(self.temp_mean, 2),
+            "temp_std": round(math.sqrt(self.temp_m2 / self.count), 2),
+            "temp_range": {
+                "min": round(self.temp_min.value(), 2),
+                "max": round(self.temp_max.value(), 2),
+                "range": round(self.temp_max.value() - self.temp_min.value(), 2)
+            },
+            "avg_windspeed": round(self.speed_sum / self.count, 2),
+            "peak_windspeed": round(self.speed_max.value(), 2),
+            "dominant_wind_direction": round(mean_direction, 1),
+            "calm_periods": {
+                "calm_periods": self.calm_count,
+                "total_periods": self.count,
+                "calm_percentage": round((self.calm_count / self.count) * 100, 1)
+            }
+        }
+
+
+class RollingAggregates:
+
+    def __init__(self, windows: Optional[Dict[str, int]] = None):
+        self.windows = {name: RollingWindow(seconds) for name, seconds in (windows or ROLLING_WINDOWS).items()}
+        self.latest: Optional[int] = None
+
+    @property
+    def longest(self) -> int:
+        return max(window.seconds for window in self.windows.values())
+
+    def push(self, record: Dict) -> bool:
+        moment = record_epoch(record)
+        if moment is None or (self.latest is not None and moment < self.latest):
+            return False
+
+        try:
+            temperature = float(record["temperature"])
+            windspeed = float(record["windspeed"])
+            winddirection = float(record["winddirection"])
+        except (KeyError, TypeError, ValueError):
+            return False
+
+        for window in self.windows.values():
+            window.push(moment, temperature, windspeed, winddirection)
+        self.latest = moment
+        return True
+
+    def push_many(self, records: List[Dict]) -> int:
+        timed = [(record_epoch(record), record) for record in records]
+        ordered = sorted((pair for pair in timed if pair[0] is not None), key=lambda pair: pair[0])
+        return sum(self.push(record) for _, record in ordered)
+
+    def accepts(self, records: List[Dict]) -> bool:
+        if self.latest is None:
+            return True
+        moments = (record_epoch(record) for record in records)
+        return all(moment is None or moment >= self.latest for moment in moments)
+
+    def snapshot(self, name: str) -> Optional[Dict]:
+        window = self.windows.get(name)
+        if window is None:
+            return None
+        return window.snapshot()
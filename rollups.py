@@ -0,0 +1,256 @@
+import os
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from columnar import WeatherColumns
+from rolling_aggregates import DEFAULT_CALM_THRESHOLD
+from series import bucket_keys
+from summary_engine import SUMMARY_METRICS
+
+
+TIERS = {
+    "day": 24 * 3600,
+    "hour": 3600,
+}
+
+ROLLUP_DTYPES = {
+    "bucket": np.int64,
+    "count": np.int64,
+    "min_time": np.int64,
+    "max_time": np.int64,
+    "temp_sum": np.float64,
+    "temp_min": np.float64,
+    "temp_max": np.float64,
+    "speed_sum": np.float64,
+    "speed_min": np.float64,
+    "speed_max": np.float64,
+    "calm_count": np.int64,
+    "sin_sum": np.float64,
+    "cos_sum": np.float64,
+    "first_direction": np.float64,
+    "last_direction": np.float64,
+    "turn_count": np.int64,
+    "turn_sum": np.float64,
+    "turn_sq_sum": np.float64,
+}
+
+SERIES_COLUMNS = {
+    "temperature": ("temp_sum", "temp_min", "temp_max"),
+    "windspeed": ("speed_sum", "speed_min", "speed_max"),
+}
+
+Rows = Dict[str, np.ndarray]
+
+
+def empty_rows() -> Rows:
+    return {name: np.empty(0, dtype=dtype) for name, dtype in ROLLUP_DTYPES.items()}
+
+
+def row_count(rows: Rows) -> int:
+    return len(rows["bucket"])
+
+
+def wrapped_turns(diff: np.ndarray) -> np.ndarray:
+    diff = diff - 360 * (diff > 180)
+    diff = diff + 360 * (diff < -180)
+    return np.abs(diff)
+
+
+def build_rows(columns: WeatherColumns, seconds: int, calm_threshold: float = DEFAULT_CALM_THRESHOLD) -> Rows:
+    if not len(columns):
+        return empty_rows()
+
+    times = columns.time
+    keys = times // seconds * seconds
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    ends = np.append(starts[1:], times.size)
+
+    temps = columns.temperature.astype(np.float64)
+    speeds = columns.windspeed.astype(np.float64)
+    directions = columns.winddirection.astype(np.float64)
+    radians = np.radians(directions)
+
+    steps = wrapped_turns(np.diff(directions))
+    turn_sums = np.concatenate(([0.0], np.cumsum(steps)))
+    turn_sq_sums = np.concatenate(([0.0], np.cumsum(steps * steps)))
+
+    return {
+        "bucket": keys[starts],
+        "count": ends - starts,
+        "min_time": times[starts],
+        "max_time": times[ends - 1],
+        "temp_sum": np.add.reduceat(temps, starts),
+        "temp_min": np.minimum.reduceat(temps, starts),
+        "temp_max": np.maximum.reduceat(temps, starts),
+        "speed_sum": np.add.reduceat(speeds, starts),
+        "speed_min": np.minimum.reduceat(speeds, starts),
+        "speed_max": np.maximum.reduceat(speeds, starts),
+        "calm_count": np.add.reduceat((speeds < calm_threshold).astype(np.int64), starts),
+        "sin_sum": np.add.reduceat(np.sin(radians), starts),
+        "cos_sum": np.add.reduceat(np.cos(radians), starts),
+        "first_direction": directions[starts],
+        "last_direction": directions[ends - 1],
+        "turn_count": ends - starts - 1,
+        "turn_sum": turn_sums[ends - 1] - turn_sums[starts],
+        "turn_sq_sum": turn_sq_sums[ends - 1] - turn_sq_sums[starts],
+    }
+
+
+def concat_rows(parts: Iterable[Rows]) -> Rows:
+    parts = [part for part in parts if row_count(part)]
+    if not parts:
+        return empty_rows()
+    return {name: np.concatenate([part[name] for part in parts]) for name in ROLLUP_DTYPES}
+
+
+def merge_rows(*parts: Rows) -> Rows:
+    rows = concat_rows(parts)
+    if not row_count(rows):
+        return rows
+
+    order = np.lexsort((rows["min_time"], rows["bucket"]))
+    rows = {name: values[order] for name, values in rows.items()}
+    keys = rows["bucket"]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    ends = np.append(starts[1:], keys.size)
+    if starts.size == keys.size:
+        return rows
+
+    merged = {"bucket": keys[starts]}
+    for name in ("count", "temp_sum", "speed_sum", "calm_count", "sin_sum", "cos_sum", "turn_sum", "turn_sq_sum"):
+        merged[name] = np.add.reduceat(rows[name], starts)
+    for name in ("min_time", "temp_min", "speed_min"):
+        merged[name] = np.minimum.reduceat(rows[name], starts)
+    for name in ("max_time", "temp_max", "speed_max"):
+        merged[name] = np.maximum.reduceat(rows[name], starts)
+
+    last = np.array([start + int(np.argmax(rows["max_time"][start:end])) for start, end in zip(starts, ends)])
+    merged["first_direction"] = rows["first_direction"][starts]
+    merged["last_direction"] = rows["last_direction"][last]
+    # Interleaved batches break the record order the turn statistics depend on.
+    merged["turn_count"] = np.where(ends - starts > 1, -1, np.add.reduceat(rows["turn_count"], starts))
+    return merged
+
+
+def save_rows(path: Path, rows: Rows):
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **rows)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_rows(path: Path) -> Rows:
+    with np.load(path) as archive:
+        return {name: archive[name].astype(dtype, copy=False) for name, dtype in ROLLUP_DTYPES.items()}
+
+
+def _select(rows: Rows, index: np.ndarray) -> Rows:
+    return {name: values[index] for name, values in rows.items()}
+
+
+def cover(tiers: List[Tuple[int, Rows, int]], lo: int, hi: int) -> Optional[Rows]:
+    if not tiers or lo < tiers[0][2]:
+        return None
+
+    seconds, rows, _ = tiers[0]
+    buckets = rows["bucket"]
+    first = int(np.searchsorted(buckets, lo - seconds, side="right"))
+    last = int(np.searchsorted(buckets, hi, side="right"))
+    candidates = np.arange(first, last)
+    if not candidates.size:
+        return empty_rows()
+
+    min_times, max_times = rows["min_time"][candidates], rows["max_time"][candidates]
+    inside = (min_times >= lo) & (max_times <= hi)
+    outside = (max_times < lo) | (min_times > hi)
+
+    parts, run = [], []
+    for index, is_inside, is_outside in zip(candidates.tolist(), inside.tolist(), outside.tolist()):
+        if is_inside:
+            run.append(index)
+            continue
+        if is_outside:
+            continue
+        edge_lo, edge_hi = max(lo, int(buckets[index])), min(hi, int(buckets[index]) + seconds - 1)
+        # A partial bucket is only exact when a finer tier still holds its rows.
+        finer = cover(tiers[1:], edge_lo, edge_hi)
+        if finer is None:
+            return None
+        if run:
+            parts.append(_select(rows, np.array(run)))
+            run = []
+        parts.append(finer)
+    if run:
+        parts.append(_select(rows, np.array(run)))
+    return concat_rows(parts)
+
+
+def summarise_rows(rows: Rows, metrics: Optional[Iterable[str]] = None,
+                   calm_threshold: float = DEFAULT_CALM_THRESHOLD) -> Optional[Dict]:
+    wanted = set(SUMMARY_METRICS if metrics is None else metrics)
+    count = int(rows["count"].sum())
+    if not count:
+        return None
+    if "calm_periods" in wanted and calm_threshold != DEFAULT_CALM_THRESHOLD:
+        return None
+
+    result = {}
+    if "avg_temperature" in wanted:
+        result["avg_temperature"] = round(float(rows["temp_sum"].sum()) / count, 2)
+    if "temp_range" in wanted:
+        min_temp, max_temp = float(rows["temp_min"].min()), float(rows["temp_max"].max())
+        result["temp_range"] = {
+            "min": round(min_temp, 2),
+            "max": round(max_temp, 2),
+            "range": round(max_temp - min_temp, 2)
+        }
+    if "avg_windspeed" in wanted:
+        result["avg_windspeed"] = round(float(rows["speed_sum"].sum()) / count, 2)
+    if "peak_windspeed" in wanted:
+        result["peak_windspeed"] = round(float(rows["speed_max"].max()), 2)
+    if "calm_periods" in wanted:
+        calm_count = int(rows["calm_count"].sum())
+        result["calm_periods"] = {
+            "calm_periods": calm_count,
+            "total_periods": count,
+            "calm_percentage": round((calm_count / count) * 100, 1)
+        }
+    if "dominant_wind_direction" in wanted:
+        mean_direction = float(np.degrees(np.arctan2(rows["sin_sum"].sum(), rows["cos_sum"].sum())))
+        if mean_direction < 0:
+            mean_direction += 360
+        result["dominant_wind_direction"] = round(mean_direction, 1)
+    if "wind_variability" in wanted:
+        if (rows["turn_count"] < 0).any():
+            result["wind_variability"] = None
+        elif count < 2:
+            result["wind_variability"] = 0.0
+        else:
+            joins = wrapped_turns(rows["first_direction"][1:] - rows["last_direction"][:-1])
+            total = int(rows["turn_count"].sum()) + joins.size
+            mean = (float(rows["turn_sum"].sum()) + float(joins.sum())) / total
+            square = (float(rows["turn_sq_sum"].sum()) + float((joins * joins).sum())) / total
+            result["wind_variability"] = round(float(np.sqrt(max(square - mean * mean, 0.0))), 2)
+
+    return {name: result[name] for name in SUMMARY_METRICS if name in result}
+
+
+def series_from_rows(rows: Rows, field: str, bucket: str) -> Dict[str, np.ndarray]:
+    rows = merge_rows(rows)
+    total_name, min_name, max_name = SERIES_COLUMNS[field]
+    if not row_count(rows):
+        empty = np.empty(0)
+        return {"time": empty.astype(np.int64), "mean": empty, "min": empty, "max": empty, "count": empty.astype(np.int64)}
+
+    keys = bucket_keys(rows["bucket"], bucket)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    counts = np.add.reduceat(rows["count"], starts)
+    return {
+        "time": keys[starts],
+        "mean": np.add.reduceat(rows[total_name], starts) / counts,
+        "min": np.minimum.reduceat(rows[min_name], starts),
+        "max": np.maximum.reduceat(rows[max_name], starts),
+        "count": counts
+    }
@@ -0,0 +1,418 @@
+from loguru import logger
+import json
+import os
+from typing import Iterator, List, Dict, Optional, Tuple
+from pathlib import Path
+from columnar import COLUMN_DTYPES, WeatherColumns, record_epoch
+from file_lock import FileLock
+from instrumentation import record_read, timed
+from observation import (
+    RECORD_SIZE, Observation, array_to_dicts, decode_array, dumps, encode_observations, format_time, loads,
+    validate_records
+)
+
+
+logger.add('logs/segment_store.txt', rotation="1 week")
+
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".lock"
+SEGMENT_FORMATS = {"jsonl": ".jsonl", "bin": ".bin"}
+
+
+def default_segment_format() -> str:
+    return os.environ.get("WEATHER_SEGMENT_FORMAT", "bin")
+
+
+def segment_format(segment: Dict) -> str:
+    return segment.get("format", "jsonl")
+
+
+def partition_key(observation: Observation) -> str:
+    return format_time(observation.time)[:7]
+
+
+def partition_summary(segments: List[Dict]) -> Dict[str, Dict]:
+    summary = {}
+    for segment in segments:
+        entry = summary.setdefault(segment.get("partition", "unknown"), {
+            "segments": 0, "records": 0, "bytes": 0, "min_time": None, "max_time": None
+        })
+        entry["segments"] += 1
+        entry["records"] += segment["records"]
+        entry["bytes"] += segment["bytes"]
+        for key, pick in (("min_time", min), ("max_time", max)):
+            if segment.get(key) is not None:
+                entry[key] = segment[key] if entry[key] is None else pick(entry[key], segment[key])
+    return summary
+
+
+def read_segment_columns(path: str, start: int, stop: int, batch_size: int = 5000, fmt: str = "jsonl") -> Dict:
+    with open(path, 'rb') as f:
+        f.seek(start)
+        payload = f.read(stop - start)
+
+    if fmt == "bin":
+        packed = decode_array(payload)
+        return {name: packed[name].astype(dtype) for name, dtype in COLUMN_DTYPES.items()}
+
+    columns = WeatherColumns()
+    batch = []
+    for line in payload.splitlines():
+        if not line:
+            continue
+        record = loads(line)
+        batch.append({key: record[key] for key in COLUMN_DTYPES if key in record})
+        if len(batch) >= batch_size:
+            columns.append_records(batch)
+            batch = []
+    columns.append_records(batch)
+    return {name: columns.column(name) for name in COLUMN_DTYPES}
+
+
+class SegmentStore:
+
+    def __init__(self, directory: str, max_segment_records: int = 10000, fmt: Optional[str] = None):
+        self.directory = Path(directory)
+        self.max_segment_records = max_segment_records
+        self.format = fmt or default_segment_format()
+        if self.format not in SEGMENT_FORMATS:
+            raise ValueError(f"Unknown segment format {self.format}, expected one of {sorted(SEGMENT_FORMATS)}")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.lock = FileLock(str(self.directory / LOCK_NAME))
+        with self.lock:
+            self.manifest = self._load_manifest()
+            self._recover_tail()
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.directory / MANIFEST_NAME
+
+    @property
+    def last_id(self) -> int:
+        return self.manifest["last_id"]
+
+    @property
+    def generation(self) -> int:
+        return self.manifest.get("generation", 0)
+
+    @property
+    def latest_time(self) -> Optional[int]:
+        bounds = [seg["max_time"] for seg in self.manifest["segments"] if seg.get("max_time") is not None]
+        return max(bounds) if bounds else None
+
+    @property
+    def record_count(self) -> int:
+        return sum(seg["records"] for seg in self.manifest["segments"])
+
+    def segment_path(self, segment: Dict) -> Path:
+        return self._segment_path(segment)
+
+    def _segment_path(self, segment: Dict) -> Path:
+        return self.directory / segment["name"]
+
+    @property
+    def compaction(self) -> Dict:
+        return self.manifest.get("compaction") or {}
+
+    def _new_segment(self, partition: str) -> Dict:
+        index = self.manifest.get("next_segment", len(self.manifest["segments"]))
+        self.manifest["next_segment"] = index + 1
+        return {
+            "name": f"segment_{index:06d}{SEGMENT_FORMATS[self.format]}",
+            "format": self.format,
+            "partition": partition,
+            "records": 0,
+            "bytes": 0,
+            "min_time": None,
+            "max_time": None,
+            "min_id": None,
+            "max_id": None
+        }
+
+    def _extend_bounds(self, segment: Dict, record_id: Optional[int], moment: Optional[int]):
+        if isinstance(record_id, int) and record_id >= 0:
+            if segment.get("min_id") is None or record_id < segment["min_id"]:
+                segment["min_id"] = record_id
+            if segment.get("max_id") is None or record_id > segment["max_id"]:
+                segment["max_id"] = record_id
+
+        if moment is None:
+            return
+        if segment.get("min_time") is None or moment < segment["min_time"]:
+            segment["min_time"] = moment
+        if segment.get("max_time") is None or moment > segment["max_time"]:
+            segment["max_time"] = moment
+
+    def _load_manifest(self) -> Dict:
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"last_id": -1, "segments": []}
+
+    def _write_manifest(self):
+        self.manifest["generation"] = self.generation + 1
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        self._fsync_directory()
+
+    def _fsync_directory(self):
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _recover_tail(self):
+        if not self.manifest["segments"]:
+            return
+
+        tail = self.manifest["segments"][-1]
+        path = self._segment_path(tail)
+        if not path.exists():
+            path.touch()
+            return
+
+        size = path.stat().st_size
+        if size == tail["bytes"]:
+            return
+
+        with open(path, 'rb') as f:
+            f.seek(tail["bytes"])
+            pending = f.read()
+
+        committed = tail["bytes"]
+        if segment_format(tail) == "bin":
+            packed = decode_array(pending)
+            committed += packed.size * RECORD_SIZE
+            tail["records"] += packed.size
+            if packed.size:
+                self._extend_bounds(tail, int(packed["id"].min()), int(packed["time"].min()))
+                self._extend_bounds(tail, int(packed["id"].max()), int(packed["time"].max()))
+                self.manifest["last_id"] = max(self.manifest["last_id"], int(packed["id"].max()))
+        else:
+            for line in pending.splitlines(keepends=True):
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = loads(line)
+                except json.JSONDecodeError:
+                    break
+                committed += len(line)
+                tail["records"] += 1
+                self._extend_bounds(tail, record.get("id"), record_epoch(record))
+                self.manifest["last_id"] = max(self.manifest["last_id"], record.get("id", -1))
+
+        if committed != size:
+            logger.warning(f"Truncating torn tail write in {path} at byte {committed}")
+            with open(path, 'r+b') as f:
+                f.truncate(committed)
+                f.flush()
+                os.fsync(f.fileno())
+
+        tail["bytes"] = committed
+        self._write_manifest()
+        logger.info(f"Recovered segment {tail['name']} up to id {self.last_id}")
+
+    def _rotate(self, partition: str):
+        segment = self._new_segment(partition)
+        path = self._segment_path(segment)
+        with open(path, 'wb') as f:
+            os.fsync(f.fileno())
+        self.manifest["segments"].append(segment)
+        self._write_manifest()
+        logger.info(f"Rotated to segment {segment['name']}")
+
+    def sync(self):
+        with self.lock:
+            self.manifest = self._load_manifest()
+            self._recover_tail()
+
+    def commit_compaction(self, state: Dict, dropped: List[Dict]):
+        names = {segment["name"] for segment in dropped}
+        with self.lock:
+            self.manifest["segments"] = [
+                segment for segment in self.manifest["segments"] if segment["name"] not in names
+            ]
+            self.manifest["compaction"] = state
+            self._write_manifest()
+
+        for segment in dropped:
+            try:
+                self._segment_path(segment).unlink()
+            except FileNotFoundError:
+                pass
+        if dropped:
+            logger.info(f"Dropped {len(dropped)} compacted segments from {self.directory}")
+
+    def append_many(self, records: List[Dict], assign_ids: bool = False) -> int:
+        if not records:
+            return 0
+
+        with self.lock:
+            self.manifest = self._load_manifest()
+            self._recover_tail()
+            if assign_ids:
+                for offset, record in enumerate(records, start=1):
+                    record["id"] = self.last_id + offset
+            return self._append_locked(validate_records(records))
+
+    def _encode(self, observations: List[Observation]) -> bytes:
+        if self.format == "bin":
+            return encode_observations(observations)
+        return b"".join(dumps(observation.to_dict()) + b"\n" for observation in observations)
+
+    def _append_locked(self, observations: List[Observation]) -> int:
+        written = 0
+        while written < len(observations):
+            partition = partition_key(observations[written])
+            segments = self.manifest["segments"]
+            if not segments or segments[-1]["records"] >= self.max_segment_records or \
+                    segments[-1].get("partition", partition) != partition or segment_format(segments[-1]) != self.format:
+                self._rotate(partition)
+
+            tail = self.manifest["segments"][-1]
+            room = self.max_segment_records - tail["records"]
+            chunk = []
+            for observation in observations[written:written + room]:
+                if partition_key(observation) != partition:
+                    break
+                chunk.append(observation)
+            payload = self._encode(chunk)
+
+            with open(self._segment_path(tail), 'ab') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+
+            tail["records"] += len(chunk)
+            tail["bytes"] += len(payload)
+            for observation in chunk:
+                self.manifest["last_id"] = max(self.manifest["last_id"], observation.id)
+                self._extend_bounds(tail, observation.id, observation.time)
+            self._write_manifest()
+            written += len(chunk)
+
+        return written
+
+    def append(self, record: Dict, assign_ids: bool = False) -> bool:
+        return self.append_many([record], assign_ids) == 1
+
+    def position(self) -> Tuple[int, int]:
+        if not self.manifest["segments"]:
+            return (0, 0)
+        return (len(self.manifest["segments"]) - 1, self.manifest["segments"][-1]["bytes"])
+
+    def can_resume_from(self, segment_name: str, segment_index: int, offset: int) -> bool:
+        segments = self.manifest["segments"]
+        if segment_index >= len(segments):
+            return segment_index == 0 and offset == 0
+        return segments[segment_index]["name"] == segment_name and segments[segment_index]["bytes"] >= offset
+
+    def segment_name(self, segment_index: int) -> str:
+        segments = self.manifest["segments"]
+        return segments[segment_index]["name"] if segment_index < len(segments) else ""
+
+    def read_segment(self, segment: Dict, start: int = 0) -> List[Dict]:
+        path = self._segment_path(segment)
+        with open(path, 'rb') as f:
+            f.seek(start)
+            payload = f.read(segment["bytes"] - start)
+        with timed("weather_stage_duration_seconds", stage="json_parse", backend="json"):
+            if segment_format(segment) == "bin":
+                records = array_to_dicts(decode_array(payload))
+            else:
+                records = [loads(line) for line in payload.splitlines() if line]
+        record_read(len(records), len(payload), backend="json")
+        return records
+
+    def segments_overlapping(self, start: Optional[int] = None, end: Optional[int] = None) -> List[Dict]:
+        overlapping = []
+        for segment in self.manifest["segments"]:
+            if not segment["records"]:
+                continue
+            if start is not None and segment.get("max_time") is not None and segment["max_time"] < start:
+                continue
+            if end is not None and segment.get("min_time") is not None and segment["min_time"] > end:
+                continue
+            overlapping.append(segment)
+        return overlapping
+
+    def partitions(self) -> Dict[str, Dict]:
+        return partition_summary(self.manifest["segments"])
+
+    def iter_segment(self, segment: Dict, start: int = 0, batch_size: int = 1000) -> Iterator[Dict]:
+        count = 0
+        with open(self._segment_path(segment), 'rb') as f:
+            f.seek(start)
+            remaining = segment["bytes"] - start
+            try:
+                if segment_format(segment) == "bin":
+                    while remaining > 0:
+                        payload = f.read(min(remaining, batch_size * RECORD_SIZE))
+                        if not payload:
+                            break
+                        remaining -= len(payload)
+                        records = array_to_dicts(decode_array(payload))
+                        count += len(records)
+                        yield from records
+                    return
+                while remaining > 0:
+                    line = f.readline(remaining)
+                    if not line:
+                        break
+                    remaining -= len(line)
+                    if line.strip():
+                        count += 1
+                        yield loads(line)
+            finally:
+                record_read(count, segment["bytes"] - start - remaining, backend="json")
+
+    def iter_all(self) -> Iterator[Dict]:
+        for segment in list(self.manifest["segments"]):
+            yield from self.iter_segment(segment)
+
+    def segments_after_id(self, after_id: Optional[int]) -> List[Dict]:
+        if after_id is None:
+            return list(self.manifest["segments"])
+        return [
+            segment for segment in self.manifest["segments"]
+            if segment.get("max_id") is None or segment["max_id"] > after_id
+        ]
+
+    def segments_before_id(self, before_id: int) -> List[Dict]:
+        return [
+            segment for segment in self.manifest["segments"]
+            if segment.get("min_id") is None or segment["min_id"] < before_id
+        ]
+
+    def read_from(self, segment_index: int, offset: int) -> List[Dict]:
+        records = []
+        for index in range(segment_index, len(self.manifest["segments"])):
+            start = offset if index == segment_index else 0
+            records.extend(self.read_segment(self.manifest["segments"][index], start))
+        return records
+
+    def read_all(self) -> List[Dict]:
+        records = []
+        for segment in self.manifest["segments"]:
+            records.extend(self.read_segment(segment))
+        return records
+
+    def is_empty(self) -> bool:
+        return self.last_id < 0 and self.record_count == 0
+
+    def read_manifest(self) -> Dict:
+        return self._load_manifest()
+
+    def reload(self):
+        self.manifest = self._load_manifest()
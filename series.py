@@ -0,0 +1,71 @@
+import numpy as np
+from typing import Dict, List
+
+
+BUCKET_SECONDS = {
+    "hour": 3600,
+    "day": 24 * 3600,
+    "week": 7 * 24 * 3600,
+}
+
+SERIES_FIELDS = ("temperature", "windspeed")
+
+WEEK_OFFSET = 4 * 24 * 3600
+
+
+def format_times(times: np.ndarray) -> List[str]:
+    return times.astype("datetime64[s]").astype("datetime64[m]").astype(str).tolist()
+
+
+def bucket_keys(times: np.ndarray, bucket: str) -> np.ndarray:
+    seconds = BUCKET_SECONDS[bucket]
+    offset = WEEK_OFFSET if bucket == "week" else 0
+    return (times - offset) // seconds * seconds + offset
+
+
+def bucket_aggregate(times: np.ndarray, values: np.ndarray, bucket: str) -> Dict[str, np.ndarray]:
+    if times.size == 0:
+        empty = np.empty(0)
+        return {"time": empty.astype(np.int64), "mean": empty, "min": empty, "max": empty, "count": empty.astype(np.int64)}
+
+    keys = bucket_keys(times, bucket)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    counts = np.diff(np.concatenate((starts, [keys.size])))
+    values = values.astype(np.float64)
+
+    return {
+        "time": keys[starts],
+        "mean": np.add.reduceat(values, starts) / counts,
+        "min": np.minimum.reduceat(values, starts),
+        "max": np.maximum.reduceat(values, starts),
+        "count": counts
+    }
+
+
+def lttb(times: np.ndarray, values: np.ndarray, threshold: int) -> np.ndarray:
+    size = times.size
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+
+    x = times.astype(np.float64)
+    y = values.astype(np.float64)
+    edges = np.linspace(1, size - 1, threshold - 1).astype(np.int64)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    previous = 0
+
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else size
+        avg_x = x[next_lo:next_hi].mean() if next_hi > next_lo else x[-1]
+        avg_y = y[next_lo:next_hi].mean() if next_hi > next_lo else y[-1]
+
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[lo:hi] - y[previous]) -
+            (x[previous] - x[lo:hi]) * (avg_y - y[previous])
+        )
+        previous = lo + int(np.argmax(areas))
+        selected[i + 1] = previous
+
+    return selected
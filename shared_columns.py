@@ -0,0 +1,73 @@
+from loguru import logger
+import os
+import shutil
+import numpy as np
+from pathlib import Path
+from typing import Dict, Optional
+from columnar import COLUMN_DTYPES, WeatherColumns
+
+
+logger.add('logs/shared_columns.txt', rotation="1 week")
+
+
+class SharedColumnCache:
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, segment: Dict) -> Path:
+        return self.directory / f"{Path(segment['name']).stem}-{segment['bytes']}"
+
+    def load(self, segment: Dict) -> Optional[WeatherColumns]:
+        path = self._path(segment)
+        if not path.is_dir():
+            return None
+
+        try:
+            arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in COLUMN_DTYPES}
+        except (FileNotFoundError, ValueError) as e:
+            logger.warning(f"Unreadable shared columns at {path}: {e}")
+            return None
+
+        columns = WeatherColumns.from_arrays(arrays)
+        if len(columns) != segment["records"] or not columns.is_sorted:
+            return None
+        return columns
+
+    def store(self, segment: Dict, columns: WeatherColumns) -> bool:
+        path = self._path(segment)
+        if path.is_dir() or not columns.is_sorted:
+            return False
+
+        tmp_path = self.directory / f".{path.name}.{os.getpid()}.tmp"
+        try:
+            tmp_path.mkdir(parents=True, exist_ok=True)
+            for name in COLUMN_DTYPES:
+                with open(tmp_path / f"{name}.npy", 'wb') as f:
+                    np.save(f, np.ascontiguousarray(columns.column(name)))
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.rename(tmp_path, path)
+        except OSError as e:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if not path.is_dir():
+                logger.warning(f"Could not publish shared columns for {segment['name']}: {e}")
+                return False
+            return True
+
+        self._prune(segment)
+        return True
+
+    def discard(self, segment: Dict):
+        prefix = f"{Path(segment['name']).stem}-"
+        for entry in self.directory.iterdir():
+            if entry.name.startswith(prefix):
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def _prune(self, segment: Dict):
+        current = self._path(segment).name
+        prefix = f"{Path(segment['name']).stem}-"
+        for entry in self.directory.iterdir():
+            if entry.name.startswith(prefix) and entry.name != current:
+                shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,392 @@
+from loguru import logger
+import sqlite3
+import threading
+import time
+import numpy as np
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from columnar import COLUMN_DTYPES, WeatherColumns, record_epoch
+from record_stream import batched, project
+from rolling_aggregates import DEFAULT_CALM_THRESHOLD, RollingAggregates
+from blocking_pool import run_blocking
+from instrumentation import instrument, record_read
+
+
+logger.add('logs/sqlite_data.txt', rotation="1 week")
+
+RECORD_FIELDS = ("id", "time", "interval", "temperature", "windspeed", "winddirection", "weathercode", "is_day", "timestamp")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    location TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    time TEXT NOT NULL,
+    epoch INTEGER NOT NULL,
+    interval INTEGER,
+    temperature REAL,
+    windspeed REAL,
+    winddirection REAL,
+    weathercode INTEGER,
+    is_day INTEGER,
+    timestamp TEXT,
+    PRIMARY KEY (location, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_observations_location_time ON observations (location, epoch);
+CREATE TABLE IF NOT EXISTS station_versions (
+    location TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL,
+    modified REAL NOT NULL
+);
+"""
+
+INSERT_SQL = (
+    "INSERT OR IGNORE INTO observations "
+    "(location, id, time, epoch, interval, temperature, windspeed, winddirection, weathercode, is_day, timestamp) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+VERSION_SQL = (
+    "INSERT INTO station_versions (location, last_id, modified) VALUES (?, ?, ?) "
+    "ON CONFLICT(location) DO UPDATE SET last_id = MAX(last_id, excluded.last_id), modified = excluded.modified"
+)
+
+SELECT_FIELDS = ", ".join(RECORD_FIELDS)
+
+
+class SQLiteDataManager:
+
+    def __init__(self, database: str = 'data/weather.db', location: str = 'tehran', batch_size: int = 5000):
+        self.database = database
+        self.location = location
+        self.filename = f"{database}#{location}"
+        self.batch_size = batch_size
+        Path(self.database).parent.mkdir(parents=True, exist_ok=True)
+
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._cache: Optional[List[Dict]] = None
+        self._cache_version: Optional[Tuple] = None
+        self.rolling = RollingAggregates()
+        self._rolling_id: Optional[int] = None
+        self._stats: Tuple[Optional[Tuple], int, Optional[int]] = (None, 0, None)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.database, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _row(self, record: Dict) -> Tuple:
+        return (
+            self.location, record["id"], record.get("time"), record_epoch(record),
+            record.get("interval"), record.get("temperature"), record.get("windspeed"),
+            record.get("winddirection"), record.get("weathercode"), record.get("is_day"), record.get("timestamp")
+        )
+
+    def _record(self, row: Tuple) -> Dict:
+        return {name: value for name, value in zip(RECORD_FIELDS, row) if value is not None}
+
+    def _version(self) -> Tuple[int, float]:
+        row = self._connection().execute(
+            "SELECT last_id, modified FROM station_versions WHERE location = ?", (self.location,)
+        ).fetchone()
+        return (row[0], row[1]) if row else (-1, 0.0)
+
+    def _window_bounds(self, period: Optional[int], start: Optional[int],
+                       end: Optional[int]) -> Tuple[str, List]:
+        if start is None and end is None and period is not None:
+            latest = self.latest_time()
+            if latest is None:
+                return "location = ?", [self.location]
+            return "location = ? AND epoch > ?", [self.location, latest - period * 3600]
+
+        clauses, params = ["location = ?"], [self.location]
+        if start is not None:
+            clauses.append("epoch >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("epoch <= ?")
+            params.append(end)
+        return " AND ".join(clauses), params
+
+    def insert_many(self, records: List[Dict]) -> int:
+        rows = [self._row(record) for record in records if record_epoch(record) is not None and "id" in record]
+        if not rows:
+            return 0
+
+        conn = self._connection()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = conn.total_changes
+                conn.executemany(INSERT_SQL, rows)
+                inserted = conn.total_changes - before
+                conn.execute(VERSION_SQL, (self.location, max(row[1] for row in rows), time.time()))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._station_stats()
+        return inserted
+
+    def _save_locked(self, records: List[Dict]) -> int:
+        conn = self._connection()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT last_id FROM station_versions WHERE location = ?", (self.location,)
+                ).fetchone()
+                last_id = row[0] if row else -1
+                for offset, record in enumerate(records, start=1):
+                    record["id"] = last_id + offset
+                conn.executemany(INSERT_SQL, [self._row(record) for record in records])
+                conn.execute(VERSION_SQL, (self.location, last_id + len(records), time.time()))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._station_stats()
+        return len(records)
+
+    def invalidate_cache(self):
+        self._cache_version = None
+
+    def cache_stats(self) -> Dict:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": round(self.cache_hits / lookups, 4) if lookups else 0.0,
+            "cached_records": len(self._cache) if self._cache is not None else 0
+        }
+
+    def _read_data_locked(self) -> List[Dict]:
+        with self._lock:
+            version = self._version()
+            if self._cache is not None and version == self._cache_version:
+                self.cache_hits += 1
+                return self._cache
+
+            self.cache_misses += 1
+            rows = self._connection().execute(
+                f"SELECT {SELECT_FIELDS} FROM observations WHERE location = ? ORDER BY id", (self.location,)
+            ).fetchall()
+            self._cache = [self._record(row) for row in rows]
+            self._cache_version = version
+            record_read(len(rows), 0, backend="sqlite")
+            return self._cache
+
+    @instrument("weather_stage_duration_seconds", stage="read_data", backend="sqlite")
+    async def read_data(self) -> List[Dict]:
+        try:
+            return await run_blocking(self._read_data_locked)
+        except sqlite3.Error as e:
+            logger.warning(f"SQLite error reading {self.filename}: {e}")
+            return []
+        except Exception as e:
+            logger.error(f"Issues in read_data: {e}")
+            return []
+
+    def iter_records(self, fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        yield from self.iter_after(None, fields)
+
+    def iter_after(self, after_id: Optional[int] = None, fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+        cursor = self._connection().execute(
+            f"SELECT {SELECT_FIELDS} FROM observations WHERE location = ? AND id > ? ORDER BY id",
+            (self.location, -1 if after_id is None else after_id)
+        )
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield project(self._record(row), fields)
+
+    def page_before(self, before_id: int, limit: int, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        rows = self._connection().execute(
+            f"SELECT {SELECT_FIELDS} FROM observations WHERE location = ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (self.location, before_id, limit)
+        ).fetchall()
+        return [project(self._record(row), fields) for row in reversed(rows)]
+
+    def iter_batches(self, batch_size: Optional[int] = None,
+                     fields: Optional[Sequence[str]] = None) -> Iterator[List[Dict]]:
+        yield from batched(self.iter_records(fields), batch_size or self.batch_size)
+
+    def _read_columns_locked(self, period: Optional[int], start: Optional[int], end: Optional[int]) -> WeatherColumns:
+        where, params = self._window_bounds(period, start, end)
+        names = [name for name in COLUMN_DTYPES if name != "time"]
+        rows = self._connection().execute(
+            f"SELECT epoch, {', '.join(names)} FROM observations WHERE {where} ORDER BY epoch", params
+        ).fetchall()
+        record_read(len(rows), 0, backend="sqlite")
+        if not rows:
+            return WeatherColumns()
+
+        values = list(zip(*rows))
+        arrays = {"time": np.array(values[0], dtype=np.int64)}
+        for index, name in enumerate(names, start=1):
+            default = np.nan if COLUMN_DTYPES[name] is np.float32 else 0
+            column = [default if value is None else value for value in values[index]]
+            arrays[name] = np.array(column, dtype=COLUMN_DTYPES[name])
+        return WeatherColumns.from_arrays(arrays)
+
+    @instrument("weather_stage_duration_seconds", stage="read_columns", backend="sqlite")
+    async def read_columns(self, period: Optional[int] = None, start: Optional[int] = None,
+                           end: Optional[int] = None) -> WeatherColumns:
+        try:
+            return await run_blocking(self._read_columns_locked, period, start, end)
+        except Exception as e:
+            logger.error(f"Issues in read_columns: {e}")
+            return WeatherColumns()
+
+    def _read_snapshot_locked(self, period: Optional[int], start: Optional[int],
+                              end: Optional[int]) -> Tuple[int, WeatherColumns]:
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            return self._version()[0], self._read_columns_locked(period, start, end)
+        finally:
+            conn.execute("COMMIT")
+
+    @instrument("weather_stage_duration_seconds", stage="read_snapshot", backend="sqlite")
+    async def read_snapshot(self, period: Optional[int] = None, start: Optional[int] = None,
+                            end: Optional[int] = None) -> Tuple[int, WeatherColumns]:
+        try:
+            return await run_blocking(self._read_snapshot_locked, period, start, end)
+        except Exception as e:
+            logger.error(f"Issues in read_snapshot: {e}")
+            return -1, WeatherColumns()
+
+    def _aggregate_locked(self, period: Optional[int], start: Optional[int], end: Optional[int],
+                          threshold: float) -> Dict:
+        where, params = self._window_bounds(period, start, end)
+        row = self._connection().execute(
+            "SELECT COUNT(*), AVG(temperature), MIN(temperature), MAX(temperature), "
+            "AVG(windspeed), MAX(windspeed), SUM(windspeed < ?) "
+            f"FROM observations WHERE {where}", [threshold] + params
+        ).fetchone()
+        return {
+            "count": row[0],
+            "avg_temperature": row[1],
+            "min_temperature": row[2],
+            "max_temperature": row[3],
+            "avg_windspeed": row[4],
+            "peak_windspeed": row[5],
+            "calm_count": row[6] or 0
+        }
+
+    @instrument("weather_stage_duration_seconds", stage="aggregate", backend="sqlite")
+    async def aggregate(self, period: Optional[int] = None, start: Optional[int] = None, end: Optional[int] = None,
+                        threshold: float = DEFAULT_CALM_THRESHOLD) -> Optional[Dict]:
+        try:
+            return await run_blocking(self._aggregate_locked, period, start, end, threshold)
+        except Exception as e:
+            logger.error(f"Issues in aggregate: {e}")
+            return None
+
+    def _read_rolling_locked(self, window: str) -> Optional[Dict]:
+        with self._lock:
+            conn = self._connection()
+            if self._rolling_id is None:
+                self.rolling = RollingAggregates()
+                where, params = self._window_bounds(self.rolling.longest // 3600, None, None)
+                rows = conn.execute(
+                    f"SELECT {SELECT_FIELDS} FROM observations WHERE {where} ORDER BY epoch", params
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    f"SELECT {SELECT_FIELDS} FROM observations WHERE location = ? AND id > ? ORDER BY epoch",
+                    (self.location, self._rolling_id)
+                ).fetchall()
+
+            records = [self._record(row) for row in rows]
+            if self._rolling_id is not None and not self.rolling.accepts(records):
+                self._rolling_id = None
+                return self._read_rolling_locked(window)
+            self.rolling.push_many(records)
+            if records:
+                self._rolling_id = max(max(record["id"] for record in records), self._rolling_id or -1)
+            elif self._rolling_id is None:
+                self._rolling_id = -1
+            return self.rolling.snapshot(window)
+
+    @instrument("weather_stage_duration_seconds", stage="read_rolling", backend="sqlite")
+    async def read_rolling(self, window: str) -> Optional[Dict]:
+        try:
+            return await run_blocking(self._read_rolling_locked, window)
+        except Exception as e:
+            logger.error(f"Issues in read_rolling: {e}")
+            self._rolling_id = None
+            return None
+
+    def _station_stats(self) -> Tuple[Optional[Tuple], int, Optional[int]]:
+        # Keyed on the station version so event loop callers only pay the version lookup.
+        version, stats = self._version(), self._stats
+        if stats[0] != version:
+            row = self._connection().execute(
+                "SELECT COUNT(*), MAX(epoch) FROM observations WHERE location = ?", (self.location,)
+            ).fetchone()
+            stats = (version, row[0], row[1])
+            self._stats = stats
+        return stats
+
+    def record_count(self) -> int:
+        return self._station_stats()[1]
+
+    def latest_time(self) -> Optional[int]:
+        return self._station_stats()[2]
+
+    def data_version(self) -> int:
+        return self._version()[0]
+
+    def last_modified(self) -> Optional[float]:
+        modified = self._version()[1]
+        return modified or None
+
+    def partitions(self) -> Dict[str, Dict]:
+        rows = self._connection().execute(
+            "SELECT substr(time, 1, 7), COUNT(*), MIN(epoch), MAX(epoch) FROM observations "
+            "WHERE location = ? GROUP BY substr(time, 1, 7) ORDER BY 1", (self.location,)
+        ).fetchall()
+        return {
+            partition: {"records": records, "min_time": min_time, "max_time": max_time}
+            for partition, records, min_time, max_time in rows
+        }
+
+    @instrument("weather_stage_duration_seconds", stage="save_data", backend="sqlite")
+    async def save_data(self, data: Dict) -> bool:
+        try:
+            data['timestamp'] = datetime.now().isoformat()
+            await run_blocking(self._save_locked, [data])
+            logger.info(f"Data saved successfully with id: {data.get('id')}")
+            return True
+        except Exception as e:
+            logger.error(f"Issues in save sqlite: {e}")
+            return False
+
+    @instrument("weather_stage_duration_seconds", stage="save_many", backend="sqlite")
+    async def save_many(self, records: List[Dict]) -> int:
+        if not records:
+            return 0
+
+        try:
+            timestamp = datetime.now().isoformat()
+            for record in records:
+                record['timestamp'] = timestamp
+            saved = await run_blocking(self._save_locked, records)
+            logger.info(f"Saved {saved} records in one write")
+            return saved
+        except Exception as e:
+            logger.error(f"Issues in save_many sqlite: {e}")
+            return 0
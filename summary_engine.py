@@ -0,0 +1,72 @@
+import numpy as np
+from typing import Dict, Iterable, Optional
+from columnar import WeatherColumns
+
+
+SUMMARY_METRICS = (
+    "avg_temperature",
+    "temp_range",
+    "avg_windspeed",
+    "peak_windspeed",
+    "dominant_wind_direction",
+    "wind_variability",
+    "calm_periods",
+)
+
+
+def unknown_metrics(metrics: Iterable[str]) -> list:
+    return [name for name in metrics if name not in SUMMARY_METRICS]
+
+
+def compute_summary(columns: WeatherColumns, start: int, stop: int,
+                    metrics: Optional[Iterable[str]] = None, calm_threshold: float = 5.0) -> Dict:
+    wanted = set(SUMMARY_METRICS if metrics is None else metrics)
+    count = stop - start
+    result = {}
+
+    if wanted & {"avg_temperature", "temp_range"}:
+        temps = columns.temperature[start:stop]
+        if "avg_temperature" in wanted:
+            result["avg_temperature"] = round(float(temps.sum(dtype=np.float64)) / count, 2)
+        if "temp_range" in wanted:
+            min_temp, max_temp = float(temps.min()), float(temps.max())
+            result["temp_range"] = {
+                "min": round(min_temp, 2),
+                "max": round(max_temp, 2),
+                "range": round(max_temp - min_temp, 2)
+            }
+
+    if wanted & {"avg_windspeed", "peak_windspeed", "calm_periods"}:
+        speeds = columns.windspeed[start:stop]
+        if "avg_windspeed" in wanted:
+            result["avg_windspeed"] = round(float(speeds.sum(dtype=np.float64)) / count, 2)
+        if "peak_windspeed" in wanted:
+            result["peak_windspeed"] = round(float(speeds.max()), 2)
+        if "calm_periods" in wanted:
+            calm_count = int(np.count_nonzero(speeds < calm_threshold))
+            result["calm_periods"] = {
+                "calm_periods": calm_count,
+                "total_periods": count,
+                "calm_percentage": round((calm_count / count) * 100, 1)
+            }
+
+    if wanted & {"dominant_wind_direction", "wind_variability"}:
+        directions = columns.winddirection[start:stop].astype(np.float64)
+        if "dominant_wind_direction" in wanted:
+            radians = np.radians(directions)
+            mean_direction = float(np.degrees(np.arctan2(np.sin(radians).sum(), np.cos(radians).sum())))
+            if mean_direction < 0:
+                mean_direction += 360
+            result["dominant_wind_direction"] = round(mean_direction, 1)
+        if "wind_variability" in wanted:
+            if len(columns) < 2:
+                result["wind_variability"] = None
+            elif count < 2:
+                result["wind_variability"] = 0.0
+            else:
+                diff = np.diff(directions)
+                diff -= 360 * (diff > 180)
+                diff += 360 * (diff < -180)
+                result["wind_variability"] = round(float(np.abs(diff).std()), 2)
+
+    return {name: result[name] for name in SUMMARY_METRICS if name in result}
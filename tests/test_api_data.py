@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import apis
+from benchmark import generate_records
+from catalog import Location
+
+
+@pytest.fixture(scope="module")
+def client():
+    apis.catalog.register(Location("paging-empty", 1.0, 1.0))
+    apis.catalog.register(Location("paging", 2.0, 2.0))
+    asyncio.run(apis.catalog.manager("paging").save_many(generate_records(2500)))
+    return TestClient(apis.app)
+
+
+@pytest.mark.parametrize("query", ["", "&format=ndjson", "&after=0", "&limit=5", "&before=10"])
+def test_empty_store_is_not_found(client, query):
+    assert client.get(f"/data?location=paging-empty{query}").status_code == 404
+
+
+def test_after_without_limit_is_paginated(client):
+    ids, cursor = [], -1
+    while cursor is not None:
+        page = client.get(f"/data?location=paging&after={cursor}").json()
+        assert page["count"] <= apis.DEFAULT_PAGE_SIZE
+        ids.extend(record["id"] for record in page["data"])
+        cursor = page["next_cursor"]
+
+    assert ids == sorted(set(ids))
+    assert len(ids) == 2500
+
+
+def test_limit_and_cursor_past_the_end(client):
+    page = client.get("/data?location=paging&limit=10").json()
+    assert page["count"] == 10
+    assert page["next_cursor"] == page["data"][-1]["id"]
+
+    last = client.get("/data?location=paging&after=-1&limit=2500").json()["data"][-1]["id"]
+    response = client.get(f"/data?location=paging&after={last}")
+    assert response.status_code == 200
+    assert response.json() == {"count": 0, "data": [], "next_cursor": None, "prev_cursor": None}
+
+
+def test_after_and_before_together_are_rejected(client):
+    response = client.get("/data?location=paging&after=10&before=20")
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Pass either after or before, not both"}
+
+
+def test_unpaginated_request_streams_everything(client):
+    assert client.get("/data?location=paging").json()["count"] == 2500
+
+
+def test_series_for_empty_station_is_not_found(client):
+    response = client.get("/series?location=paging-empty")
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Unable to build series"}
+
+
+def test_rolling_for_empty_station_is_not_found(client):
+    response = client.get("/rolling?location=paging-empty&window=24h")
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Unable to calculate rolling aggregates"}
+
+
+@pytest.mark.parametrize("path, detail", [
+    ("/summary", "Unable to generate summary"),
+    ("/temperature/average", "Unable to calculate average"),
+])
+def test_analysis_for_empty_station_is_not_found(client, path, detail):
+    response = client.get(f"{path}?location=paging-empty")
+    assert response.status_code == 404
+    assert response.json() == {"detail": detail}
@@ -0,0 +1,113 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from analyse import Analyse
+from backfill import Backfiller, Checkpoint
+from catalog import Location, StationCatalog
+from fetch_weather import WeatherFetcher
+
+STATIONS = [Location("north", 10.0, 10.0), Location("south", 20.0, 20.0)]
+
+
+def hourly(start: str, hours: int, temperature: float) -> dict:
+    origin = datetime.fromisoformat(start)
+    times = [(origin + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(hours)]
+    return {
+        "time": times,
+        "temperature_2m": [temperature] * hours,
+        "windspeed_10m": [5.0] * hours,
+        "winddirection_10m": [180] * hours,
+        "weathercode": [0] * hours,
+        "is_day": [1] * hours,
+    }
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def catalog(request, tmp_path):
+    catalog = StationCatalog(str(tmp_path / "catalog.json"), str(tmp_path), backend=request.param)
+    catalog.register(Location("gappy", 1.0, 1.0))
+    return catalog
+
+
+def test_gap_fill_reseeds_rolling_windows(catalog, tmp_path):
+    backfiller = Backfiller(catalog, None, Checkpoint(str(tmp_path / "checkpoint.json")))
+    analyser = Analyse(catalog.manager("gappy"))
+
+    async def run():
+        await backfiller.load_chunk("gappy", hourly("2024-01-01T00:00", 6, 10.0))
+        await backfiller.load_chunk("gappy", hourly("2024-01-01T18:00", 6, 10.0))
+        before = await analyser.get_rolling_aggregates("24h")
+        await backfiller.load_chunk("gappy", hourly("2024-01-01T06:00", 12, 30.0))
+        return before, await analyser.get_avg(24), await analyser.get_weather_summary(24)
+
+    before, average, summary = asyncio.run(run())
+
+    assert before["count"] == 12
+    assert average == 20.0
+    assert summary["data_points"] == 24
+    assert summary["avg_temperature"] == average
+
+
+def archive(index: int, request: dict):
+    params = request["params"]
+    first, last = date.fromisoformat(params["start_date"]), date.fromisoformat(params["end_date"])
+    hours = ((last - first).days + 1) * 24
+    items = [{"hourly": hourly(f"{first.isoformat()}T00:00", hours, float(latitude))}
+             for latitude in params["latitude"].split(",")]
+    return 200, {}, items if len(items) > 1 else items[0]
+
+
+def backfill_with(server, catalog, checkpoint_path, chunk_days=10):
+    async def run():
+        async with WeatherFetcher(base_url=server.url + "/v1/archive", max_retries=0, backoff_base=0.0,
+                                  requests_per_second=1000.0) as fetcher:
+            backfiller = Backfiller(catalog, fetcher, Checkpoint(checkpoint_path), chunk_days)
+            await backfiller.run(STATIONS, date(2024, 1, 1), date(2024, 1, 25))
+            return backfiller
+
+    return asyncio.run(run())
+
+
+def test_backfill_chunks_the_range_per_station_batch(stub_server, catalog, tmp_path):
+    server = stub_server(archive)
+    backfiller = backfill_with(server, catalog, str(tmp_path / "checkpoint.json"))
+
+    ranges = sorted((request["params"]["start_date"], request["params"]["end_date"]) for request in server.requests)
+    assert ranges == [("2024-01-01", "2024-01-10"), ("2024-01-11", "2024-01-20"), ("2024-01-21", "2024-01-25")]
+    assert all(request["params"]["latitude"] == "10.0,20.0" for request in server.requests)
+    assert backfiller.inserted == {"north": 25 * 24, "south": 25 * 24}
+    assert not backfiller.failed
+    assert catalog.manager("south").record_count() == 25 * 24
+
+
+def test_backfill_resumes_from_checkpoint_after_interruption(stub_server, catalog, tmp_path):
+    def interrupted(index, request):
+        if request["params"]["start_date"] == "2024-01-11":
+            return 400, {}, {"reason": "interrupted"}
+        return archive(index, request)
+
+    checkpoint = str(tmp_path / "checkpoint.json")
+    first = backfill_with(stub_server(interrupted), catalog, checkpoint)
+    assert first.failed == ["north:2024-01-11:2024-01-20", "south:2024-01-11:2024-01-20"]
+    assert first.inserted == {"north": 15 * 24, "south": 15 * 24}
+
+    server = stub_server(archive)
+    second = backfill_with(server, catalog, checkpoint)
+    assert [request["params"]["start_date"] for request in server.requests] == ["2024-01-11"]
+    assert second.inserted == {"north": 10 * 24, "south": 10 * 24}
+    assert catalog.manager("north").record_count() == 25 * 24
+
+
+def test_backfill_skips_times_already_stored(stub_server, catalog, tmp_path):
+    catalog.register(STATIONS[0])
+    existing = hourly("2024-01-05T00:00", 48, 99.0)
+    asyncio.run(Backfiller(catalog, None, Checkpoint(str(tmp_path / "seed.json"))).load_chunk("north", existing))
+
+    backfiller = backfill_with(stub_server(archive), catalog, str(tmp_path / "checkpoint.json"))
+
+    assert backfiller.inserted == {"north": 25 * 24 - 48, "south": 25 * 24}
+    assert catalog.manager("north").record_count() == 25 * 24
+    columns = asyncio.run(catalog.manager("north").read_columns())
+    assert len(set(columns.time.tolist())) == 25 * 24
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from analyse import Analyse
+from benchmark import generate_records
+from data_json_manager import JSONDataManager
+
+EXACT = {
+    "day aligned": ("2024-01-01T00:00", "2024-01-31T23:59"),
+    "hour aligned": ("2024-04-20T05:00", "2024-05-03T17:59"),
+    "across tiers": ("2024-02-10T00:00", "2024-06-20T11:59"),
+    "unaligned between records": ("2024-05-01T05:45", "2024-05-02T09:45"),
+    "open start": (None, "2024-03-31T23:59"),
+    "period in hourly tier": 24 * 80,
+    "period past hourly retention": 24 * 150,
+}
+INEXACT = {
+    "partial day past hourly retention": ("2024-01-01T00:00", "2024-01-01T10:00"),
+    "mid hour past hourly retention": ("2024-02-03T05:17", "2024-03-20T00:00"),
+    "across tiers with unaligned end": ("2024-02-10T00:00", "2024-05-01T00:00"),
+    "mid hour in hourly tier": ("2024-05-01T05:17", "2024-05-02T09:59"),
+}
+
+
+def half_hourly(days: int):
+    origin = datetime(2024, 1, 1)
+    records = generate_records(days * 48)
+    for index, record in enumerate(records):
+        record["time"] = (origin + timedelta(minutes=30 * index)).strftime("%Y-%m-%dT%H:%M")
+    return records
+
+
+async def answers(analyser: Analyse, window):
+    period, start, end = window, None, None
+    if isinstance(window, tuple):
+        period = 24
+        start, end = (datetime.fromisoformat(value) if value else None for value in window)
+    return [
+        await analyser.get_weather_summary(period, None, start, end),
+        await analyser.get_avg(period, start, end),
+        await analyser.get_temperature_range(period, start, end),
+        await analyser.get_series("temperature", period, "day", 500, start, end),
+        await analyser.get_calm_periods(period, 7.0, start, end),
+    ]
+
+
+@pytest.fixture(scope="module")
+def compacted(tmp_path_factory):
+    manager = JSONDataManager(str(tmp_path_factory.mktemp("compaction") / "station.json"), max_segment_records=500)
+    manager.store.append_many(half_hourly(200))
+    windows = {**EXACT, **INEXACT}
+
+    async def run():
+        analyser = Analyse(manager)
+        before = {name: await answers(analyser, window) for name, window in windows.items()}
+        result = await manager.compact(40, 100)
+        after = {name: await answers(analyser, window) for name, window in windows.items()}
+        return before, result, after
+
+    return asyncio.run(run())
+
+
+def test_compaction_drops_raw_segments(compacted):
+    _, result, _ = compacted
+    assert result["dropped_segments"] > 0
+    assert set(result["rollup_rows"]) == {"day", "hour"}
+
+
+@pytest.mark.parametrize("name", EXACT)
+def test_exact_windows_answer_the_same_after_compaction(compacted, name):
+    before, _, after = compacted
+    summary, average, temperature_range, series, calm = after[name]
+    assert summary is not None
+    assert [summary, average, temperature_range, series] == before[name][:4]
+    assert calm is None
+
+
+@pytest.mark.parametrize("name", INEXACT)
+def test_inexact_windows_are_rejected_after_compaction(compacted, name):
+    before, _, after = compacted
+    assert before[name][0] is not None
+    assert after[name] == [None] * 5
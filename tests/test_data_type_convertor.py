@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import data_type_convertor
+from benchmark import generate_records
+from columnar import WeatherColumns, record_epoch
+from data_type_convertor import WeatherDataConverter
+
+RECORDS = generate_records(500)
+TEHRAN = timezone(timedelta(hours=3, minutes=30))
+
+
+def write(converter, kind, path):
+    if kind == "parquet":
+        return asyncio.run(converter.to_parquet(path, row_group_size=100))
+    return asyncio.run(converter.to_arrow(path, batch_size=100))
+
+
+def read(kind, path, **kwargs):
+    if kind == "parquet":
+        return asyncio.run(WeatherDataConverter.read_parquet(path, **kwargs))
+    return asyncio.run(WeatherDataConverter.read_arrow(path, **kwargs))
+
+
+def epochs(frame):
+    return [int(moment.timestamp()) for moment in frame["time"].dt.tz_localize("UTC")]
+
+
+@pytest.fixture(params=["parquet", "arrow"])
+def kind(request):
+    return request.param
+
+
+@pytest.mark.parametrize("source", ["records", "columns"])
+def test_round_trip_from_records_and_columns(kind, source, tmp_path):
+    path = str(tmp_path / f"weather.{kind}")
+    if source == "records":
+        converter = WeatherDataConverter(RECORDS)
+    else:
+        converter = WeatherDataConverter.from_columns(WeatherColumns.from_records(RECORDS))
+    assert write(converter, kind, path)
+
+    frame = read(kind, path)
+    assert len(frame) == len(RECORDS)
+    assert epochs(frame) == sorted(record_epoch(record) for record in RECORDS)
+    assert frame["id"].tolist() == [record["id"] for record in RECORDS]
+
+
+def test_naive_and_aware_bounds_select_the_same_rows(kind, tmp_path):
+    path = str(tmp_path / f"weather.{kind}")
+    assert write(WeatherDataConverter(RECORDS), kind, path)
+    start = datetime.fromisoformat(RECORDS[150]["time"])
+    end = datetime.fromisoformat(RECORDS[349]["time"])
+
+    naive = read(kind, path, columns=["time", "temperature"], start=start, end=end)
+    aware = read(kind, path, columns=["time", "temperature"],
+                 start=start.replace(tzinfo=timezone.utc).astimezone(TEHRAN),
+                 end=end.replace(tzinfo=timezone.utc).astimezone(TEHRAN))
+
+    assert naive is not None and aware is not None
+    assert list(naive.columns) == ["time", "temperature"]
+    assert len(naive) == 200
+    assert epochs(aware) == epochs(naive)
+
+
+def test_arrow_read_skips_batches_outside_the_window(tmp_path, monkeypatch):
+    path = str(tmp_path / "weather.arrow")
+    assert write(WeatherDataConverter(RECORDS), "arrow", path)
+    filtered = []
+    original = data_type_convertor._time_filter_mask
+
+    def counting_mask(times, lower, upper):
+        filtered.append(len(times))
+        return original(times, lower, upper)
+
+    monkeypatch.setattr(data_type_convertor, "_time_filter_mask", counting_mask)
+    start = datetime.fromisoformat(RECORDS[150]["time"])
+    frame = read("arrow", path, start=start, end=start + timedelta(hours=9))
+
+    assert len(frame) == 10
+    assert filtered == [100]
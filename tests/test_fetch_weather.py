@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from catalog import Location
+from fetch_weather import RateLimiter, WeatherFetcher
+
+
+def current(latitude: str) -> dict:
+    return {
+        "latitude": float(latitude),
+        "current_weather": {
+            "time": "2024-01-01T00:00", "interval": 900, "temperature": float(latitude),
+            "windspeed": 5.0, "winddirection": 90, "is_day": 1, "weathercode": 0
+        }
+    }
+
+
+def open_meteo(index: int, request: dict):
+    latitudes = request["params"]["latitude"].split(",")
+    items = [current(latitude) for latitude in latitudes]
+    return 200, {}, items if len(items) > 1 else items[0]
+
+
+def locations(count: int):
+    return [Location(f"station-{i}", float(i), float(i)) for i in range(count)]
+
+
+def fetcher_for(server, **options) -> WeatherFetcher:
+    options = {"backoff_base": 0.01, "requests_per_second": 1000.0, **options}
+    return WeatherFetcher(base_url=server.url + "/v1/forecast", **options)
+
+
+async def fetch(fetcher: WeatherFetcher, stations):
+    async with fetcher:
+        return await fetcher.fetch_all(stations)
+
+
+def test_retries_retryable_status_with_backoff(stub_server):
+    def respond(index, request):
+        return (503, {}, {"error": True}) if index < 2 else open_meteo(index, request)
+
+    server = stub_server(respond)
+    weather = asyncio.run(fetch(fetcher_for(server, max_retries=3), locations(1)))
+
+    assert len(server.requests) == 3
+    assert weather["station-0"]["temperature"] == 0.0
+
+
+def test_gives_up_after_max_retries(stub_server):
+    server = stub_server(lambda index, request: (500, {}, {"error": True}))
+
+    async def run():
+        async with fetcher_for(server, max_retries=2) as fetcher:
+            await fetcher.fetch_batch(locations(1))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
+    assert len(server.requests) == 3
+
+
+def test_client_errors_are_not_retried(stub_server):
+    server = stub_server(lambda index, request: (400, {}, {"reason": "bad request"}))
+
+    async def run():
+        async with fetcher_for(server, max_retries=3) as fetcher:
+            await fetcher.fetch_batch(locations(1))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
+    assert len(server.requests) == 1
+
+
+def test_honours_retry_after(stub_server):
+    def respond(index, request):
+        return (429, {"Retry-After": "0.4"}, {"error": True}) if index == 0 else open_meteo(index, request)
+
+    server = stub_server(respond)
+    weather = asyncio.run(fetch(fetcher_for(server, backoff_base=0.0), locations(1)))
+
+    assert len(server.requests) == 2
+    assert server.requests[1]["time"] - server.requests[0]["time"] >= 0.35
+    assert "station-0" in weather
+
+
+def test_batches_locations_per_request(stub_server):
+    server = stub_server(open_meteo)
+    stations = locations(5)
+    weather = asyncio.run(fetch(fetcher_for(server, batch_size=2), stations))
+
+    sizes = sorted(len(request["params"]["latitude"].split(",")) for request in server.requests)
+    assert sizes == [1, 2, 2]
+    assert sorted(weather) == sorted(station.name for station in stations)
+    assert all(weather[station.name]["temperature"] == station.lat for station in stations)
+
+
+def test_failed_batch_does_not_drop_the_others(stub_server):
+    def respond(index, request):
+        if "0.0" in request["params"]["latitude"].split(","):
+            return 400, {}, {"reason": "bad request"}
+        return open_meteo(index, request)
+
+    server = stub_server(respond)
+    weather = asyncio.run(fetch(fetcher_for(server, batch_size=2), locations(4)))
+
+    assert sorted(weather) == ["station-2", "station-3"]
+
+
+def test_rate_limiter_spaces_requests(stub_server):
+    server = stub_server(open_meteo)
+    started = time.monotonic()
+    weather = asyncio.run(fetch(fetcher_for(server, batch_size=1, requests_per_second=10.0), locations(15)))
+    elapsed = time.monotonic() - started
+
+    assert len(weather) == 15
+    assert elapsed >= 0.45
+    assert server.requests[-1]["time"] - server.requests[0]["time"] >= 0.45
+
+
+def test_rate_limiter_allows_burst_then_waits():
+    async def run():
+        limiter = RateLimiter(rate=20.0, burst=3)
+        stamps = []
+        for _ in range(6):
+            await limiter.acquire()
+            stamps.append(time.monotonic())
+        return stamps
+
+    stamps = asyncio.run(run())
+    assert stamps[2] - stamps[0] < 0.03
+    assert stamps[5] - stamps[2] >= 0.13
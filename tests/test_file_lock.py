@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+from file_lock import FileLock, LockTimeout
+
+
+def test_reentrant_within_a_thread(tmp_path):
+    lock = FileLock(str(tmp_path / "store.lock"))
+    with lock:
+        with lock:
+            assert lock.is_held
+        assert lock.is_held
+    assert not lock.is_held
+
+
+def test_other_threads_do_not_share_the_depth(tmp_path):
+    lock = FileLock(str(tmp_path / "store.lock"), timeout=0.1)
+    acquired = threading.Event()
+    release = threading.Event()
+
+    def holder():
+        with lock:
+            acquired.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    acquired.wait(5)
+    try:
+        assert not lock.is_held
+        with pytest.raises(LockTimeout):
+            lock.acquire()
+        lock.release()
+    finally:
+        release.set()
+        thread.join()
+
+    with lock:
+        assert lock.is_held
+
+
+def test_threads_are_mutually_exclusive(tmp_path):
+    lock = FileLock(str(tmp_path / "store.lock"))
+    inside, overlaps = [], []
+
+    def worker():
+        for _ in range(20):
+            with lock:
+                with lock:
+                    inside.append(1)
+                    if len(inside) > 1:
+                        overlaps.append(1)
+                    time.sleep(0.001)
+                    inside.pop()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not overlaps
+    assert not lock.is_held
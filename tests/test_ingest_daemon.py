@@ -0,0 +1,45 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from catalog import Location, StationCatalog
+from ingest_daemon import IngestDaemon
+
+
+def observations(count: int):
+    origin = datetime(2024, 1, 1)
+    return [{
+        "time": (origin + timedelta(minutes=15 * index)).strftime("%Y-%m-%dT%H:%M"), "interval": 900,
+        "temperature": 10.0 + index, "windspeed": 5.0, "winddirection": 90, "is_day": 1, "weathercode": 0
+    } for index in range(count)]
+
+
+def test_partial_save_failure_is_not_stored_twice(tmp_path):
+    catalog = StationCatalog(str(tmp_path / "catalog.json"), str(tmp_path))
+    station = Location("flaky", 1.0, 1.0)
+    daemon = IngestDaemon(catalog, [station], health_path=str(tmp_path / "health.json"), fetcher=object())
+    daemon.seed()
+    manager = catalog.manager("flaky")
+    append_many = manager.store.append_many
+    failures = []
+
+    def fail_halfway(records, assign_ids=False):
+        if failures:
+            return append_many(records, assign_ids)
+        failures.append(len(records))
+        append_many(records[:3], assign_ids)
+        raise OSError("disk full")
+
+    manager.store.append_many = fail_halfway
+    daemon.pending["flaky"] = observations(8)
+
+    asyncio.run(daemon.flush())
+    assert failures == [8]
+    assert [record["time"] for record in daemon.pending["flaky"]] == [record["time"] for record in observations(8)[3:]]
+    assert daemon.stations["flaky"].saved == 3
+
+    asyncio.run(daemon.flush())
+    assert daemon.pending == {}
+    assert daemon.stations["flaky"].saved == 8
+    columns = asyncio.run(manager.read_columns())
+    assert len(columns) == 8
+    assert len(set(columns.time.tolist())) == 8
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+
+from benchmark import generate_records
+from data_json_manager import JSONDataManager
+
+
+def test_manifest_sync_does_not_race_rotation(tmp_path):
+    manager = JSONDataManager(str(tmp_path / "sync.json"), max_segment_records=100)
+    records = generate_records(3000)
+    done = threading.Event()
+
+    def writer():
+        for offset in range(0, len(records), 30):
+            asyncio.run(manager.save_many(records[offset:offset + 30]))
+        done.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    while not done.is_set():
+        manager.data_version()
+        manager.latest_time()
+    thread.join()
+
+    reopened = JSONDataManager(str(tmp_path / "sync.json"))
+    assert reopened.record_count() == len(records)
+    assert len(asyncio.run(reopened.read_columns())) == len(records)
+
+
+def test_manifest_readers_do_not_wait_for_the_manager_lock(tmp_path):
+    manager = JSONDataManager(str(tmp_path / "busy.json"), max_segment_records=100)
+    asyncio.run(manager.save_many(generate_records(50)))
+    other = JSONDataManager(str(tmp_path / "busy.json"), max_segment_records=100)
+    held, release = threading.Event(), threading.Event()
+
+    def hold():
+        with manager._lock:
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait(5)
+    try:
+        asyncio.run(other.save_many(generate_records(250)[50:]))
+        started = time.monotonic()
+        assert manager.data_version() == 249
+        assert manager.record_count() == 250
+        assert manager.latest_time() == other.latest_time()
+        assert manager.compaction_state() == {}
+        assert sum(entry["records"] for entry in manager.partitions().values()) == 250
+        assert time.monotonic() - started < 0.5
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_cached_partitions_are_not_mutated_under_readers(tmp_path):
+    manager = JSONDataManager(str(tmp_path / "cow.json"), max_segment_records=1000)
+    records = generate_records(300)
+    asyncio.run(manager.save_many(records[:100]))
+    first = asyncio.run(manager.read_columns())
+    times = first.time.copy()
+
+    late = [dict(record, time="2020-01-01T00:30") for record in records[100:110]]
+    asyncio.run(manager.save_many(late + records[110:]))
+    second = asyncio.run(manager.read_columns())
+
+    assert len(first) == 100
+    assert (first.time == times).all()
+    assert len(second) == 300
+    assert second.is_sorted and (second.time[1:11] == times[0] + 1800).all()
@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+import apis
+from benchmark import generate_records
+from catalog import Location
+
+SUBSCRIBERS = 25
+
+
+class Client:
+
+    def __init__(self, path: str, query: str):
+        self.scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+            "query_string": query.encode(), "headers": [(b"host", b"testserver")],
+            "client": ("127.0.0.1", 1), "server": ("testserver", 80),
+        }
+        self.messages = []
+        self.received = asyncio.Event()
+        self.disconnected = asyncio.Event()
+        self.task = None
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.messages.append(message)
+        self.received.set()
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(apis.app(self.scope, self.receive, self.send))
+
+    async def close(self):
+        self.disconnected.set()
+        await asyncio.wait_for(self.task, 5)
+
+    @property
+    def status(self):
+        return next(message["status"] for message in self.messages if message["type"] == "http.response.start")
+
+    @property
+    def body(self) -> bytes:
+        return b"".join(message.get("body", b"") for message in self.messages if message["type"] == "http.response.body")
+
+    def events(self):
+        frames = [frame for frame in self.body.decode().split("\n\n") if frame.startswith("event: ")]
+        return [json.loads(frame.split("data: ", 1)[1]) for frame in frames]
+
+
+async def wait_until(condition, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_one_ingest_fans_out_one_summary_to_every_subscriber(monkeypatch):
+    apis.catalog.register(Location("fan-out", 3.0, 3.0))
+    manager = apis.catalog.manager("fan-out")
+    records = generate_records(48)
+    asyncio.run(manager.save_many(records[:24]))
+
+    calls = []
+    summarise = apis.watcher.summarise
+
+    async def counted(location):
+        calls.append(location)
+        return await summarise(location)
+
+    monkeypatch.setattr(apis.watcher, "summarise", counted)
+    monkeypatch.setattr(apis.watcher, "interval", 0.02)
+
+    async def run():
+        clients = [Client("/stream", "location=fan-out") for _ in range(SUBSCRIBERS)]
+        for client in clients:
+            client.start()
+        await wait_until(lambda: apis.broadcaster.stats()["subscribers"] == SUBSCRIBERS)
+        await wait_until(lambda: "fan-out" in apis.watcher.versions)
+
+        await manager.save_many(records[24:])
+        await wait_until(lambda: all(client.events() for client in clients))
+        await asyncio.sleep(0.1)
+
+        for client in clients:
+            await client.close()
+        await apis.watcher.stop()
+        return clients
+
+    clients = asyncio.run(run())
+
+    assert calls == ["fan-out"]
+    for client in clients:
+        assert client.status == 200
+        events = client.events()
+        assert len(events) == 1
+        assert events[0]["count"] == 24
+        assert events[0]["version"] == 47
+        assert events[0]["summary"]["data_points"] == 24
+    assert apis.broadcaster.stats()["subscribers"] == 0
+
+
+def test_stream_unknown_location_is_not_found():
+    async def run():
+        client = Client("/stream", "location=nowhere")
+        client.start()
+        await asyncio.wait_for(client.task, 5)
+        return client
+
+    client = asyncio.run(run())
+    assert client.status == 404
+    assert json.loads(client.body) == {"detail": "Unknown location nowhere"}
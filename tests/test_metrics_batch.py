@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import apis
+from analyse import Analyse
+from benchmark import generate_records
+from catalog import Location
+from data_json_manager import JSONDataManager
+from sqlite_data_manager import SQLiteDataManager
+
+EVERYTHING = [{"name": "summary", "period": 10 ** 6}]
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def manager(request, tmp_path):
+    if request.param == "json":
+        return JSONDataManager(str(tmp_path / "batch.json"), max_segment_records=200)
+    return SQLiteDataManager(str(tmp_path / "batch.db"), "batch")
+
+
+def test_version_labels_the_snapshot_it_was_read_with(manager):
+    records = generate_records(3000)
+    asyncio.run(manager.save_many(records[:100]))
+    done = threading.Event()
+
+    def writer():
+        for offset in range(100, len(records), 50):
+            asyncio.run(manager.save_many(records[offset:offset + 50]))
+        done.set()
+
+    async def read_until_done():
+        results = []
+        while not done.is_set():
+            results.append(await Analyse(manager).get_metrics_batch(EVERYTHING))
+        return results
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    results = asyncio.run(read_until_done())
+    thread.join()
+
+    assert results
+    for result in results:
+        assert result["version"] + 1 == result["results"][0]["value"]["data_points"]
+
+
+def test_batch_for_empty_or_unknown_station_is_not_found():
+    apis.catalog.register(Location("batch-empty", 4.0, 4.0))
+    client = TestClient(apis.app)
+    body = {"metrics": [{"name": "summary", "period": 24}]}
+
+    empty = client.post("/metrics/batch?location=batch-empty", json=body)
+    assert empty.status_code == 404
+    assert empty.json() == {"detail": "Unable to evaluate metrics"}
+    assert client.post("/metrics/batch?location=nowhere", json=body).status_code == 404
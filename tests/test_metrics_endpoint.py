@@ -0,0 +1,28 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+import apis
+from catalog import Location
+
+
+def test_metrics_are_rendered_off_the_event_loop():
+    apis.catalog.register(Location("scraped", 5.0, 5.0))
+    apis.catalog.manager("scraped")
+    threads = []
+
+    def collect():
+        threads.append(threading.current_thread())
+        yield "weather_test_collector_calls", "Test collector calls", {}, len(threads)
+
+    apis.registry.register_collector(collect)
+    try:
+        with TestClient(apis.app) as client:
+            loop_thread = client.portal.call(threading.current_thread)
+            response = client.get("/metrics")
+    finally:
+        apis.registry.collectors.remove(collect)
+
+    assert response.status_code == 200
+    assert 'weather_station_records{location="scraped"} 0' in response.text
+    assert threads and loop_thread not in threads